@@ -5,7 +5,8 @@ import time
 # this logging stuff has to be outside of the IsaacTracker class so we can use it when it fails to instantiate
 log_dir = r"../tracker_log.txt"
 error_log = logging.getLogger("tracker")
-error_log.addHandler(logging.FileHandler(log_dir, mode='a'))
+# The file is only made once there's something to log in it
+error_log.addHandler(logging.FileHandler(log_dir, mode='a', delay=True))
 error_log.setLevel(logging.INFO)
 
 def log_error(msg):
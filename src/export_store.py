@@ -0,0 +1,177 @@
+""" This module saves the states written by TrackerState.export_state, and reads them back when a run is continued """
+import os
+import json
+import time
+import threading
+from error_stuff import log_error
+
+
+class ExportStore(object):
+    """
+    Keeps the states saved with TrackerState.export_state, one for each game version and save slot.
+    Each slot has its own file in a directory, so saving or loading a slot never reads or writes the other ones.
+    The list of slots is made from the directory once, and a slot's file is only read the first time we need it.
+    Saving a state doesn't rewrite its file: the states saved since the last write are appended to a journal in the
+    directory (only the last one of each slot), at most every save_interval seconds. When the journal gets long
+    enough, the slots it changed are written to their files and the journal starts over (compaction).
+    Files are always replaced at once, so a crash can't leave a half-written one, and an unfinished line at
+    the end of the journal is ignored.
+    """
+    # Game versions with save slots, the others only have one state
+    versions_with_save_slots = ["Afterbirth+", "Repentance", "Repentance+"]
+    # Seconds between two writes of the saved states
+    save_interval = 2.0
+    # Number of states in the journal after which it's written to the slots' files
+    compaction_threshold = 100
+    journal_name = "journal"
+
+    def __init__(self, directory, old_path=None):
+        self.directory = directory
+        self.journal_path = directory + ExportStore.journal_name
+        # The file all the slots were in before they had their own, read once to fill the directory
+        self.old_path = old_path
+        # (game version, save slot) => the slot's state dict, or None if we didn't read its file yet.
+        # None until we list the directory
+        self.index = None
+        # (game version, save slot) => state dict, for the states saved since the last write
+        self.pending = {}
+        # The slots whose state in the journal isn't in their file yet
+        self.journaled_slots = set()
+        # Number of states in the journal
+        self.journal_length = 0
+        self.last_write_time = 0
+        # The window can save and load states too
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def slot(game_version, save):
+        """ Return the (game version, save slot) key of a state, the save slot is None for the versions without them """
+        return (game_version, str(save) if game_version in ExportStore.versions_with_save_slots else None)
+
+    @staticmethod
+    def slot_file_name(slot):
+        """ Return the name of the file of a slot """
+        game_version, save = slot
+        return game_version + ("" if save is None else "_" + save) + ".json"
+
+    def save_state(self, game_version, save, state):
+        """ Save the state dict for the given game version and save slot, it's written with the next write """
+        slot = ExportStore.slot(game_version, save)
+        with self.lock:
+            self.__load_index()
+            self.index[slot] = state
+            self.pending[slot] = state
+
+    def load_state(self, game_version, save):
+        """ Return the last state dict saved for the given game version and save slot, None if there's none """
+        slot = ExportStore.slot(game_version, save)
+        with self.lock:
+            self.__load_index()
+            if slot not in self.index:
+                return None
+            if self.index[slot] is None:
+                try:
+                    with open(self.directory + ExportStore.slot_file_name(slot), "r") as slot_file:
+                        self.index[slot] = json.load(slot_file)
+                except (OSError, ValueError):
+                    return None
+            state = self.index[slot]
+            return state if isinstance(state, dict) else None
+
+    def is_due(self):
+        """ Return true if states were saved since the last write, and it's been long enough since then """
+        return len(self.pending) > 0 and time.time() - self.last_write_time >= self.save_interval
+
+    def write(self):
+        """ Write the states saved since the last write """
+        with self.lock:
+            self.last_write_time = time.time()
+            if len(self.pending) == 0:
+                return
+            pending = self.pending
+            self.pending = {}
+            self.journaled_slots.update(pending)
+            try:
+                if self.journal_length + len(pending) >= self.compaction_threshold:
+                    self.__compact()
+                    return
+                lines = "".join(json.dumps([game_version, save, state], sort_keys=True) + "\n" for (game_version, save), state in pending.items())
+                os.makedirs(self.directory, exist_ok=True)
+                with open(self.journal_path, "a") as journal:
+                    journal.write(lines)
+                    journal.flush()
+                    os.fsync(journal.fileno())
+                self.journal_length += len(pending)
+            except OSError as e:
+                log_error("Couldn't save the tracker state: " + str(e))
+
+    def __load_index(self):
+        """ List the slots in the directory and read the journal, if we didn't already """
+        if self.index is not None:
+            return
+        self.index = {}
+        if os.path.isdir(self.directory):
+            for file_name in os.listdir(self.directory):
+                if not file_name.endswith(".json"):
+                    continue
+                game_version, separator, save = file_name[:-len(".json")].partition("_")
+                self.index[(game_version, save if separator else None)] = None
+        else:
+            self.__read_old_file()
+        self.journal_length = 0
+        try:
+            with open(self.journal_path, "r") as journal:
+                for line in journal:
+                    self.journal_length += 1
+                    try:
+                        game_version, save, state = json.loads(line)
+                    except (ValueError, TypeError):
+                        # The tracker stopped while writing this one
+                        continue
+                    slot = (game_version, save)
+                    self.index[slot] = state
+                    self.journaled_slots.add(slot)
+        except OSError:
+            pass
+        # Put the journal in the files now, so the next launches only have the files to read, and we don't
+        # append to an unfinished line
+        if self.journal_length > 0 or len(self.journaled_slots) > 0:
+            try:
+                self.__compact()
+            except OSError as e:
+                log_error("Couldn't save the tracker state: " + str(e))
+
+    def __read_old_file(self):
+        """ Get the states from the file every slot was in, they're written to their own files by the next compaction """
+        if self.old_path is None:
+            return
+        try:
+            with open(self.old_path, "r") as old_file:
+                states = json.load(old_file)
+        except (OSError, ValueError):
+            return
+        if not isinstance(states, dict):
+            return
+        for game_version, states in states.items():
+            if game_version in ExportStore.versions_with_save_slots:
+                slots = [((game_version, save), state) for save, state in states.items()] if isinstance(states, dict) else []
+            else:
+                slots = [((game_version, None), states)]
+            for slot, state in slots:
+                self.index[slot] = state
+                self.journaled_slots.add(slot)
+
+    def __compact(self):
+        """ Write the slots changed in the journal to their files, and empty the journal """
+        os.makedirs(self.directory, exist_ok=True)
+        for slot in self.journaled_slots:
+            # Write to a temporary file first, so a crash in the middle leaves the previous file intact.
+            # If we stop before emptying the journal, its states are already in the files and reading them again is harmless
+            path = self.directory + ExportStore.slot_file_name(slot)
+            temporary_path = path + ".tmp"
+            with open(temporary_path, "w") as slot_file:
+                json.dump(self.index[slot], slot_file, sort_keys=True)
+            os.replace(temporary_path, path)
+        self.journaled_slots = set()
+        open(self.journal_path, "w").close()
+        self.journal_length = 0
@@ -0,0 +1,205 @@
+"""This module handles the events the log parser turns the log into"""
+from game_objects.item import Item
+from game_objects.floor import Floor
+from game_objects.serializable import Serializable
+
+
+class ParserEvent(Serializable):
+    """
+    Something that happened in the game, as the log parser understood it.
+    Applying it to a state (see TrackerState.apply_event) makes the change it describes, so the state
+    is the result of applying every event in order. Events only hold plain values, so they can be kept,
+    replayed on another state or sent somewhere else.
+    """
+    def apply(self, state):
+        """ Make the change on state, and return what the state method returned """
+        raise NotImplementedError
+
+    @classmethod
+    def from_valid_json(cls, json_dic, *args):
+        """ Create an event from a type-checked dic, the constructors take the serialized members as arguments """
+        return cls(**{key: json_dic[key] for key, value_type in cls.serialize})
+
+    def __eq__(self, other):
+        return type(self) == type(other) and self.to_json() == other.to_json()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return type(self).__name__ + repr(self.to_json())
+
+
+class RunStarted(ParserEvent):
+    """ A new run started, mod versions are kept """
+    serialize = [('seed', str), ('game_version', str)]
+    def __init__(self, seed, game_version):
+        self.seed = seed
+        self.game_version = game_version
+
+    def apply(self, state):
+        return state.reset(self.seed, self.game_version, state.racing_plus_version, state.babies_mod_version, state.IAR_version)
+
+
+class PlayerInitialized(ParserEvent):
+    """ We know which character is played """
+    serialize = [('player', int)]
+    def __init__(self, player):
+        self.player = player
+
+    def apply(self, state):
+        state.player = self.player
+
+
+class FloorEntered(ParserEvent):
+    """ A new floor was generated """
+    serialize = [('floor_id', str)]
+    def __init__(self, floor_id):
+        self.floor_id = floor_id
+
+    def apply(self, state):
+        return state.add_floor(Floor(self.floor_id))
+
+
+class CurseApplied(ParserEvent):
+    """ The current floor has a curse """
+    serialize = [('curse', int)]
+    def __init__(self, curse):
+        self.curse = curse
+
+    def apply(self, state):
+        return state.add_curse(self.curse)
+
+
+class ItemAdded(ParserEvent):
+    """ An item was picked up on the current floor. flags is a string as described by Item.serialization_flags """
+    serialize = [('item_id', str), ('numeric_id', str), ('flags', str), ('shown', bool)]
+    def __init__(self, item_id, numeric_id, flags="", shown=True):
+        self.item_id = item_id
+        self.numeric_id = numeric_id
+        self.flags = flags
+        self.shown = shown
+
+    def apply(self, state):
+        return state.add_item(Item(self.item_id, self.numeric_id, state.last_floor, flagstr=self.flags, shown=self.shown))
+
+
+class ItemRemoved(ParserEvent):
+    """ An item was lost """
+    serialize = [('item_id', str), ('force_remove_active', bool)]
+    def __init__(self, item_id, force_remove_active=False):
+        self.item_id = item_id
+        self.force_remove_active = force_remove_active
+
+    def apply(self, state):
+        return state.remove_item(self.item_id, self.force_remove_active)
+
+
+class Reroll(ParserEvent):
+    """ The items were rerolled (D4, dice room...) """
+    serialize = []
+
+    def apply(self, state):
+        return state.reroll()
+
+
+class ItemsHidden(ParserEvent):
+    """ The items with these ids aren't shown anymore, like the parts of an item once we have the whole item """
+    serialize = [('item_ids', list)]
+    def __init__(self, item_ids):
+        self.item_ids = item_ids
+
+    def apply(self, state):
+        return state.hide_items(*self.item_ids)
+
+
+class ItemsShown(ParserEvent):
+    """ The items with these ids are shown on the tracker again, like the parts of an item once the whole item is lost """
+    serialize = [('item_ids', list)]
+    def __init__(self, item_ids):
+        self.item_ids = item_ids
+
+    def apply(self, state):
+        return state.show_items(*self.item_ids)
+
+
+class ItemsCleared(ParserEvent):
+    """ Every item was taken away (Genesis) """
+    serialize = []
+
+    def apply(self, state):
+        return state.clear_items()
+
+
+class AdditionalCharItemsRemoved(ParserEvent):
+    """ The items of Strawman, or of the Esau spawned by the Soul of Jacob&Esau, are gone """
+    serialize = [('strawman', bool)]
+    def __init__(self, strawman=False):
+        self.strawman = strawman
+
+    def apply(self, state):
+        return state.remove_additional_char_items(self.strawman)
+
+
+class RoomEntered(ParserEvent):
+    """ The player went to another room """
+    serialize = [('room_id', str)]
+    def __init__(self, room_id):
+        self.room_id = room_id
+
+    def apply(self, state):
+        return state.change_room(self.room_id)
+
+
+class GreedModeDetected(ParserEvent):
+    """ The run is a greed mode run, we only know it once the player is in the first room (Repentance) """
+    serialize = []
+
+    def apply(self, state):
+        state.greedmode = 2
+
+
+class VersionNumberRead(ParserEvent):
+    """ The log told us the version of the game """
+    serialize = [('version_number', str)]
+    def __init__(self, version_number):
+        self.version_number = version_number
+
+    def apply(self, state):
+        state.version_number = self.version_number
+
+
+class ModVersionRead(ParserEvent):
+    """ A mod the tracker knows about is enabled. mod is the name the mod logs, version is the text shown for it """
+    serialize = [('mod', str), ('version', str)]
+    def __init__(self, mod, version):
+        self.mod = mod
+        self.version = version
+
+    def apply(self, state):
+        if self.mod == "Racing+":
+            state.racing_plus_version = self.version
+        elif self.mod == "The Babies Mod":
+            state.babies_mod_version = self.version
+        else:
+            state.IAR_version = self.version
+
+
+class SaveSlotRead(ParserEvent):
+    """ The game loaded a save slot """
+    serialize = [('save', int)]
+    def __init__(self, save):
+        self.save = save
+
+    def apply(self, state):
+        state.save = self.save
+
+
+class RunContinued(ParserEvent):
+    """ A run was continued, or the user asked for the saved state. state is the dict saved by export_state, empty if there's none """
+    serialize = [('state', dict)]
+    def __init__(self, state):
+        self.state = state
+
+    def apply(self, state):
+        return state.load_export(self.state)
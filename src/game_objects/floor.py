@@ -55,6 +55,7 @@ class Floor(Serializable):
         "f19g": "Co",
         }
     serialize = [('floor_id', str), ('curse', int)]
+    __slots__ = ('floor_id', 'curse')
     def __init__(self, floor_id, curse=Curse.No_Curse):
         self.floor_id = floor_id
         self.curse = curse
@@ -88,6 +89,11 @@ class Floor(Serializable):
             return True
         return other is None or self.floor_id != other.floor_id
 
+    def __deepcopy__(self, memo):
+        floor = Floor(self.floor_id, self.curse)
+        memo[id(self)] = floor
+        return floor
+
     @staticmethod
     def from_valid_json(json_dic, *args):
         """ Create a Floor from a type-checked dic """
@@ -1,4 +1,6 @@
 """This module handles anything related to items and their characteristics"""
+import copy
+
 from game_objects.serializable import Serializable
 from options import Options
 from error_stuff import log_error
@@ -6,13 +8,23 @@ from error_stuff import log_error
 
 class Item(Serializable):
     """This class represent an Item in the game, and handles its properties"""
-
-    # These will be needed by both the log reader and the serializer. They're set in ItemTracker.__init__
-    # they shouldn't change after that.
-    items_info = {}
-    rep_items_info = {}
-    abplus_items_info = {}
-    custom_items_info = {}
+    # There can be a lot of items, slots make each one much smaller. The boolean flags are all in flag_bits
+    __slots__ = ('item_id', 'numeric_id', 'floor', 'shown', 'flag_bits', 'info', 'visible')
+
+    # These will be needed by both the log reader and the serializer. items_cache is set in ItemTracker.__init__,
+    # it shouldn't change after that. It loads the items files as they're needed (see version_items_info)
+    items_cache = None
+    # The items file of each game version, the versions that aren't there use items_abplus.json. None is for modded items
+    version_items_files = {"Repentance+": "items.json", "Repentance": "items_rep.json", None: "items_custom.json"}
+    # The other items files are mostly the same as this one, they're kept as their differences with it (see ItemsLayer)
+    base_items_file = "items.json"
+    layered_items_files = ("items_rep.json", "items_abplus.json")
+    # file name => the items in that file, once it's loaded
+    loaded_items_info = {}
+
+    # game version => item_id => ItemInfo. The ItemInfos are made the first time an item is looked up,
+    # and shared by every Item with the same id after that. Modded items are under the None game version.
+    info_cache = {}
 
     serialize = [('item_id', str),
                  ('floor_id', str),
@@ -23,6 +35,13 @@ class Item(Serializable):
     modded_item_id_prefix = "m"
 
     serialization_flags = {"blind":"b", "was_rerolled":"r", "starting_item":"s", "is_Jacob_item":"j", "is_Esau_item":"e", "is_Strawman_item":"k", "is_EsauSoul_item": "z", "is_TDLaz_item": "t"}
+    # The bit of flag_bits holding each flag, the boolean attributes named after them read and write it (see the end of this module)
+    flag_bits_by_name = {varname: 1 << index for index, varname in enumerate(serialization_flags)}
+    # Lookup tables between flag strings and flag_bits, filled at the end of this module.
+    # flag_strings is indexed by flag_bits, flag_string_bits has the bits of every flag string we've seen
+    flag_strings = ()
+    flag_string_bits = {}
+
     def __init__(self, item_id, numeric_id, floor, starting_item=False, was_rerolled=False, blind=False, flagstr=None, is_Jacob_item=False, is_Esau_item=False, is_Strawman_item=False, is_EsauSoul_item=False, is_TDLaz_item=False, shown=True):
         # item_id is a string that identifies what kind of item it is.
         # If this is numeric, then it represents an item from the base game, an official expansion, or antibirth
@@ -44,29 +63,24 @@ class Item(Serializable):
 
         # If we get a flag string, use that to determine the values of those other variables
         if flagstr is not None:
-            for varname,flag in Item.serialization_flags.items():
-                setattr(self, varname, flag in flagstr)
+            self.flag_bits = Item.parse_flags(flagstr)
         else:
-            # Is this an item the player has at the start of a run? like isaac's D6 or eden's things.
-            self.starting_item = starting_item
-            # Was it picked up while under the effect of curse of the blind?
-            self.blind = blind
-            # Was this item rerolled ?
-            self.was_rerolled = was_rerolled
-            # Does this item belong to Jacob ?
-            self.is_Jacob_item = is_Jacob_item
-            # Does this item belong to Esau ?
-            self.is_Esau_item = is_Esau_item
-            # Does this item belong to Strawman ?
-            self.is_Strawman_item = is_Strawman_item
-            # Does this item belong to Esau from Soul of Jacob&Esau ?
-            self.is_EsauSoul_item = is_EsauSoul_item
-            # Does this item belong to Tainted Dead Lazarus ?
-            self.is_TDLaz_item = is_TDLaz_item
-
-        # ItemInfo for the current item
+            # starting_item: Is this an item the player has at the start of a run? like isaac's D6 or eden's things.
+            # blind: Was it picked up while under the effect of curse of the blind?
+            # was_rerolled: Was this item rerolled ?
+            # is_Jacob_item, is_Esau_item, is_Strawman_item, is_EsauSoul_item, is_TDLaz_item: Does this item belong to
+            # Jacob, Esau, Strawman, Esau from Soul of Jacob&Esau, Tainted Dead Lazarus ?
+            self.flag_bits = Item.bits_of_flags(starting_item=starting_item, blind=blind, was_rerolled=was_rerolled,
+                                                is_Jacob_item=is_Jacob_item, is_Esau_item=is_Esau_item, is_Strawman_item=is_Strawman_item,
+                                                is_EsauSoul_item=is_EsauSoul_item, is_TDLaz_item=is_TDLaz_item)
+
+        # ItemInfo for the current item, shared with the other items with the same id
         self.info = Item.get_item_info(item_id)
 
+        # Is this item shown on the tracker ? Hidden items from the items files start hidden, and the parts
+        # of multi-segmented items are hidden once we have the whole item.
+        self.visible = self.info.shown
+
     def rerolled(self, player):
         """Mark the item as rerolled"""
 
@@ -171,41 +185,116 @@ class Item(Serializable):
     def get_item_info(item_id):
         """look for its informations in the loaded dictionary"""
         if item_id[0] == Item.modded_item_id_prefix:
-            return ItemInfo(Item.custom_items_info[item_id[1:]])
-        elif Options().game_version == "Repentance+":
-            return ItemInfo(Item.items_info[item_id])
-        elif Options().game_version == "Repentance":
-            return ItemInfo(Item.rep_items_info[item_id])
+            game_version, key = None, item_id[1:]
         else:
-            return ItemInfo(Item.abplus_items_info[item_id])
+            game_version, key = Options().game_version, item_id
+        try:
+            return Item.info_cache[game_version][key]
+        except KeyError:
+            pass
+        item_info = ItemInfo(Item.version_items_info(game_version)[key])
+        Item.info_cache.setdefault(game_version, {})[key] = item_info
+        return item_info
 
     @staticmethod
     def contains_info(item_id):
         """ Return true if we know an item with this id """
         if item_id[0] == Item.modded_item_id_prefix:
-            return item_id[1:] in Item.custom_items_info
-        elif Options().game_version == "Repentance+":
-            return item_id in Item.items_info
-        elif Options().game_version == "Repentance":
-            return item_id in Item.rep_items_info
+            game_version, key = None, item_id[1:]
         else:
-            return item_id in Item.abplus_items_info
+            game_version, key = Options().game_version, item_id
+        return key in Item.info_cache.get(game_version, ()) or key in Item.version_items_info(game_version)
+
+    @staticmethod
+    def version_items_info(game_version):
+        """
+        Return the dictionary of the items of the given game version, or of the modded items if it's None.
+        The items file is loaded the first time it's needed, so the versions we don't play are never loaded.
+        """
+        return Item.file_items_info(Item.version_items_files.get(game_version, "items_abplus.json"))
 
     @staticmethod
-    def determine_custom_item_names():
+    def file_items_info(file_name):
+        """ Return the dictionary of the items in the items file file_name, loading it if it's the first time """
+        try:
+            return Item.loaded_items_info[file_name]
+        except KeyError:
+            pass
+        if file_name in Item.layered_items_files:
+            items_info = Item.items_cache.load(file_name, Item.base_items_file, Item.file_items_info(Item.base_items_file))
+        else:
+            items_info = Item.items_cache.load(file_name)
+        if file_name == Item.version_items_files[None]:
+            Item.determine_custom_item_names(items_info)
+        Item.loaded_items_info[file_name] = items_info
+        return items_info
+
+    @staticmethod
+    def determine_custom_item_names(custom_items_info):
         """ For custom items that don't have a specific display name set, make the display name the same as the name id"""
-        for k,v in Item.custom_items_info.items():
+        for k,v in custom_items_info.items():
             if "name" not in v:
                 v["name"] = k
 
     @property
     def flags(self):
         """ Create a string containing single characters representing certain boolean member variables """
-        flagstr = ""
-        for varname,flag in Item.serialization_flags.items():
-            if getattr(self, varname):
-                flagstr += flag
-        return flagstr
+        return Item.flag_strings[self.flag_bits]
+
+    @staticmethod
+    def flag_string(**values):
+        """ Create the flag string of an item whose flags have the given values, the ones not given are false """
+        return Item.flag_strings[Item.bits_of_flags(**values)]
+
+    @staticmethod
+    def bits_of_flags(**values):
+        """ Return the flag_bits of an item whose flags have the given values, the ones not given are false """
+        flag_bits = 0
+        for varname, value in values.items():
+            if value:
+                flag_bits |= Item.flag_bits_by_name[varname]
+        return flag_bits
+
+    @staticmethod
+    def parse_flags(flagstr):
+        """ Return the flag_bits of a flag string. Any character that isn't a flag is ignored """
+        flag_bits = Item.flag_string_bits.get(flagstr)
+        if flag_bits is None:
+            flag_bits = Item.bits_of_flags(**{varname: flag in flagstr for varname, flag in Item.serialization_flags.items()})
+            Item.flag_string_bits[flagstr] = flag_bits
+        return flag_bits
+
+    @staticmethod
+    def flag_property(bit):
+        """ Return a property for the boolean flag stored in the given bit of flag_bits """
+        def get_flag(item):
+            return item.flag_bits & bit != 0
+
+        def set_flag(item, value):
+            if value:
+                item.flag_bits |= bit
+            else:
+                item.flag_bits &= ~bit
+        return property(get_flag, set_flag)
+
+    def __deepcopy__(self, memo):
+        # The parser thread copies the state it publishes, this is much faster than the generic copy.
+        # The floor is copied through memo so the item still points to a floor of the copied state's floor_list
+        item = Item.__new__(Item)
+        item.item_id = self.item_id
+        item.numeric_id = self.numeric_id
+        item.floor = copy.deepcopy(self.floor, memo)
+        item.shown = self.shown
+        item.flag_bits = self.flag_bits
+        item.info = self.info
+        item.visible = self.visible
+        memo[id(self)] = item
+        return item
+
+    def to_json(self):
+        """ Same as Serializable.to_json, without going through serialize, the state of a spectated run is full of items """
+        return {'item_id': self.item_id, 'floor_id': self.floor.floor_id, 'flags': Item.flag_strings[self.flag_bits],
+                'shown': self.shown, 'numeric_id': self.numeric_id}
 
     @staticmethod
     def from_valid_json(json_dic, *args):
@@ -219,12 +308,13 @@ class Item(Serializable):
 
         item_id = json_dic['item_id']
         numeric_id = json_dic['numeric_id']
-        if not Item.contains_info(item_id):
-            item_id = "NEW"
-
         flagstr = json_dic['flags']
 
-        return Item(item_id, numeric_id, floor, flagstr=flagstr)
+        # Looking up the info of an item we don't know fails, it's the same as checking contains_info first
+        try:
+            return Item(item_id, numeric_id, floor, flagstr=flagstr)
+        except KeyError:
+            return Item("NEW", numeric_id, floor, flagstr=flagstr)
 
 
 class ItemInfo(dict):
@@ -232,6 +322,8 @@ class ItemInfo(dict):
     dict wrapper for item infos.
     Properties and stats can be accessed using instance.my_stat, if it does not
     exist, None is returned.
+    There is only one ItemInfo per item and game version, shared by every Item with that id (see Item.get_item_info),
+    so it can't be modified. What changes from one item to the other belongs to Item.
     """
     transform_list = [
         "guppy",
@@ -282,15 +374,36 @@ class ItemInfo(dict):
     
     
     
+    # Computed from the values once, for the tracker state
+    __slots__ = ('stat_changes', 'transforms')
+
     def __init__(self, values):
         super(ItemInfo, self).__init__(values)
-        self.__dict__ = self
+        # The (stat, change) tuples of the stats the item changes, and the transformations it counts for
+        object.__setattr__(self, 'stat_changes', tuple((stat, float(self[stat])) for stat in ItemInfo.stat_list if self[stat]))
+        object.__setattr__(self, 'transforms', tuple(transform for transform in ItemInfo.transform_list if self[transform]))
 
     def __getattr__(self, name):
-        return None
+        # Special methods are looked up by copy and pickle, they shouldn't be mistaken for a missing stat
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return self.get(name)
 
     def __missing__(self, name):
-        return self.__getattr__(name)
+        return None
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ItemInfo is shared between items and can't be modified")
+
+    def __setitem__(self, name, value):
+        raise TypeError("ItemInfo is shared between items and can't be modified")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        # Nothing to copy, it never changes
+        return self
 
     @staticmethod
     def check_item_keys(items_dic, filename):
@@ -306,4 +419,11 @@ class ItemInfo(dict):
                     invalid_keys.add(item_info_key)
         if len(invalid_keys) > 0:
             log_error("The file " + filename + " contains unexpected keys: " + ", ".join(invalid_keys))
-        
\ No newline at end of file
+
+
+# The flags of Item are properties reading and writing flag_bits
+for flag_name, flag_bit in Item.flag_bits_by_name.items():
+    setattr(Item, flag_name, Item.flag_property(flag_bit))
+Item.flag_strings = tuple("".join(flag for varname, flag in Item.serialization_flags.items() if flag_bits & Item.flag_bits_by_name[varname])
+                          for flag_bits in range(1 << len(Item.serialization_flags)))
+Item.flag_string_bits = {flagstr: flag_bits for flag_bits, flagstr in enumerate(Item.flag_strings)}
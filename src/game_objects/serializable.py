@@ -1,6 +1,4 @@
 """ This module handles everything related to (De)serialization. """
-import logging
-
 from error_stuff import log_error
 
 
@@ -11,6 +9,8 @@ class Serializable(object):
     (member, type) tuple to (de)serialize.
     """
     serialize = []
+    # Lets derived classes use __slots__
+    __slots__ = ()
 
     def to_json(self):
         """ Export the class to json, according to the derived 'serialize' informations """
@@ -36,7 +36,6 @@ class Serializable(object):
         This function does some type checking on expected attributes,
         and then calls the derived factory method
         """
-        log = logging.getLogger("tracker")
         if not isinstance(json_dic, dict):
             log_error("ERROR: json_dic is not a dictionary")
             return None
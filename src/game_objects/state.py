@@ -1,14 +1,20 @@
 """This module handles anything related to the item tracker's state"""
+import bisect
 import json
 from game_objects.item  import Item, ItemInfo
 from game_objects.floor import Floor
+from game_objects.transformation import Transformation
 from game_objects.serializable import Serializable
+from export_store import ExportStore
 from options import Options
 
 class TrackerState(Serializable):
     """This class represents a tracker state, and handle the logic to
     modify it while keeping it coherent
     """
+    # Where export_state saves the states, ItemTracker points it to the tracker's directory
+    export_store = ExportStore("../export_states/", "../export_state.json")
+
     serialize = [('seed', str),
                  ('floor_list', list),
                  ('item_list', list),
@@ -55,18 +61,55 @@ class TrackerState(Serializable):
         self.player2_transforms = {} # For Esau
         for stat in ItemInfo.stat_list:
             self.player_stats[stat] = 0.0
+        self.reset_transformations()
 
-        if Options().game_version in ["Repentance", "Repentance+"]:  # Repentance allows multiple occurrence of the same item to count in transformations so transformation counts must be arrays instead of objects
-            self.reset_transformations()
-        else:
-            for transform in ItemInfo.transform_list:
-                self.player_transforms[transform] = set()
+    @property
+    def item_list(self):
+        """
+        The items of the run, in the order they were picked up.
+        Don't modify this list in place, use add_item and remove_item, or assign a new list.
+        """
+        return self.__item_list
+
+    @item_list.setter
+    def item_list(self, item_list):
+        self.__item_list = item_list
+        # Every item of item_list gets a number, bigger than the ones of the items before it. sequence_numbers has
+        # them in the order of item_list, so an item's place in the list is found by bisecting it
+        self.__sequence_numbers = list(range(len(item_list)))
+        self.__next_sequence_number = len(item_list)
+        # The (sequence number, item) of the items of item_list with each item_id, in the same order, so we never
+        # have to go through the whole list
+        self.__items_by_id = {}
+        for sequence_number, item in enumerate(item_list):
+            self.__items_by_id.setdefault(item.item_id, []).append((sequence_number, item))
+
+    def get_items(self, item_id):
+        """ Return the list of the items with the given item_id we have, in the order they were picked up """
+        return [item for sequence_number, item in self.__items_by_id.get(item_id, ())]
 
     def reset_transformations(self):
         """ Reset transformation dicts, also used when Genesis is used """
         for transform in ItemInfo.transform_list:
-            self.player_transforms[transform] = []
-            self.player2_transforms[transform] = []
+            self.player_transforms[transform] = Transformation(transform)
+            self.player2_transforms[transform] = Transformation(transform)
+
+    @staticmethod
+    def transforms_from_json(transforms_dic):
+        """
+        Rebuild a transformation dict from its json form, raise a ValueError if it's not valid.
+        The states exported by older trackers have lists of items instead, they're counted again
+        """
+        transforms = {}
+        for transform in ItemInfo.transform_list:
+            transform_json = transforms_dic.get(transform)
+            if isinstance(transform_json, list):
+                transforms[transform] = Transformation.from_legacy_json(transform_json, transform)
+            else:
+                transforms[transform] = Transformation.from_json(transform_json, transform)
+            if transforms[transform] is None:
+                raise ValueError("invalid " + transform + " transformation")
+        return transforms
 
     def add_floor(self, floor):
         """ Add a floor to the current run """
@@ -90,8 +133,11 @@ class TrackerState(Serializable):
         The boolean is true if the item has been added, false otherwise.
         """
         # Ignore repeated pickups of space bar items
-        if not (item.info.space and item in self.item_list) and item.shown:
+        if not (item.info.space and self.contains_item(item.item_id)) and item.shown:
             self.item_list.append(item)
+            self.__sequence_numbers.append(self.__next_sequence_number)
+            self.__items_by_id.setdefault(item.item_id, []).append((self.__next_sequence_number, item))
+            self.__next_sequence_number += 1
             if not item.is_Strawman_item:
                 self.__add_stats_for_item(item)
             self.modified = True
@@ -103,22 +149,27 @@ class TrackerState(Serializable):
         """
         Remove the given item from the current run, and update player's stats accordingly.
         If we have multiples of that item, the removed item is the most recent of them.
+        The item is found without going through item_list, deleting it from the list still moves the items after it
+        (like any list deletion, but that's a memmove, not a loop).
         Return a boolean.
         The boolean is true if an item has been removed, false otherwise.
         """
 
-        # Find the item by iterating backwards through the list
-        foundItem = False
-        for item in reversed(self.item_list):
-            if item.item_id == item_id and (forceRemoveActive or not item.info.space):
-                foundItem = True
-                break
+        # Find the item by iterating backwards through the items with this id
+        items = self.__items_by_id.get(item_id, [])
+        item = next((item for sequence_number, item in reversed(items) if forceRemoveActive or not item.info.space), None)
 
         # We don't have this item in our inventory
-        if not foundItem:
+        if item is None:
             return False
 
-        self.item_list.remove(item)
+        # Items are equal when they have the same id, so the first item with this id is the one that leaves the list
+        sequence_number, removed_item = items.pop(0)
+        if not items:
+            del self.__items_by_id[item_id]
+        index = bisect.bisect_left(self.__sequence_numbers, sequence_number)
+        del self.item_list[index]
+        del self.__sequence_numbers[index]
         self.__remove_stats_for_item(item)
         self.modified = True
         self.export_state()
@@ -132,13 +183,13 @@ class TrackerState(Serializable):
         if strawman:
             for item in reversed(self.item_list):
                 if item.is_Strawman_item:
-                    item.info.shown = False
+                    item.visible = False
                     item.shown = False
                     items_removed += 1
         else:
             for item in reversed(self.item_list):
                 if item.is_EsauSoul_item and item.shown:
-                    item.info.shown = False
+                    item.visible = False
                     item.shown = False
                     items_removed += 1
 
@@ -149,28 +200,35 @@ class TrackerState(Serializable):
 
     def multi_items(self):
         """Remove multi-segmented items when quest items are completed and you watch someone else"""
-        # item.info.shown = False is for not showing the item on the tracker
+        # item.visible = False is for not showing the item on the tracker
         # item.shown = False is for the export_state function to store the actual shown value instead of the initial value item.info.shown
         if self.contains_item('238') and self.contains_item('239') and not self.contains_item('3000'):
-            for item in reversed(self.item_list):
-                if item.item_id in ("238", "239"):
-                    item.info.shown = False
-                    item.shown = False
+            self.hide_items("238", "239")
         elif self.contains_item('550') and self.contains_item('552'):
-            for item in reversed(self.item_list):
-                if item.item_id == "550":
-                    item.info.shown = False
-                    item.shown = False
+            self.hide_items("550")
         elif self.contains_item('144') and self.contains_item('278') and self.contains_item('388') and not self.contains_item('3001'):
-            for item in reversed(self.item_list):
-                if item.item_id in ("144", "278", "388"):
-                    item.info.shown = False
-                    item.shown = False
+            self.hide_items("144", "278", "388")
         elif self.contains_item('626') and self.contains_item('627') and not self.contains_item('3002'):
-            for item in reversed(self.item_list):
-                if item.item_id in ("626", "627"):
-                    item.info.shown = False
-                    item.shown = False
+            self.hide_items("626", "627")
+
+    def hide_items(self, *item_ids):
+        """ Stop showing the items with the given ids, like the parts of an item once we show the whole item instead """
+        for item_id in item_ids:
+            for sequence_number, item in self.__items_by_id.get(item_id, ()):
+                item.visible = False
+                item.shown = False
+
+    def show_items(self, *item_ids):
+        """ Show the items with the given ids on the tracker again """
+        for item_id in item_ids:
+            for sequence_number, item in self.__items_by_id.get(item_id, ()):
+                item.visible = True
+
+    def clear_items(self):
+        """ Remove every item and the transformations they gave, when Genesis is used """
+        self.item_list = []
+        self.reset_transformations()
+        self.modified = True
 
     @property
     def last_item(self):
@@ -185,7 +243,7 @@ class TrackerState(Serializable):
 
     def contains_item(self, item_id):
         """ Looks for the given item_id in our item_list """
-        return len([x for x in self.item_list if x.item_id == item_id]) >= 1
+        return item_id in self.__items_by_id
 
     def reroll(self):
         """ Tag every (non-spacebar) items as rerolled """
@@ -203,6 +261,10 @@ class TrackerState(Serializable):
     def change_room(self, room_id):
         self.room_id = room_id
 
+    def apply_event(self, event):
+        """ Apply an event from the log parser (see game_objects.events), return what it returns """
+        return event.apply(self)
+
     def drawn(self):
         """ Tag this state as rendered """
         self.modified = False
@@ -227,81 +289,115 @@ class TrackerState(Serializable):
 
         return state
 
+    def get_checkpoint(self):
+        """
+        Return a json-compatible dict holding everything needed to rebuild this exact state, used by the parser's checkpoints.
+        Unlike to_json, it keeps the player's stats, the transformations as they are, whether every item is visible
+        and which Floor object each item was picked up on.
+        """
+        floor_indexes = {id(floor): index for index, floor in enumerate(self.floor_list)}
+
+        def floor_checkpoint(floor):
+            # Items usually point to a floor of the floor list, but not always (see load_from_export_state)
+            return floor_indexes.get(id(floor), floor.to_json())
+
+        def item_checkpoint(item):
+            return {'item_id': item.item_id, 'numeric_id': item.numeric_id, 'flags': item.flags, 'shown': item.shown,
+                    'visible': item.visible, 'floor': floor_checkpoint(item.floor)}
+
+        return {
+            'seed': self.seed,
+            'tracker_version': self.tracker_version,
+            'game_version': self.game_version,
+            'racing_plus_version': self.racing_plus_version,
+            'babies_mod_version': self.babies_mod_version,
+            'IAR_version': self.IAR_version,
+            'version_number': self.version_number,
+            'player': self.player,
+            'save': self.save,
+            'greedmode': self.greedmode,
+            'room_id': self.room_id,
+            'floor_list': [floor.to_json() for floor in self.floor_list],
+            'item_list': [item_checkpoint(item) for item in self.item_list],
+            'player_stats': self.player_stats,
+            'player_transforms': {transform: value.to_json() for transform, value in self.player_transforms.items()},
+            'player2_transforms': {transform: value.to_json() for transform, value in self.player2_transforms.items()},
+        }
+
+    @staticmethod
+    def from_checkpoint(checkpoint):
+        """ Rebuild a state from the result of get_checkpoint. Raise an exception if it doesn't make sense anymore """
+        state = TrackerState(checkpoint['seed'], checkpoint['tracker_version'], checkpoint['game_version'], checkpoint['racing_plus_version'], checkpoint['babies_mod_version'], checkpoint['IAR_version'], checkpoint['version_number'], checkpoint['player'])
+        state.save = checkpoint['save']
+        state.greedmode = checkpoint['greedmode']
+        state.room_id = checkpoint['room_id']
+        state.floor_list = [Floor(floor['floor_id'], floor['curse']) for floor in checkpoint['floor_list']]
+
+        def item_from_checkpoint(item_checkpoint):
+            floor = item_checkpoint['floor']
+            floor = state.floor_list[floor] if isinstance(floor, int) else Floor(floor['floor_id'], floor['curse'])
+            item = Item(item_checkpoint['item_id'], item_checkpoint['numeric_id'], floor, flagstr=item_checkpoint['flags'], shown=item_checkpoint['shown'])
+            item.visible = item_checkpoint['visible']
+            return item
+        state.item_list = [item_from_checkpoint(item) for item in checkpoint['item_list']]
+        state.player_stats = dict(checkpoint['player_stats'])
+        state.player_transforms = TrackerState.transforms_from_json(checkpoint['player_transforms'])
+        state.player2_transforms = TrackerState.transforms_from_json(checkpoint['player2_transforms'])
+        return state
+
     def __add_stats_for_item(self, item):
         """
         Update player's stats with the given item.
         """
-        item_info = item.info
-        for stat in ItemInfo.stat_list:
-            if not item_info[stat]:
-                continue
-            change = float(item_info[stat])
+        for stat, change in item.info.stat_changes:
             self.player_stats[stat] += change
-        for transform in ItemInfo.transform_list:
-            if not item_info[transform]:
-                continue
-            if Options().game_version == "Repentance+" and transform == "necromancer" and item.item_id in ["262", "2048"] and item in self.player_transforms[transform]: #necromancer only count one copy of items
-                continue
-            elif Options().game_version in ["Repentance", "Repentance+"]: # Repentance allows multiple occurrence of the same item to count in transformations
-                if item.is_Esau_item:
-                    self.player2_transforms[transform].append(item)
-                    if item.item_id == "32937": # Golden Kid's Drawing
-                        self.player2_transforms[transform].append(1)
-                elif not item.is_Strawman_item and not item.is_EsauSoul_item:
-                    self.player_transforms[transform].append(item)
-                    if item.item_id == "32937": # Golden Kid's Drawing
-                        self.player_transforms[transform].append(1)
-            else:
-                self.player_transforms[transform].add(item)
+        for transform in item.info.transforms:
+            # How many times an item counts is up to Transformation
+            if Options().game_version in ["Repentance", "Repentance+"] and item.is_Esau_item:
+                self.player2_transforms[transform].add(item.item_id)
+            elif (not item.is_Strawman_item and not item.is_EsauSoul_item) or Options().game_version not in ["Repentance", "Repentance+"]:
+                self.player_transforms[transform].add(item.item_id)
 
     def __remove_stats_for_item(self, item):
         """
         Update player's stats with the given item.
         """
-        item_info = item.info
-        for stat in ItemInfo.stat_list:
-            if not item_info[stat]:
-                continue
-            change = float(item_info[stat])
+        for stat, change in item.info.stat_changes:
             self.player_stats[stat] -= change
 
-        for transform in ItemInfo.transform_list:
-            if not item_info[transform]:
-                continue
-            if not item.info.space and Options().game_version in ["Repentance", "Repentance+"] and item.is_Esau_item and item in self.player2_transforms[transform]:
-                self.player2_transforms[transform].remove(item)
-            elif not item.info.space and Options().game_version in ["Repentance", "Repentance+"] and self.player != 21 and item in self.player_transforms[transform] and not item.is_Esau_item:
-                self.player_transforms[transform].remove(item)
-
-    def export_state(self):
-        # Debug function to write the state to a json file
-        data = self.get_export_state()
-        if data == {}:
-            with open("../export_state.json", "w") as state_file:
-                if self.game_version in ["Repentance", "Repentance+"] or self.game_version == "Afterbirth+":
-                    state_file.write(json.dumps({self.game_version:{self.save : self}}, cls=TrackerStateEncoder, sort_keys=True))
-                else:
-                    state_file.write(json.dumps({self.game_version:self}, cls=TrackerStateEncoder, sort_keys=True))
-        else:
-            if self.game_version in ["Repentance", "Repentance+"] or self.game_version == "Afterbirth+":
-                if self.game_version in data:
-                    data[self.game_version][str(self.save)] = self
-                else:
-                    data[self.game_version] = {self.save : self}
-            else:
-                data[self.game_version] = self
-            with open("../export_state.json", "w") as state_file:
-                state_file.write(json.dumps(data, cls=TrackerStateEncoder, sort_keys=True))
+        for transform in item.info.transforms:
+            if not item.info.space and Options().game_version in ["Repentance", "Repentance+"] and item.is_Esau_item and item.item_id in self.player2_transforms[transform]:
+                self.player2_transforms[transform].remove(item.item_id)
+            elif not item.info.space and Options().game_version in ["Repentance", "Repentance+"] and self.player != 21 and item.item_id in self.player_transforms[transform] and not item.is_Esau_item:
+                self.player_transforms[transform].remove(item.item_id)
+
+    def export_state(self, now=False):
+        """
+        Save this state for its game version and save slot, so a continued run can be loaded back (see load_from_export_state).
+        It's written to the file with the next states saved, or right away if now is true.
+        """
+        TrackerState.export_store.save_state(self.game_version, self.save, self.get_export())
+        if now:
+            TrackerState.export_store.write()
+
+    def get_export(self):
+        """ Return the dict export_state saves, the same as to_json but made of plain values that don't change with the state """
+        export = self.to_json()
+        export['floor_list'] = [floor.to_json() for floor in self.floor_list]
+        export['item_list'] = [item.to_json() for item in self.item_list]
+        export['player_transforms'] = {transform: value.to_json() for transform, value in self.player_transforms.items()}
+        export['player2_transforms'] = {transform: value.to_json() for transform, value in self.player2_transforms.items()}
+        return export
 
     def load_from_export_state(self):
+        """ Load the state saved with export_state for our game version and save slot, return true if there's none """
+        return self.load_export(TrackerState.export_store.load_state(self.game_version, self.save))
+
+    def load_export(self, data):
+            """ Load a dict made by get_export, return true if it's not one """
             new_floor_list = []
             new_item_list = []
-            data = self.get_export_state()
             try:
-                if self.game_version in ["Repentance", "Repentance+"] or self.game_version == "Afterbirth+":
-                    data = data[self.game_version][str(self.save)]
-                else:
-                    data = data[self.game_version]
                 self.seed = data['seed']
                 self.player = data['player']
                 self.greedmode = data['greedmode']
@@ -311,26 +407,16 @@ class TrackerState(Serializable):
                 self.floor_list = new_floor_list
                 for item in data['item_list']:
                     new_item = Item(flagstr=item["flags"], item_id=item['item_id'], numeric_id=item['numeric_id'], floor=Floor(floor_id=item['floor_id']))
-                    new_item.info.shown = item["shown"]
+                    new_item.visible = item["shown"]
                     new_item_list.append(new_item)
                 self.item_list = new_item_list
-                self.player_transforms = data['player_transforms']
+                self.player_transforms = TrackerState.transforms_from_json(data['player_transforms'])
                 if self.player == 19:
-                    self.player2_transforms = data['player2_transforms']
+                    self.player2_transforms = TrackerState.transforms_from_json(data['player2_transforms'])
                 self.modified = True
             except:
                 return True    
 
-    def get_export_state(self):
-        try:
-            with open("../export_state.json", "r") as state_file:
-                data = json.loads(state_file.read())
-        except:
-            data = {}
-        return data
-
-            
-
 class TrackerStateEncoder(json.JSONEncoder):
     """ An encoder to provide to the json.load method, which handle game objects """
     def default(self, obj):
@@ -0,0 +1,88 @@
+"""This module handles the player's progress towards transformations"""
+from game_objects.serializable import Serializable
+from options import Options
+
+
+class Transformation(Serializable):
+    """
+    How many of a transformation's items a player has.
+    Instead of the items themselves, we only keep how much the items with each id count for, so adding
+    or removing an item and getting the count don't depend on how many items the player has.
+    """
+    serialize = [('items', dict)]
+
+    # Game versions where every copy of an item counts, the older ones count each item only once
+    every_copy_counts = ["Repentance", "Repentance+"]
+    # Items counting as more than one item, in the game versions above
+    item_weights = {
+        "32937": 2, # Golden Kid's Drawing
+    }
+    # Items only counting once for a transformation even in the game versions above, by game version and transformation
+    counted_once = {
+        "Repentance+": {"necromancer": ("262", "2048")},
+    }
+
+    def __init__(self, name, items=None):
+        self.name = name
+        # item_id => how much the items with this id count for
+        self.items = dict(items) if items else {}
+        self.count = sum(self.items.values())
+
+    def __contains__(self, item_id):
+        return item_id in self.items
+
+    def add(self, item_id):
+        """ Count an item towards the transformation, return false if it doesn't count because we already have it """
+        game_version = Options().game_version
+        if game_version in Transformation.every_copy_counts:
+            if item_id in self.items and item_id in Transformation.counted_once.get(game_version, {}).get(self.name, ()):
+                return False
+            weight = Transformation.item_weights.get(item_id, 1)
+        elif item_id in self.items:
+            return False
+        else:
+            weight = 1
+        self.items[item_id] = self.items.get(item_id, 0) + weight
+        self.count += weight
+        return True
+
+    def remove(self, item_id):
+        """ Stop counting one copy of an item, return false if it didn't count """
+        if item_id not in self.items:
+            return False
+        weight = min(Transformation.item_weights.get(item_id, 1), self.items[item_id])
+        self.items[item_id] -= weight
+        if self.items[item_id] == 0:
+            del self.items[item_id]
+        self.count -= weight
+        return True
+
+    def to_json(self):
+        """ Same as Serializable.to_json, with a copy of items so the result doesn't change with the transformation """
+        return {'items': dict(self.items)}
+
+    @staticmethod
+    def from_valid_json(json_dic, *args):
+        """ Create a transformation from a type-checked dic, the transformation's name is given as the first argument """
+        return Transformation(args[0], json_dic['items'])
+
+    @staticmethod
+    def from_legacy_json(items, name):
+        """
+        Create a transformation from what the trackers before Transformation exported: the list of the items
+        counted (item dicts), with a 1 after the items counting twice. Return None if it isn't one
+        """
+        if not isinstance(items, list):
+            return None
+        counts = {}
+        item_id = None
+        for element in items:
+            if isinstance(element, dict) and isinstance(element.get('item_id'), str):
+                item_id = element['item_id']
+                counts[item_id] = counts.get(item_id, 0) + 1
+            elif isinstance(element, int) and item_id is not None:
+                # The extra count of the item before it (Golden Kid's Drawing)
+                counts[item_id] += element
+            else:
+                return None
+        return Transformation(name, counts)
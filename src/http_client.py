@@ -0,0 +1,142 @@
+""" This module keeps the connections to the tracker server open, so every request doesn't have to open a new one """
+import collections
+import gzip
+import http.client
+import json
+import threading
+import urllib.parse
+
+
+class HttpError(Exception):
+    """ The server answered with an error status """
+    def __init__(self, url, code, reason):
+        super(HttpError, self).__init__("HTTP Error " + str(code) + ": " + str(reason) + " (" + url + ")")
+        self.url = url
+        self.code = code
+
+
+class HttpClient(object):
+    """
+    Sends the requests to the tracker server over keep-alive connections, shared by everything talking to it
+    (uploads, spectating, the options menu): every HttpClient has the same state, like Options.
+    A connection is only used by one request at a time, the idle ones wait for the next request to the same server.
+    The responses can be gzip-compressed, and the responses to GET requests are kept with their ETag, so asking
+    again for something that didn't change only costs a small "304 Not Modified" answer.
+    """
+    _shared_state = {}
+    _shared_state_lock = threading.Lock()
+    # Idle connections kept for each server
+    max_idle_connections = 4
+    # Number of GET responses kept with their ETag
+    max_cached_responses = 32
+    max_redirects = 3
+    timeout = 10
+
+    def __init__(self):
+        self.__dict__ = self._shared_state
+        with HttpClient._shared_state_lock:
+            if 'lock' not in self._shared_state:
+                self.lock = threading.Lock()
+                # (scheme, host, port) => idle connections to that server
+                self.idle_connections = {}
+                # url => (etag, body) of the last response to a GET on url that had an ETag
+                self.cached_responses = collections.OrderedDict()
+
+    def get(self, url):
+        """ Return the body of the response to a GET on url """
+        headers = {}
+        with self.lock:
+            cached = self.cached_responses.get(url)
+        if cached is not None:
+            headers['If-None-Match'] = cached[0]
+        status, response_headers, body = self.request('GET', url, headers=headers)
+        if status == http.client.NOT_MODIFIED and cached is not None:
+            return cached[1]
+        etag = response_headers.get('ETag')
+        if etag is not None:
+            with self.lock:
+                self.cached_responses[url] = (etag, body)
+                self.cached_responses.move_to_end(url)
+                if len(self.cached_responses) > self.max_cached_responses:
+                    self.cached_responses.popitem(last=False)
+        return body
+
+    def send_json(self, method, url, content):
+        """ Send content as json to url with the given method (PUT, PATCH...), return the json answer """
+        body = json.dumps(content, sort_keys=True).encode("utf-8")
+        status, response_headers, response_body = self.request(method, url, body, {'Content-Type': 'application/json'})
+        return json.loads(response_body)
+
+    def request(self, method, url, body=None, headers=None, timeout=None):
+        """
+        Send a request, return the status, headers and (uncompressed) body of the response.
+        Redirections are followed, and an HttpError is raised if the status is an error.
+        timeout is how many seconds to wait for the server, for requests it can take its time answering
+        """
+        headers = dict(headers or {})
+        headers['Accept-Encoding'] = 'gzip'
+        for redirect in range(self.max_redirects + 1):
+            response, response_body = self.__send(method, url, body, headers, timeout or self.timeout)
+            location = response.getheader('Location')
+            if response.status in (301, 302, 303, 307, 308) and location is not None:
+                url = urllib.parse.urljoin(url, location)
+                # Like browsers, only 307 and 308 keep the method and body
+                if response.status not in (307, 308):
+                    method, body = 'GET', None
+                    headers.pop('Content-Type', None)
+                continue
+            break
+        if response.getheader('Content-Encoding') == 'gzip':
+            response_body = gzip.decompress(response_body)
+        if response.status >= 400:
+            raise HttpError(url, response.status, response.reason)
+        return response.status, response.headers, response_body
+
+    def __send(self, method, url, body, headers, timeout):
+        """ Send one request on a kept connection if there's one, return the response and its body """
+        parts = urllib.parse.urlsplit(url)
+        server = (parts.scheme, parts.hostname, parts.port)
+        path = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+        while True:
+            connection, reused = self.__get_connection(server)
+            # Kept connections may come from a request with another timeout
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response_body = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, ConnectionAbortedError, BrokenPipeError):
+                connection.close()
+                # The server closed a connection we kept before we used it again, try with a new one
+                if reused:
+                    continue
+                raise
+            except Exception:
+                connection.close()
+                raise
+            if response.will_close:
+                connection.close()
+            else:
+                self.__put_back(server, connection)
+            return response, response_body
+
+    def __get_connection(self, server):
+        """ Return an idle connection to server and true, or a new one and false """
+        with self.lock:
+            idle_connections = self.idle_connections.get(server)
+            if idle_connections:
+                return idle_connections.pop(), True
+        scheme, host, port = server
+        if scheme == "https":
+            return http.client.HTTPSConnection(host, port), False
+        return http.client.HTTPConnection(host, port), False
+
+    def __put_back(self, server, connection):
+        with self.lock:
+            idle_connections = self.idle_connections.setdefault(server, [])
+            if len(idle_connections) < self.max_idle_connections:
+                idle_connections.append(connection)
+                return
+        connection.close()
@@ -3,15 +3,20 @@ import json     # For importing the items and options
 import os
 import shutil
 import time     # For referencing the "state" timestamp that we get from the server
-import urllib.request, urllib.error, urllib.parse  # For checking for updates to the item tracker
 import traceback
 
 # Import item tracker specific code
 from view_controls.view import DrawingTool, Event
-from game_objects.item  import Item, ItemInfo
-from game_objects.state  import TrackerState, TrackerStateEncoder
+from game_objects.item  import Item
+from game_objects.state  import TrackerState
 from log_parser import LogParser
 from log_finder import LogFinder
+from parser_thread import ParserThread
+from state_uploader import StateUploader
+from state_subscriber import StateSubscriber
+from http_client import HttpClient
+from items_cache import ItemsCache
+from export_store import ExportStore
 from options import Options
 from error_stuff import log_error
 
@@ -30,23 +35,10 @@ class IsaacTracker(object):
             shutil.copytree(new_updater_dir, old_updater_dir)
             shutil.rmtree(wdir_prefix + "update_scratchdir")
 
-        # Load items/trinkets info
-        with open(wdir_prefix + "items.json", "r") as items_file:
-            Item.items_info = json.load(items_file)
-        ItemInfo.check_item_keys(Item.items_info, "items.json")
-
-        with open(wdir_prefix + "items_rep.json", "r") as rep_items_file:
-            Item.rep_items_info = json.load(rep_items_file)
-        ItemInfo.check_item_keys(Item.rep_items_info, "items_rep.json")  
-
-        with open(wdir_prefix + "items_abplus.json", "r") as abplus_items_file:
-            Item.abplus_items_info = json.load(abplus_items_file)
-        ItemInfo.check_item_keys(Item.abplus_items_info, "items_abplus.json")    
-        
-        with open(wdir_prefix + "items_custom.json", "r") as custom_items_file:
-            Item.custom_items_info = json.load(custom_items_file)
-        Item.determine_custom_item_names()
-        ItemInfo.check_item_keys(Item.custom_items_info, "items_custom.json")
+        # Items/trinkets info are loaded when they're needed, the other game versions' ones only if we switch to them
+        Item.items_cache = ItemsCache(wdir_prefix)
+        # The states saved to continue runs
+        TrackerState.export_store = ExportStore(wdir_prefix + "export_states/", wdir_prefix + "export_state.json")
 
 
     # Load version
@@ -64,6 +56,10 @@ class IsaacTracker(object):
             defaults_path = wdir_prefix + defaults_path
         Options().load_missing_defaults(defaults_path)
 
+        # Load the items of the game version we're tracking now, instead of in the middle of parsing the log
+        Item.version_items_info(Options().game_version)
+        Item.version_items_info(None)
+
 
     def run(self):
         """ The main routine which controls everything """
@@ -75,6 +71,18 @@ class IsaacTracker(object):
         opt = Options()
 
         parser = LogParser(wdir_prefix, self.tracker_version, LogFinder())
+        # The parser runs on its own thread, we only get copies of its state
+        parser_thread = ParserThread(parser)
+        parser_thread.start()
+        parser_state_version = None
+        # The states we send to the server are sent from another thread too
+        uploader = StateUploader()
+        uploader.start()
+        upload_status = None
+        # Gets the states of the player we watch from the server, if it can send them when they're uploaded
+        subscriber = None
+        # True once we know the server can't send us the states, and we poll it instead
+        polling_server = False
 
         event_result = None
         state = None
@@ -91,9 +99,20 @@ class IsaacTracker(object):
         last_game_version = None
 
         while event_result != Event.DONE:
+            if parser_thread.error is not None:
+                raise parser_thread.error
+
             # Check for events and handle them
             event_result = drawing_tool.handle_events()
 
+            # The user asked to load the state saved with export_state
+            if event_result == Event.IMPORT_STATE:
+                if read_from_server:
+                    if state is not None:
+                        state.load_from_export_state()
+                else:
+                    parser_thread.request_import()
+
             # The user checked or unchecked the "Custom Title Enabled" checkbox
             if opt.custom_title_enabled != custom_title_enabled:
                 custom_title_enabled = opt.custom_title_enabled
@@ -102,7 +121,7 @@ class IsaacTracker(object):
             # The user checked or unchecked the "Custom Log File Path" checkbox
             if opt.log_file_custom_path_enabled != log_file_custom_path_enabled:
                 log_file_custom_path_enabled = opt.log_file_custom_path_enabled
-                parser.reset()
+                parser_thread.request_reset()
 
             parser_log_file_path = str(parser.log_file_path).replace("log.txt", "")
             if not (parser_log_file_path.endswith("/") or parser_log_file_path.endswith("\\")):
@@ -112,18 +131,23 @@ class IsaacTracker(object):
                     opt_log_file_custom_path += "/"
 
             if opt.log_file_custom_path_enabled and parser_log_file_path != opt_log_file_custom_path:
-                parser.reset()
+                parser_thread.request_reset()
 
             # The user started or stopped watching someone from the server (or they started watching a new person from the server)
             if opt.read_from_server != read_from_server or opt.twitch_name != twitch_username:
                 twitch_username = opt.twitch_name
                 read_from_server = opt.read_from_server
                 new_states_queue = []
+                if subscriber is not None:
+                    subscriber.stop()
+                    subscriber = None
+                # Pick up the parser's state again next time we need it
+                parser_state_version = None
                 # Also restart version count if we go back and forth from log.txt to server
                 if read_from_server:
                     state_version = -1
                     state = None
-                    # Change the delay for polling, as we probably don't want to fetch it every second
+                    # Change the delay for polling (when the server can't send us the states), as we probably don't want to fetch it every second
                     update_timer_override = 2
                     # Show who we are watching in the title bar
                     drawing_tool.set_window_title_info(watching=True, watching_player=twitch_username, updates_queued=len(new_states_queue))
@@ -134,10 +158,12 @@ class IsaacTracker(object):
             # The user started or stopped broadcasting to the server
             if opt.write_to_server != write_to_server:
                 write_to_server = opt.write_to_server
+                if not write_to_server:
+                    uploader.cancel()
                 drawing_tool.set_window_title_info(uploading=opt.write_to_server)
 
             if opt.game_version != game_version:
-                parser.reset()
+                parser_thread.request_reset()
                 game_version = opt.game_version
 
             # Force refresh state if we updated options or if we need to retry
@@ -151,6 +177,12 @@ class IsaacTracker(object):
                 # Force updates after changing options
                 if state is not None:
                     state.modified = True
+                uploader.retry_now()
+
+            # The server can't send us the states when they're uploaded, start asking it for them right away
+            if subscriber is not None and subscriber.supported is False and not polling_server:
+                polling_server = True
+                framecount = 0
 
             # normally we check for updates based on how the option is set
             # when doing network stuff, this can be overridden
@@ -171,59 +203,62 @@ class IsaacTracker(object):
                 # Let the parser do his thing and give us a state
                 if opt.read_from_server:
                     base_url = opt.trackerserver_url + "/tracker/api/user/" + opt.twitch_name.partition(" (")[0]
-                    json_dict = None
-                    try:
-                        json_version = urllib.request.urlopen(base_url + "/version").read()
-                        if int(json_version) > state_version:
-                            # FIXME better handling of 404 error ?
-                            json_state = urllib.request.urlopen(base_url).read()
-                            json_dict = json.loads(json_state)
-                            new_state = TrackerState.from_json(json_dict)
-                            if new_state is None:
-                                raise Exception("server gave us empty state")
-                            state_version = int(json_version)
-                            new_states_queue.append((state_version, new_state))
-                            drawing_tool.set_window_title_info(updates_queued=len(new_states_queue))
-                    except Exception:
-                        state = None
-                        log_error("Couldn't load state from server\n" + traceback.format_exc())
-                        if json_dict is not None:
-                            if "tracker_version" in json_dict:
-                                their_version = json_dict["tracker_version"]
-                            else:
-                                # This is the only version that can upload to the server but doesn't include a version string
-                                their_version = "0.10-beta1"
-
-                            if their_version != self.tracker_version:
-                                screen_error_message = "They are using tracker version " + their_version + " but you have " + self.tracker_version
+                    # The server tells us about the new states as soon as they're uploaded, if it can
+                    if subscriber is None or subscriber.url != base_url:
+                        if subscriber is not None:
+                            subscriber.stop()
+                        subscriber = StateSubscriber(base_url, self.tracker_version)
+                        subscriber.start()
+                        polling_server = False
+                    # If it can't, we ask it every update_timer_override seconds
+                    if subscriber.supported is False:
+                        json_dict = None
+                        try:
+                            # Both go through the same kept connection, and cost a "not modified" answer if they didn't change
+                            json_version = HttpClient().get(base_url + "/version")
+                            if int(json_version) > state_version:
+                                # FIXME better handling of 404 error ?
+                                json_state = HttpClient().get(base_url)
+                                json_dict = json.loads(json_state)
+                                new_state = TrackerState.from_json(json_dict)
+                                if new_state is None:
+                                    raise Exception("server gave us empty state")
+                                state_version = int(json_version)
+                                new_states_queue.append((state_version, new_state))
+                                drawing_tool.set_window_title_info(updates_queued=len(new_states_queue))
+                        except Exception:
+                            state = None
+                            log_error("Couldn't load state from server\n" + traceback.format_exc())
+                            if json_dict is not None:
+                                if "tracker_version" in json_dict:
+                                    their_version = json_dict["tracker_version"]
+                                else:
+                                    # This is the only version that can upload to the server but doesn't include a version string
+                                    their_version = "0.10-beta1"
+
+                                if their_version != self.tracker_version:
+                                    screen_error_message = "They are using tracker version " + their_version + " but you have " + self.tracker_version
                 else:
                     force_draw = state and state.modified
-                    state = parser.parse()
+                    # Pick up the parser's latest state, if it changed since the last one we got
+                    (version, new_state) = parser_thread.published
+                    if version != parser_state_version:
+                        parser_state_version = version
+                        state = new_state
                     if force_draw and state is not None:
                         state.modified = True
                     if write_to_server and not opt.trackerserver_authkey:
                         screen_error_message = "Your authkey is blank. Get a new authkey in the options menu and paste it into the authkey text field."
                     if state is not None and write_to_server and state.modified and screen_error_message is None:
-                        opener = urllib.request.build_opener(urllib.request.HTTPHandler)
-                        put_url = opt.trackerserver_url + "/tracker/api/update/" + opt.trackerserver_authkey
-                        json_string = json.dumps(state, cls=TrackerStateEncoder, sort_keys=True).encode("utf-8")
-                        request = urllib.request.Request(put_url,
-                                                  data=json_string)
-                        request.add_header('Content-Type', 'application/json')
-                        request.get_method = lambda: 'PUT'
-                        try:
-                            result = opener.open(request)
-                            result_json = json.loads(result.read())
-                            updated_user = result_json["updated_user"]
-                            if updated_user is None:
-                                screen_error_message = "The server didn't recognize you. Try getting a new authkey in the options menu."
-                            else:
-                                screen_error_message = None
-                        except Exception as e:
-                            log_error("ERROR: Couldn't send item info to server\n" + traceback.format_exc())
-                            screen_error_message = "ERROR: Couldn't send item info to server, check tracker_log.txt"
-                            # Retry to write the state in 10*update_timer (aka 10 sec in write mode)
-                            retry_in = 10
+                        # The uploader only keeps the newest state, and retries by itself if it fails
+                        uploader.upload(state, opt.trackerserver_url + "/tracker/api/update/" + opt.trackerserver_authkey)
+
+            # Queue the states the server sent us since the last frame. They were uploaded just before we got them,
+            # so the read delay starts now
+            if subscriber is not None:
+                for (version, new_state) in subscriber.take_states():
+                    new_states_queue.append((int(time.time()), new_state))
+                    drawing_tool.set_window_title_info(updates_queued=len(new_states_queue))
 
             # Check the new state at the front of the queue to see if it's time to use it
             if len(new_states_queue) > 0:
@@ -236,19 +271,35 @@ class IsaacTracker(object):
 
             if state is None and screen_error_message is None:
                 if read_from_server:
-                    screen_error_message = "Unable to read state from server. Please verify your options setup and tracker_log.txt"
-                    # Retry to read the state in 5*update_timer (aka 10 sec in read mode)
-                    retry_in = 5
-                else:
+                    # The subscriber tells us itself when it can't get the state
+                    if subscriber is None or subscriber.supported is False:
+                        screen_error_message = "Unable to read state from server. Please verify your options setup and tracker_log.txt"
+                        # Retry to read the state in 5*update_timer (aka 10 sec in read mode)
+                        retry_in = 5
+                elif parser_thread.published[0] != 0: # Version 0 means the parser didn't look for the log yet
                     screen_error_message = "log.txt for " + opt.game_version + " not found. Make sure you have the right game selected in the options."
 
             #Online runs in Repentance+ are a huge mess in the log, don't want to deal with that
             if parser.is_online_run:
                 screen_error_message = "The tracker doesn't support online runs, please use the tracker in-game."
 
-            if screen_error_message is not None:
-                drawing_tool.write_error_message(screen_error_message)
-            else:
+            # Show how the uploads are going in the title bar
+            if write_to_server and not read_from_server:
+                new_upload_status = (uploader.queue_depth(), uploader.last_success_latency)
+                if new_upload_status != upload_status:
+                    upload_status = new_upload_status
+                    drawing_tool.set_window_title_info(uploads_queued=upload_status[0], upload_latency=upload_status[1])
+
+            error_message = screen_error_message
+            if error_message is None and write_to_server and not read_from_server:
+                # This one goes away once an upload works
+                error_message = uploader.error_message
+            if error_message is None and subscriber is not None:
+                # This one goes away once the subscriber gets a state again
+                error_message = subscriber.error_message
+            if error_message is not None:
+                drawing_tool.write_error_message(error_message)
+            elif state is not None:
                 # We got a state, now we draw it
                 drawing_tool.draw_state(state,framecount)
 
@@ -261,8 +312,14 @@ class IsaacTracker(object):
             framecount += 1
 
         # Main loop finished; program is exiting
+        parser_thread.stop()
+        uploader.stop()
+        if subscriber is not None:
+            subscriber.stop()
         drawing_tool.save_window_position()
         Options().save_options(wdir_prefix + "options.json")
+        # Give the parser a chance to save its checkpoint, without hanging if it's in the middle of a long parse
+        parser_thread.join(5)
 
     def filter_excepthook(self):
         lines = traceback.format_exc().split("\n")
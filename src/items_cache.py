@@ -0,0 +1,144 @@
+""" This module loads the items files, and keeps a compiled copy of them so they don't have to be parsed on every launch """
+import os
+import json
+import time
+import marshal  # Much faster to load than json, and it can only hold data
+import hashlib
+import logging
+from collections.abc import Mapping
+from game_objects.item import ItemInfo
+from error_stuff import log_error
+
+
+class ItemsLayer(Mapping):
+    """
+    The items of an items file, stored as their differences with the items of another file.
+    The items files of the different game versions are mostly the same, so we only keep one of them entirely.
+    The differences are a dict of item_id => None if the item isn't in this file,
+    or [values, removed_keys] where values are the values that aren't the same in the other file,
+    and removed_keys the keys this file doesn't have. removed_keys is None if the other file doesn't have the item.
+    """
+    def __init__(self, base, differences):
+        self.base = base
+        self.differences = differences
+
+    @staticmethod
+    def compare(base, items):
+        """ Return the differences between the items dicts items and base, as described above """
+        differences = {}
+        for item_id, values in items.items():
+            base_values = base.get(item_id)
+            if base_values is None:
+                differences[item_id] = [values, None]
+            elif values != base_values:
+                changed_values = {key: value for key, value in values.items() if key not in base_values or base_values[key] != value}
+                differences[item_id] = [changed_values, [key for key in base_values if key not in values]]
+        for item_id in base:
+            if item_id not in items:
+                differences[item_id] = None
+        return differences
+
+    def __getitem__(self, item_id):
+        if item_id not in self.differences:
+            return self.base[item_id]
+        difference = self.differences[item_id]
+        if difference is None:
+            raise KeyError(item_id)
+        values, removed_keys = difference
+        if removed_keys is None:
+            return values
+        item = {key: value for key, value in self.base[item_id].items() if key not in removed_keys}
+        item.update(values)
+        return item
+
+    def __contains__(self, item_id):
+        if item_id in self.differences:
+            return self.differences[item_id] is not None
+        return item_id in self.base
+
+    def __iter__(self):
+        for item_id in self.base:
+            if self.differences.get(item_id, True) is not None:
+                yield item_id
+        for item_id, difference in self.differences.items():
+            if difference is not None and difference[1] is None:
+                yield item_id
+
+    def __len__(self):
+        return sum(1 for item_id in self)
+
+
+class ItemsCache(object):
+    """
+    Loads the items files (items.json and the others) from a directory.
+    The content of each file is compiled to a cache file the first time it's loaded, and read from there
+    on the next launches. A cache file is used as long as the items file has the same size and modification
+    time, or the same content hash if only the modification time changed (an update rewriting the same file).
+    Files loaded as an ItemsLayer only have their differences with their base file in the cache.
+    """
+    # Change this when the content of the cache files changes, older ones are then rebuilt
+    format_version = 2
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.cache_directory = directory + "items_cache/"
+        self.log = logging.getLogger("tracker")
+        # file name => content hash of the files we loaded
+        self.hashes = {}
+
+    def load(self, file_name, base_name=None, base=None):
+        """
+        Return the dict in the items file file_name.
+        If base_name is given, base being what this returned for the file base_name, return an ItemsLayer on top of base instead.
+        """
+        start_time = time.perf_counter()
+        path = self.directory + file_name
+        cache_path = self.cache_directory + file_name + ".cache"
+        stat = os.stat(path)
+        base_hash = self.hashes.get(base_name)
+        cached = self.__read_cache(cache_path)
+        if cached is not None and cached['base_hash'] != base_hash:
+            cached = None
+        if cached is not None and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime_ns:
+            items = cached['items']
+            self.hashes[file_name] = cached['hash']
+            self.log.debug("Loaded %s from its cache in %.1f ms", file_name, (time.perf_counter() - start_time) * 1000)
+            return items if base_name is None else ItemsLayer(base, items)
+
+        with open(path, "rb") as items_file:
+            content = items_file.read()
+        content_hash = hashlib.sha1(content).hexdigest()
+        if cached is not None and cached['hash'] == content_hash:
+            items = cached['items']
+            self.log.debug("Loaded %s from its cache in %.1f ms, it was touched", file_name, (time.perf_counter() - start_time) * 1000)
+        else:
+            items = json.loads(content)
+            ItemInfo.check_item_keys(items, file_name)
+            if base_name is not None:
+                items = ItemsLayer.compare(base, items)
+            self.log.debug("Loaded %s in %.1f ms", file_name, (time.perf_counter() - start_time) * 1000)
+        self.hashes[file_name] = content_hash
+        self.__write_cache(cache_path, {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'hash': content_hash, 'base_hash': base_hash, 'items': items})
+        return items if base_name is None else ItemsLayer(base, items)
+
+    def __read_cache(self, cache_path):
+        try:
+            with open(cache_path, "rb") as cache_file:
+                cached = marshal.loads(cache_file.read())
+            if cached.get('format_version') != ItemsCache.format_version:
+                return None
+        except (OSError, EOFError, ValueError, TypeError, AttributeError):
+            return None
+        return cached
+
+    def __write_cache(self, cache_path, cached):
+        cached['format_version'] = ItemsCache.format_version
+        # Write to a temporary file first, so a crash in the middle doesn't leave a broken cache
+        temporary_path = cache_path + ".tmp"
+        try:
+            os.makedirs(self.cache_directory, exist_ok=True)
+            with open(temporary_path, "wb") as cache_file:
+                cache_file.write(marshal.dumps(cached))
+            os.replace(temporary_path, cache_path)
+        except (OSError, ValueError) as e:
+            log_error("Couldn't save the items cache: " + str(e))
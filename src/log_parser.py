@@ -3,10 +3,16 @@ import re       # For parsing the log file (regular expressions)
 import os       # For working with files on the operating system
 import logging  # For logging
 import shutil   # For backing logs
+import collections
 from datetime import datetime
 from game_objects.item import Item
-from game_objects.floor import Floor, Curse
+from game_objects.floor import Curse
 from game_objects.state import TrackerState
+from game_objects.events import RunStarted, PlayerInitialized, FloorEntered, CurseApplied, ItemAdded, ItemRemoved, Reroll, \
+    ItemsHidden, ItemsShown, ItemsCleared, AdditionalCharItemsRemoved, RoomEntered, GreedModeDetected, VersionNumberRead, \
+    ModVersionRead, SaveSlotRead, RunContinued
+from log_reader import LogTailReader, LogReverseScanner
+from parser_checkpoint import ParserCheckpoint
 from options import Options
 from view_controls.view import DrawingTool
 from error_stuff import log_error
@@ -15,28 +21,137 @@ class LogParser(object):
     """
     This class loads Isaac's log file, and incrementally modify a state representing this log
     """
+    # Every kind of line we react to, with the pattern recognizing it. Most of them are recognized
+    # by how they start, once the prefixes the game and mods put in front of them are sliced off.
+    # The names match the keys of self.line_handlers, and everything is compiled in a single regex
+    # so most lines are classified (or rejected) in one match.
+    line_patterns = (
+        ('version', r'Binding of Isaac: (?:Repentance|Afterbirth|Rebirth)'), # Repentance and Repentance+ as well as AB and AB+ version messages both start with this text (Rep+ and AB+ have a + at the end)
+        ('save', r'Loading PersistentData'),
+        ('online_run', r'Menu_OnlineLobby::notify_game_start\(\)|Saving screenshot\.\.\.'),
+        ('seed', r'RNG Start Seed:'),
+        ('player', r'Initialized player with Variant'),
+        ('floor', r'Level::Init'),
+        ('room', r'Room'),
+        ('curse', r'Curse'),
+        ('coop_baby', r'Spawn co-player!'),
+        ('item_add', r'Adding collectible '),
+        ('trinket_gulp', r'Gulping trinket |Adding smelted trinket '),
+        ('item_remove', r'Removing collectible |Removing smelted trinket '),
+        ('reseed', r'Executing command: reseed'),
+        ('crash', r'Caught exception,'),
+        ('shut_down', r'Isaac has shut down'),
+        ('mod_text', r'REBIRTH_ITEM_TRACKER_WRITE_TO_FILE'),
+        ('mod_remove', r'REBIRTH_ITEM_TRACKER_REMOVE_COLLECTIBLE'),
+    )
+    # These ones can be anywhere in the line
+    anywhere_patterns = (
+        ('mod_version', r'[|] (?:Racing[+]|The Babies Mod|Achievement Randomizer) \d+.\d+.\d+ initialized.'),
+        ('reroll', r'Added \d+ Collectibles'),
+    )
+    # Substrings that every line matching one of the patterns above contains. Only the lines
+    # containing one of them are read out of the log, so keep this in sync with the patterns.
+    relevant_markers = tuple(marker.encode() for marker in (
+        'Binding of Isaac: ',
+        'Loading PersistentData',
+        'Menu_OnlineLobby::notify_game_start()',
+        'Saving screenshot...',
+        'RNG Start Seed:',
+        'Initialized player with Variant',
+        'Level::Init',
+        'Room',
+        'Curse',
+        'Spawn co-player!',
+        'Adding collectible ',
+        'Gulping trinket ',
+        'Adding smelted trinket ',
+        'Removing collectible ',
+        'Removing smelted trinket ',
+        'Executing command: reseed',
+        'Caught exception,',
+        'Isaac has shut down',
+        'REBIRTH_ITEM_TRACKER_',
+        'initialized.',
+        'Collectibles',
+    ))
+    # In Afterbirth+, nearly all lines start with '[INFO] - '.
+    #TODO Okay, this is a jank hack. When you start the tracker in a middle of a run
+    #then take an item, this item will not be registered because the tracker thinks that
+    #the line start with "INFO] - ". I don't know what causes this so this is a bandaid.
+    # Messages printed by mods start with 'Lua Debug: ', we slice it off so mods can spoof actual game log messages to us if they want to.
+    # In Repentance+, they add the frame number in the player initialization line.
+    line_regex = re.compile(r"(?:\[INFO\] - )?(?:INFO\] - )?(?:Lua Debug: )?(?:\[Frame: \d+\] )?(?:" +
+                            "|".join("(?P<" + kind + ">" + pattern + ")" for kind, pattern in line_patterns) + ")")
+    anywhere_regex = re.compile("|".join("(?P<" + kind + ">" + pattern + ")" for kind, pattern in anywhere_patterns))
+    mod_version_regex = re.compile(r"[|] (Racing[+]|The Babies Mod|Achievement Randomizer) (\d+).(\d+).(\d+) initialized.")
+    save_regex = re.compile(r"Loading PersistentData (\d+)")
+    player_regex = re.compile(r"Initialized player with Variant (\d+) and Subtype (\d+)")
+    room_regex = re.compile(r"Room (.+?)\(")
+    item_pool_regex = re.compile(r" from pool .*")
+    floor_regex = re.compile(r"Level::Init m_Stage (\d+), m_StageType (\d+)")
+    rebirth_floor_regex = re.compile(r"Level::Init m_Stage (\d+), m_AltStage (\d+)")
+    # Number of lines kept in LogParser.recent_lines
+    recent_line_count = 8
+    # Variables of the parser that are saved in checkpoints, see save_checkpoint
+    checkpoint_fields = ('run_start_line', 'spawned_coop_baby', 'reseeding_floor', 'current_seed', 'first_line', 'curse_first_floor', 'is_online_run')
+
     def __init__(self, prefix, tracker_version, log_finder):
         self.state = TrackerState("", tracker_version, Options().game_version, "", "", "", "", -1)
         self.log = logging.getLogger("tracker")
         self.wdir_prefix = prefix
         self.log_finder = log_finder
+        self.log_reader = None
+        # Goes up every time the state may have changed, so other threads know when to look at it again
+        self.version = 0
+        self.checkpoint = ParserCheckpoint(self.wdir_prefix + "parser_checkpoint.json")
+        # Functions called with every event applied to the state, after it's applied. Every change the parser makes
+        # to its state is an event, so applying them in order to the state we had after the last reset (or the state
+        # resumed from a checkpoint) gives the parser's state
+        self.event_listeners = []
+        # True if we parsed lines since the last checkpoint
+        self.checkpoint_outdated = False
+        self.line_handlers = {
+            'version': lambda line_number, line: self.__parse_version_number(line),
+            'save': lambda line_number, line: self.__parse_save(line),
+            'online_run': lambda line_number, line: setattr(self, 'is_online_run', True),
+            'seed': lambda line_number, line: self.__parse_seed(line, line_number),
+            'player': lambda line_number, line: self.__parse_player(line),
+            'floor': lambda line_number, line: self.__parse_level_init(line, line_number),
+            'room': lambda line_number, line: self.__parse_room(line, line_number),
+            'curse': lambda line_number, line: self.__parse_curse(line),
+            'coop_baby': lambda line_number, line: setattr(self, 'spawned_coop_baby', line_number + self.seek),
+            'item_add': self.__parse_item_add,
+            'trinket_gulp': lambda line_number, line: self.__parse_trinket_gulp(line),
+            'item_remove': lambda line_number, line: self.__parse_item_remove(line),
+            # racing+ re-generates floors if they contain duplicate rooms. we need to track that this is happening
+            # so we don't erroneously think the entire run is being restarted when it happens on b1.
+            'reseed': lambda line_number, line: setattr(self, 'reseeding_floor', True),
+            'crash': lambda line_number, line: self.__backup_log(crash=True),
+            'shut_down': lambda line_number, line: self.__backup_log(),
+            'mod_text': lambda line_number, line: self.__parse_mod_text(line),
+            'mod_remove': lambda line_number, line: self.__parse_item_remove(line, forceRemoveActive=True),
+            'mod_version': lambda line_number, line: self.__parse_mod_version(line),
+            'reroll': lambda line_number, line: self.__parse_reroll(),
+        }
 
         self.reset()
 
     def reset(self):
         """Reset variable specific to the log file/run"""
+        self.version += 1
         # Variables describing the parser state
         self.getting_start_items = False
         self.reseeding_floor = False
         self.current_seed = ""
-        # Cached contents of log
-        self.content = ""
-        # Log split into lines
-        self.splitfile = []
+        # The last few relevant lines we parsed, as (line_number, line). Older lines aren't needed, so memory use
+        # doesn't grow with the log
+        self.recent_lines = collections.deque(maxlen=LogParser.recent_line_count)
         self.run_start_line = 0
         self.seek = 0
         self.spawned_coop_baby = 0
-        self.log_file_handle = None
+        if self.log_reader is not None:
+            self.log_reader.close()
+        self.log_reader = None
         # if they switched between rebirth and afterbirth, the log file we use could change
         self.log_file_path = self.log_finder.find_log_file(self.wdir_prefix)
         self.state.reset(self.current_seed, Options().game_version, "", "", "")
@@ -61,123 +176,137 @@ class LogParser(object):
 
         self.opt = Options()
         # Attempt to load log_file
-        if not self.__load_log_file():
+        new_lines = self.__load_log_file()
+        if new_lines is None:
             return None
-        self.splitfile = self.content.splitlines()
 
         # This will become true if we are getting starting items
         self.getting_start_items = False
 
+        if len(new_lines) > 0:
+            self.version += 1
+
         # Process log's new output
-        for current_line_number, line in enumerate(self.splitfile[self.seek:]):
-            self.__parse_line(current_line_number, line)
+        for line_number, line in new_lines:
+            self.__parse_line(line_number - self.seek, line)
+
+        self.seek = self.log_reader.line_count
+        if len(new_lines) > 0:
+            self.checkpoint_outdated = True
+        if self.checkpoint_outdated and self.checkpoint.is_due():
+            self.save_checkpoint()
+        # The states export_state saved while we parsed are written together
+        if TrackerState.export_store.is_due():
+            TrackerState.export_store.write()
+        return self.state
 
+    def save_checkpoint(self):
+        """ Save how far we parsed the log and what we got out of it, so we can resume from there after a restart """
+        if self.log_reader is None:
+            return
+        # The line the game is still writing wasn't parsed yet, it'll be read again after resuming
+        offset = self.log_reader.offset - len(self.log_reader.partial_line)
+        line_count = self.log_reader.line_count
+        self.checkpoint.save({
+            'tracker_version': self.state.tracker_version,
+            'game_version': Options().game_version,
+            'log_file_path': os.path.abspath(self.log_file_path),
+            'log_identity': ParserCheckpoint.log_identity(self.log_file_path, offset),
+            'offset': offset,
+            'line_count': line_count,
+            # Duplicate item lines are detected by comparing them with the line before them
+            'last_line': self.__recent_line(line_count - 1),
+            'parser': {name: getattr(self, name) for name in LogParser.checkpoint_fields},
+            'state': self.state.get_checkpoint(),
+        })
+        self.checkpoint_outdated = False
+
+    def __resume_from_checkpoint(self):
+        """ If we have a checkpoint for the log as it is now, pick up from there instead of parsing the log from the start """
+        checkpoint = self.checkpoint.load(self.log_file_path)
+        if checkpoint is None or checkpoint['game_version'] != Options().game_version or checkpoint['tracker_version'] != self.state.tracker_version:
+            return False
+        try:
+            state = TrackerState.from_checkpoint(checkpoint['state'])
+        except (KeyError, IndexError, TypeError, ValueError):
+            # Probably made with different item files
+            self.log.debug("Couldn't rebuild the state saved in the checkpoint")
+            return False
 
-        self.seek = len(self.splitfile)
-        return self.state
+        self.state = state
+        for name in LogParser.checkpoint_fields:
+            setattr(self, name, checkpoint['parser'][name])
+        self.log_reader.offset = checkpoint['offset']
+        self.log_reader.line_count = self.seek = checkpoint['line_count']
+        if checkpoint['last_line'] is not None:
+            self.recent_lines.append((self.seek - 1, checkpoint['last_line']))
+        self.log.debug("Resumed from the checkpoint at line %d", self.seek)
+        return True
 
     def __parse_line(self, line_number, line):
         """
         Parse a line using the (line_number, line) tuple
         """
-        # In Afterbirth+, nearly all lines start with this.
-        # We want to slice it off.
-        info_prefix = '[INFO] - '
-        #TODO Okay, this is a jank hack. When you start the tracker in a middle of a run 
-        #then take an item, this item will not be registered because the tracker thinks that
-        #the line start with "INFO] - ". I don't know what causes this so this is a bandaid.
-        info_prefix2 = 'INFO] - '
-        if line.startswith(info_prefix):
-            line = line[len(info_prefix):]
-        if line.startswith(info_prefix2):
-            line = line[len(info_prefix2):]
-
-        # Messages printed by mods have this prefix.
-        # strip it, so mods can spoof actual game log messages to us if they want to
-        luadebug_prefix ='Lua Debug: '
-        if line.startswith(luadebug_prefix):
-            line = line[len(luadebug_prefix):]
-
-        # In Repentance+, they add the frame number in the player initialization line.
-        regexp_str_f = r"\[Frame: (\d+)\] "
-        search_result_f = re.search(regexp_str_f, line)
-        if search_result_f is not None and line.startswith(search_result_f.group(0)):
-            line = line[len(search_result_f.group(0)):]
-
-        regexp_str_r = r"[|] Racing[+] (\d+).(\d+).(\d+) initialized."
-        regexp_str_b = r"[|] The Babies Mod (\d+).(\d+).(\d+) initialized."
-        regexp_str_i = r"[|] Achievement Randomizer (\d+).(\d+).(\d+) initialized."
-        search_result_r = re.search(regexp_str_r, line)
-        search_result_b = re.search(regexp_str_b, line)
-        search_result_i = re.search(regexp_str_i, line)
-
-        # Repentance and Repentance+ as well as AB and AB+ version messages both start with this text (Rep+ and AB+ have a + at the end)
-        if line.startswith('Binding of Isaac: Repentance') or line.startswith('Binding of Isaac: Afterbirth') or line.startswith('Binding of Isaac: Rebirth'):
-            self.__parse_version_number(line)
-        if search_result_r is not None:
-            self.state.racing_plus_version = "/ R+: "+ str(int(search_result_r.group(1))) + "." + str(int(search_result_r.group(2))) + "." + str(int(search_result_r.group(3))) + " "
-        if search_result_b is not None:
-            self.state.babies_mod_version = "/ Babies Mod: "+ str(int(search_result_b.group(1))) + "." + str(int(search_result_b.group(2))) + "." + str(int(search_result_b.group(3))) + " "
-        if search_result_i is not None:
-            self.state.IAR_version = "/ Achievement Randomizer: "+ str(int(search_result_i.group(1))) + "." + str(int(search_result_i.group(2))) + "." + str(int(search_result_i.group(3))) + " "
-        if line.startswith('Loading PersistentData'):
-            self.__parse_save(line)
-        if line.startswith('Menu_OnlineLobby::notify_game_start()') or line.startswith('Saving screenshot...'):
-            self.is_online_run = True
-        if line.startswith('RNG Start Seed:'):
-            self.__parse_seed(line, line_number)
-        if line.startswith('Initialized player with Variant') and self.state.player == -1:
-            self.__parse_player(line)
-        if self.opt.game_version in ["Repentance", "Repentance+"] and line.startswith('Level::Init') and self.state.greedmode == 1: # Store the line of the first floor in Repentance because we can detect if we are in greed mode only after this line in the log
-            self.first_line = line
-            self.curse_first_floor = ""
-        elif line.startswith('Level::Init'):
-            self.__parse_floor(line, line_number)   
-        if line.startswith('Room'):
-            self.__parse_room(line)
-            if self.opt.game_version in ["Repentance", "Repentance+"]:
-                self.detect_greed_mode(line, line_number)
-                self.state.remove_additional_char_items()
-        if line.startswith("Curse"):
-            self.__parse_curse(line)
-        if line.startswith("Spawn co-player!"):
-            self.spawned_coop_baby = line_number + self.seek
-        if re.search(r"Added \d+ Collectibles", line):
-            self.log.debug("Reroll detected!")
-            self.state.reroll()
-        if line.startswith('Adding collectible '):
-            self.__parse_item_add(line_number, line)
-        if line.startswith('Gulping trinket ') or line.startswith('Adding smelted trinket '):
-            self.__parse_trinket_gulp(line)
-        if line.startswith('Removing collectible ') or line.startswith('Removing smelted trinket '):
-            self.__parse_item_remove(line)
-        if line.startswith('Executing command: reseed'):
-            # racing+ re-generates floors if they contain duplicate rooms. we need to track that this is happening
-            # so we don't erroneously think the entire run is being restarted when it happens on b1.
-            self.reseeding_floor = True
-        if line.startswith('Caught exception,'):
-            self.__backup_log(crash=True)
-        if line.startswith('Isaac has shut down'):
-            self.__backup_log()
-        if line.startswith('REBIRTH_ITEM_TRACKER_WRITE_TO_FILE'):
-            self.__parse_mod_text(line)
-        if line.startswith('REBIRTH_ITEM_TRACKER_REMOVE_COLLECTIBLE'):
-            self.__parse_item_remove(line, forceRemoveActive=True)
-
+        # One match slices off the prefixes and tells us which handler the line is for, if any
+        match = LogParser.line_regex.match(line)
+        if match is not None:
+            kind = match.lastgroup
+            self.line_handlers[kind](line_number, line[match.start(kind):])
+        elif "initialized." in line or "Collectibles" in line:
+            # Searching the whole line is slow, so only do it if it can contain one of the anywhere_patterns
+            match = LogParser.anywhere_regex.search(line)
+            if match is not None:
+                self.line_handlers[match.lastgroup](line_number, line)
+        self.recent_lines.append((line_number + self.seek, line))
+
+    def import_state(self):
+        """ Load the state saved with export_state for the current game version and save slot, if there's one """
+        self.__emit(RunContinued(TrackerState.export_store.load_state(self.state.game_version, self.state.save) or {}))
+
+    def __emit(self, event):
+        """ Apply an event to the state and hand it to the event listeners. Return what applying it returned """
+        result = self.state.apply_event(event)
+        for listener in self.event_listeners:
+            listener(event)
+        return result
+
+    def __recent_line(self, line_number):
+        """ Return the line at line_number if it's one of the recent lines, None otherwise """
+        for recent_line_number, line in reversed(self.recent_lines):
+            if recent_line_number == line_number:
+                return line
+            if recent_line_number < line_number:
+                return None
+        return None
 
     def __trigger_new_run(self, line_number):
         self.log.debug("Starting new run, seed: %s", self.current_seed)
         self.run_start_line = line_number + self.seek
-        self.state.reset(self.current_seed, Options().game_version, self.state.racing_plus_version, self.state.babies_mod_version, self.state.IAR_version)
+        self.__emit(RunStarted(self.current_seed, Options().game_version))
 
     def __parse_version_number(self, line):
         words = line.split()
-        self.state.version_number = words[-1]
+        self.__emit(VersionNumberRead(words[-1]))
+
+    def __parse_mod_version(self, line):
+        search_result = LogParser.mod_version_regex.search(line)
+        if search_result is None:
+            return
+        version = str(int(search_result.group(2))) + "." + str(int(search_result.group(3))) + "." + str(int(search_result.group(4))) + " "
+        if search_result.group(1) == "Racing+":
+            self.__emit(ModVersionRead("Racing+", "/ R+: " + version))
+        elif search_result.group(1) == "The Babies Mod":
+            self.__emit(ModVersionRead("The Babies Mod", "/ Babies Mod: " + version))
+        else:
+            self.__emit(ModVersionRead(search_result.group(1), "/ Achievement Randomizer: " + version))
+
+    def __parse_reroll(self):
+        self.log.debug("Reroll detected!")
+        self.__emit(Reroll())
 
     def __parse_save(self,line):
-        regexp_str = r"Loading PersistentData (\d+)"
-        search_result = re.search(regexp_str, line)
-        self.state.save = int(search_result.group(1)) if search_result is not None else 0
+        search_result = LogParser.save_regex.search(line)
+        self.__emit(SaveSlotRead(int(search_result.group(1)) if search_result is not None else 0))
 
     def __parse_seed(self, line, line_number):
         """ Parse a seed line """
@@ -193,50 +322,61 @@ class LogParser(object):
         elif self.opt.game_version == "Repentance+" and space_split[6] == '[Net,':
             self.is_online_run = True
         elif (self.opt.game_version in ["Repentance", "Repentance+"] and space_split[6] == '[Continue,'):
-            self.state.load_from_export_state()
+            self.import_state()
 
     def __parse_player(self, line):
-        regexp_str = r"Initialized player with Variant (\d+) and Subtype (\d+)"
-        search_result = re.search(regexp_str, line)
-        self.state.player = int(search_result.group(2)) if search_result is not None else 8 # Put it on Lazarus by default
+        if self.state.player != -1:
+            return
+        search_result = LogParser.player_regex.search(line)
+        self.__emit(PlayerInitialized(int(search_result.group(2)) if search_result is not None else 8)) # Put it on Lazarus by default
 
-    def __parse_room(self, line):
+    def __parse_room(self, line, line_number):
         """ Parse a room line """
         if 'Start Room' not in line:
             self.getting_start_items = False
 
-        match = re.search(r"Room (.+?)\(", line)
+        match = LogParser.room_regex.search(line)
         if match:
             room_id = match.group(1)
-            self.state.change_room(room_id)
+            self.__emit(RoomEntered(room_id))
+
+        if self.opt.game_version in ["Repentance", "Repentance+"]:
+            self.detect_greed_mode(line, line_number)
+            self.__emit(AdditionalCharItemsRemoved())
 
     def detect_greed_mode(self, line, line_number):
         # Detect if we're in Greed mode or not in Repentance. We must do a ton of hacky things to show the first floor with curses because we can't detect greed mode in one line anymore
-        match = re.search(r"Room (.+?)\(", line)
+        match = LogParser.room_regex.search(line)
         if match:
             room_id = match.group(1)
             if room_id == '18.1000': # Genesis room
-                self.state.item_list = []
-                self.state.reset_transformations()
-                self.state.modified = True
+                self.__emit(ItemsCleared())
             elif self.state.greedmode == 1:
                 if room_id in self.greed_mode_starting_rooms:
-                    self.state.greedmode = 2
+                    self.__emit(GreedModeDetected())
                 self.__parse_floor(self.first_line, line_number)
                 self.__parse_curse(self.curse_first_floor)
 
+    def __parse_level_init(self, line, line_number):
+        """ Parse a Level::Init line """
+        if self.opt.game_version in ["Repentance", "Repentance+"] and self.state.greedmode == 1: # Store the line of the first floor in Repentance because we can detect if we are in greed mode only after this line in the log
+            self.first_line = line
+            self.curse_first_floor = ""
+        else:
+            self.__parse_floor(line, line_number)
+
     def __parse_floor(self, line, line_number):
         """ Parse the floor in line and push it to the state """
         # Create a floor tuple with the floor id and the alternate id
         if self.opt.game_version in ["Afterbirth", "Afterbirth+", "Repentance", "Repentance+"]:
-            regexp_str = r"Level::Init m_Stage (\d+), m_StageType (\d+)"
+            floor_regex = LogParser.floor_regex
         elif self.opt.game_version in ["Rebirth", "Antibirth"]:
-            regexp_str = r"Level::Init m_Stage (\d+), m_AltStage (\d+)"
+            floor_regex = LogParser.rebirth_floor_regex
         else:
             return
-        search_result = re.search(regexp_str, line)
+        search_result = floor_regex.search(line)
         if search_result is None:
-            self.log.debug("log.txt line doesn't match expected regex\nline: \"" + line+ "\"\nregex:\"" + regexp_str + "\"")
+            self.log.debug("log.txt line doesn't match expected regex\nline: \"" + line+ "\"\nregex:\"" + floor_regex.pattern + "\"")
             return
 
         floor = int(search_result.group(1))
@@ -286,7 +426,7 @@ class LogParser(object):
         # Greed mode
         if (alt == '3' and self.opt.game_version not in ["Repentance", "Repentance+"]) or (self.opt.game_version in ["Repentance", "Repentance+"] and self.state.greedmode == 2):
             floor_id += 'g'
-        self.state.add_floor(Floor(floor_id))
+        self.__emit(FloorEntered(floor_id))
         self.state.export_state()
         return True
 
@@ -299,19 +439,18 @@ class LogParser(object):
         elif self.state.greedmode == 2:
             self.curse_first_floor = ""
         if line.startswith("Curse of the Labyrinth!") or (self.curse_first_floor == "Curse of the Labyrinth!" and self.opt.game_version in ["Repentance", "Repentance+"]):
-            self.state.add_curse(Curse.Labyrinth)
+            self.__emit(CurseApplied(Curse.Labyrinth))
         if line.startswith("Curse of Blind") or (self.curse_first_floor == "Curse of Blind" and self.opt.game_version in ["Repentance", "Repentance+"]):
-            self.state.add_curse(Curse.Blind)
+            self.__emit(CurseApplied(Curse.Blind))
 
     def __parse_item_add(self, line_number, line):
         # In Repentance+ they added 'from pool x' at the end of an item taken so we remove it to be able to show the multi char icons
-        regexp_str = r" from pool .*"
-        search_result = re.search(regexp_str, line)
+        search_result = LogParser.item_pool_regex.search(line)
         if search_result is not None:
             line = line.replace(search_result.group(), "")
 
         """ Parse an item and push it to the state """
-        if len(self.splitfile) > 1 and self.splitfile[line_number + self.seek - 1] == line:
+        if self.__recent_line(line_number + self.seek - 1) == line:
             self.log.debug("Skipped duplicate item line from baby presence")
             return False
         is_Jacob_item = line.endswith(self.jacob_names) and self.opt.game_version in ["Repentance", "Repentance+"] and self.state.player == 19
@@ -327,9 +466,9 @@ class LogParser(object):
             is_EsauSoul_item = "player 0" not in line and line.endswith(self.esau_names)
 
         if self.state.player == 19 and not is_Esau_item and not is_Jacob_item and not is_Strawman_item and not is_EsauSoul_item: # This is when J&E transform into another character
-            self.state.player = 8 # Put it on Lazarus by default just in case we got another Anemic
+            self.__emit(PlayerInitialized(8)) # Put it on Lazarus by default just in case we got another Anemic
         elif self.state.player not in (19, 37) and is_Jacob_item:
-            self.state.player = 19
+            self.__emit(PlayerInitialized(19))
 
         space_split = line.split(" ")
         numeric_id = space_split[2] # When you pick up an item, this has the form: "Adding collectible 105 (The D6)" or "Adding collectible 105 (The D6) to Player 0 (Isaac)" in Repentance
@@ -367,7 +506,8 @@ class LogParser(object):
         # It's a blind pickup if we're on a blind floor and we don't have the Black Candle
         blind_pickup = self.state.last_floor.floor_has_curse(Curse.Blind) and not self.state.contains_item('260')
         if not (numeric_id == "214" and ((self.state.contains_item('214') and self.state.contains_item('332')) or (self.state.player == 8 and self.state.contains_item('214')))):
-            added = self.state.add_item(Item(item_id, numeric_id, self.state.last_floor, self.getting_start_items, blind=blind_pickup, is_Jacob_item=is_Jacob_item, is_Esau_item=is_Esau_item, is_Strawman_item=is_Strawman_item, is_EsauSoul_item=is_EsauSoul_item, shown=Item.get_item_info(item_id).shown))
+            flags = Item.flag_string(starting_item=self.getting_start_items, blind=blind_pickup, is_Jacob_item=is_Jacob_item, is_Esau_item=is_Esau_item, is_Strawman_item=is_Strawman_item, is_EsauSoul_item=is_EsauSoul_item)
+            added = self.__emit(ItemAdded(item_id, numeric_id, flags, shown=Item.get_item_info(item_id).shown))
             if not added:
                 self.log.debug("Skipped adding item %s to avoid space-bar duplicate", item_id)
         else:
@@ -380,31 +520,19 @@ class LogParser(object):
 
     def __parse_add_multi_items(self):
         """Add custom sprites for multi-segmented items like Super Bum, key pieces or knife pieces"""
-        # item.info.shown = False is for not showing the item on the tracker
+        # item.visible = False is for not showing the item on the tracker
         # item.shown = False is for the export_state function to store the actual shown value instead of the initial value item.info.shown
         if self.state.contains_item('238') and self.state.contains_item('239') and not self.state.contains_item('3000'):
-            for item in reversed(self.state.item_list):
-                if item.item_id in ("238", "239"):
-                    item.info.shown = False
-                    item.shown = False
-            self.state.add_item(Item("3000", "3000", floor=self.state.last_floor))
+            self.__emit(ItemsHidden(["238", "239"]))
+            self.__emit(ItemAdded("3000", "3000"))
         elif self.state.contains_item('550') and self.state.contains_item('552'):
-            for item in reversed(self.state.item_list):
-                if item.item_id == "550":
-                    item.info.shown = False
-                    item.shown = False
+            self.__emit(ItemsHidden(["550"]))
         elif self.state.contains_item('144') and self.state.contains_item('278') and self.state.contains_item('388') and not self.state.contains_item('3001') and self.opt.game_version not in ["Rebirth", "Antibirth"]:
-            for item in reversed(self.state.item_list):
-                if item.item_id in ("144", "278", "388"):
-                    item.info.shown = False
-                    item.shown = False
-            self.state.add_item(Item("3001", "3001", floor=self.state.last_floor))
+            self.__emit(ItemsHidden(["144", "278", "388"]))
+            self.__emit(ItemAdded("3001", "3001"))
         elif self.state.contains_item('626') and self.state.contains_item('627') and not self.state.contains_item('3002'):
-            for item in reversed(self.state.item_list):
-                if item.item_id in ("626", "627"):
-                    item.info.shown = False
-                    item.shown = False
-            self.state.add_item(Item("3002", "3002", floor=self.state.last_floor))    
+            self.__emit(ItemsHidden(["626", "627"]))
+            self.__emit(ItemAdded("3002", "3002"))    
 
     def __parse_trinket_gulp(self, line):
         """ Parse a (modded) trinket gulp and push it to the state """
@@ -430,7 +558,7 @@ class LogParser(object):
 
         self.log.debug("Gulped trinket: %s", item_id)
 
-        added = self.state.add_item(Item(item_id, numeric_id, self.state.last_floor, self.getting_start_items, is_Jacob_item=is_Jacob_item, is_Esau_item=is_Esau_item))
+        added = self.__emit(ItemAdded(item_id, numeric_id, Item.flag_string(starting_item=self.getting_start_items, is_Jacob_item=is_Jacob_item, is_Esau_item=is_Esau_item)))
         if not added:
             self.log.debug("Skipped adding item %s to avoid space-bar duplicate", item_id)
         self.state.export_state()
@@ -462,29 +590,23 @@ class LogParser(object):
             self.__parse_remove_multi_items(item_id=item_id)
 
         if item_id == "667":
-            self.state.remove_additional_char_items(strawman=True)
+            self.__emit(AdditionalCharItemsRemoved(strawman=True))
 
         # A check will be made inside the remove_item function
         # to see if this item is actually in our inventory or not.
-        return self.state.remove_item(removal_id, forceRemoveActive)
+        return self.__emit(ItemRemoved(removal_id, forceRemoveActive))
 
     def __parse_remove_multi_items(self, item_id):
         """Remove custom sprites for multi-segmented items like Super Bum, key pieces or knife pieces"""
         if item_id in ("238", "239"):
-            for item in reversed(self.state.item_list):
-                if item.item_id in ("238", "239"):
-                    item.info.shown = True
-            self.state.remove_item("3000")
+            self.__emit(ItemsShown(["238", "239"]))
+            self.__emit(ItemRemoved("3000"))
         elif item_id in ("144", "278", "388"):
-            for item in reversed(self.state.item_list):
-                if item.item_id in ("144", "278", "388"):
-                    item.info.shown = True
-            self.state.remove_item("3001")
+            self.__emit(ItemsShown(["144", "278", "388"]))
+            self.__emit(ItemRemoved("3001"))
         elif item_id in ("626", "627"):
-            for item in reversed(self.state.item_list):
-                if item.item_id in ("626", "627"):
-                    item.info.shown = True
-            self.state.remove_item("3002")       
+            self.__emit(ItemsShown(["626", "627"]))
+            self.__emit(ItemRemoved("3002"))       
 
     def __parse_mod_text(self, line):
         line = line.replace("REBIRTH_ITEM_TRACKER_WRITE_TO_FILE ","")
@@ -492,23 +614,131 @@ class LogParser(object):
         f.write(line)
         f.close()
 
-    def __load_log_file(self):
-        if self.log_file_path is None:
+    def __skip_to_current_run(self):
+        """
+        Start reading the log where the current run starts, instead of at its beginning.
+        The few lines before it that still matter (game and mod versions, save slot...) are parsed first,
+        the runs before it are skipped entirely.
+        """
+        scanner = LogReverseScanner(self.log_file_path)
+        if not scanner.open():
             return False
+        try:
+            run_start = self.__find_run_start(scanner)
+            if run_start is None:
+                return False
+            context = self.__find_run_context(scanner, run_start)
+            line_numbers = scanner.line_numbers([run_start] + [offset for offset, line in context])
+        finally:
+            scanner.close()
+
+        context_lines = [(line_numbers[offset], line) for offset, line in sorted(context)]
+        for line_number, line in context_lines:
+            self.__parse_line(line_number, line)
+        self.log_reader.offset = run_start
+        self.log_reader.line_count = line_numbers[run_start]
+        self.log.debug("Skipped to the current run, at line %d", line_numbers[run_start])
+        return True
 
-        if self.log_file_handle is None:
-            self.log_file_handle = open(self.log_file_path, 'r', encoding='utf-8', errors='replace')
+    def __find_run_start(self, scanner):
+        """ Return the offset of the line the current run starts at, or None if we have to parse the log from its beginning """
+        if self.opt.game_version in ["Repentance", "Repentance+"]:
+            for offset, line, content in self.__lines_of_kind(scanner, b"RNG Start Seed:", 'seed', scanner.size):
+                words = content.split(" ")
+                run_type = words[6] if len(words) > 6 else ""
+                if run_type in ('[New,', '[Daily,'):
+                    return offset
+                elif run_type == '[Continue,':
+                    # The continued run is loaded from its saved state (see ExportStore), and parsing the whole log may be what fills it
+                    return None
+        elif self.opt.game_version == "Antibirth":
+            for offset, line, content in self.__lines_of_kind(scanner, b"RNG Start Seed:", 'seed', scanner.size):
+                return offset
+        elif self.opt.game_version in ["Rebirth", "Afterbirth", "Afterbirth+"]:
+            # The run starts with the generation of the first floor, unless racing+ is reseeding it (see __parse_floor)
+            floor_regex = LogParser.rebirth_floor_regex if self.opt.game_version == "Rebirth" else LogParser.floor_regex
+            level_inits = self.__lines_of_kind(scanner, b"Level::Init", 'floor', scanner.size)
+            level_init = next(level_inits, None)
+            while level_init is not None:
+                previous_level_init = next(level_inits, None)
+                search_result = floor_regex.search(level_init[2])
+                if search_result is not None and search_result.group(1) == "1":
+                    reseed = next(self.__lines_of_kind(scanner, b"Executing command: reseed", 'reseed', level_init[0]), None)
+                    if reseed is None or (previous_level_init is not None and reseed[0] < previous_level_init[0]):
+                        return level_init[0]
+                level_init = previous_level_init
+        return None
+
+    def __find_run_context(self, scanner, run_start):
+        """ Return the (offset, line) list of the lines before run_start that have an effect on the parsing of the run """
+        context = []
+        markers = [(b"Binding of Isaac: ", 'version'),
+                   (b"Loading PersistentData", 'save'),
+                   (b"REBIRTH_ITEM_TRACKER_WRITE_TO_FILE", 'mod_text'),
+                   (b"Spawn co-player!", 'coop_baby'),
+                   (b"Menu_OnlineLobby::notify_game_start()", 'online_run'),
+                   (b"Saving screenshot...", 'online_run'),
+                   (b"| Racing+ ", 'mod_version'),
+                   (b"| The Babies Mod ", 'mod_version'),
+                   (b"| Achievement Randomizer ", 'mod_version')]
+        if self.opt.game_version in ["Rebirth", "Afterbirth", "Afterbirth+"]:
+            # The seed is printed before the first floor is generated
+            markers.append((b"RNG Start Seed:", 'seed'))
+        for marker, kind in markers:
+            last_line = next(self.__lines_of_kind(scanner, marker, kind, run_start), None)
+            if last_line is not None:
+                context.append(last_line[:2])
+
+        # The first curse since the last floor that isn't the first one is remembered across runs, see __parse_curse
+        floor_regex = LogParser.rebirth_floor_regex if self.opt.game_version in ["Rebirth", "Antibirth"] else LogParser.floor_regex
+        floors_start = 0
+        for offset, line, content in self.__lines_of_kind(scanner, b"Level::Init", 'floor', run_start):
+            search_result = floor_regex.search(content)
+            # Alternate floors of the first chapter aren't the first floor (see __parse_floor)
+            if search_result is not None and (search_result.group(1) != "1" or (floor_regex is LogParser.floor_regex and search_result.group(2) in ('4', '5'))):
+                floors_start = offset
+                break
+        for offset, line, content in self.__lines_of_kind(scanner, b"Curse", 'curse', run_start):
+            if offset < floors_start:
+                break
+            context.append((offset, line))
+        return context
+
+    @staticmethod
+    def __lines_of_kind(scanner, marker, kind, end):
+        """
+        Yield the (offset, line, content) of the lines before end that contain marker and that __parse_line
+        would give to the handler of kind, the last one first. content is what the handler gets.
+        """
+        for offset, line in scanner.lines(marker, end):
+            match = LogParser.line_regex.match(line)
+            if match is not None:
+                if match.lastgroup == kind:
+                    yield offset, line, line[match.start(kind):]
+            else:
+                match = LogParser.anywhere_regex.search(line)
+                if match is not None and match.lastgroup == kind:
+                    yield offset, line, line
 
-        cached_length = len(self.content)
-        file_size = os.path.getsize(self.log_file_path)
+    def __load_log_file(self):
+        """
+        Read the relevant lines the game appended to the log since the last call.
+        Returns the list of new (line_number, line), or None if the log file couldn't be found
+        """
+        if self.log_file_path is None:
+            return None
 
-        if cached_length > file_size or cached_length == 0: # New log file or first time loading the log
+        if self.log_reader is not None and self.log_reader.is_stale(): # New log file
             self.reset()
-            self.content = open(self.log_file_path, 'r', encoding='utf-8', errors='replace').read()
-        elif cached_length < file_size:  # Append existing content
-            self.log_file_handle.seek(cached_length + 1)
-            self.content += self.log_file_handle.read()
-        return True
+            if self.log_file_path is None:
+                return None
+
+        if self.log_reader is None:
+            self.log_reader = LogTailReader(self.log_file_path, LogParser.relevant_markers)
+            if not self.__resume_from_checkpoint():
+                self.__skip_to_current_run()
+
+        return self.log_reader.read_lines()
 
 
     def __backup_log(self, crash=False):
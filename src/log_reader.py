@@ -0,0 +1,217 @@
+""" This module handles reading Isaac's log file incrementally """
+import os
+import mmap     # For catching up on big logs without reading them in one piece
+
+
+def decode_line(line):
+    """ Turn a line of the log, without its line break, into a string """
+    if line.endswith(b"\r"):
+        line = line[:-1]
+    return line.decode('utf-8', errors='replace')
+
+
+class LogTailReader(object):
+    """
+    Follows the end of the log file and hands out the lines appended to it since the last read.
+    A line is only handed out once it's complete: the partial line the game is still writing
+    stays buffered until its end shows up, so we never re-read or re-split what we already consumed.
+    Everything is tracked in bytes, and only complete lines are decoded, so multi-byte characters
+    (localized character names for instance) can't be cut in half or throw the offsets off.
+    Only the lines containing one of the given markers are decoded at all: the markers are looked for
+    in the raw bytes, and the lines in between are just counted.
+    The reader also remembers what identifies the log it's reading (see is_stale), so it notices when
+    the game restarts and writes a new log in the same file.
+    """
+    # Number of bytes at the beginning of the log, and right before our offset, kept to recognize the log
+    identity_size = 4096
+    # Reads at least this big go through mmap, one window at a time, instead of a single read() call.
+    # Set it to None to never use mmap.
+    mmap_threshold = 4 * 1024 * 1024
+    mmap_window = 1024 * 1024
+
+    def __init__(self, path, markers):
+        self.path = path
+        # Byte strings, a line is handed out if it contains any of them
+        self.markers = markers
+        self.handle = None
+        # Byte offset of the end of what we read so far
+        self.offset = 0
+        # Beginning of the line the game is still writing, not decoded yet
+        self.partial_line = b""
+        # Number of complete lines read so far, handed out or not
+        self.line_count = 0
+        # (device, inode) of the file we read, the beginning of the log up to its version header line,
+        # and the bytes that came right before our offset
+        self.file_id = None
+        self.head = b""
+        self.anchor = b""
+
+    def is_stale(self):
+        """
+        Return true if the log isn't the one we've been reading anymore, meaning the game started a new one.
+        Comparing lengths isn't enough, the new log may already be longer than what we read of the old one,
+        so we check that the file is the same one, and that its beginning and the bytes before our offset didn't change.
+        Every new log starts with the same lines, the last check is the one telling them apart.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return True
+        if self.handle is None:
+            return False
+        if (stat.st_dev, stat.st_ino) != self.file_id or stat.st_size < self.offset:
+            return True
+        return self.__read_at(0, len(self.head)) != self.head or \
+            self.__read_at(self.offset - len(self.anchor), len(self.anchor)) != self.anchor
+
+    def read_lines(self):
+        """
+        Return the (line_number, line) list of the relevant complete lines appended to the log since the last call.
+        line_number counts every line of the log, starting at 0.
+        """
+        if self.handle is None:
+            # Unbuffered, a buffer could give is_stale what was there before the game rewrote the file
+            self.handle = open(self.path, 'rb', buffering=0)
+            stat = os.fstat(self.handle.fileno())
+            self.file_id = (stat.st_dev, stat.st_ino)
+            # We may be starting in the middle of the log, see LogParser.__skip_to_current_run
+            self.__remember_identity()
+
+        file_size = os.fstat(self.handle.fileno()).st_size
+        if file_size <= self.offset:
+            return []
+
+        lines = []
+        for chunk in self.__read_chunks(file_size):
+            self.offset += len(chunk)
+            lines.extend(self.__relevant_lines(chunk))
+        self.__remember_identity()
+        return lines
+
+    def __remember_identity(self):
+        """ Keep what is_stale compares, for the part of the log we read """
+        if len(self.head) < self.identity_size and len(self.head) < self.offset:
+            self.head = self.__read_at(0, min(self.offset, self.identity_size))
+            # If the version header line starts in there, keep all of it
+            header = self.head.find(b"Binding of Isaac: ")
+            if header != -1 and self.head.find(b"\n", header) == -1:
+                self.head += self.handle.readline(self.offset - len(self.head))
+        anchor_size = min(self.offset, self.identity_size)
+        self.anchor = self.__read_at(self.offset - anchor_size, anchor_size)
+
+    def __read_at(self, offset, size):
+        self.handle.seek(offset)
+        return self.handle.read(size)
+
+    def __read_chunks(self, file_size):
+        """ Yield the bytes between our offset and file_size """
+        mapped_log = None
+        if self.mmap_threshold is not None and file_size - self.offset >= self.mmap_threshold:
+            try:
+                mapped_log = mmap.mmap(self.handle.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                # Some file systems can't be mapped, read() still works there
+                mapped_log = None
+
+        if mapped_log is None:
+            self.handle.seek(self.offset)
+            yield self.handle.read(file_size - self.offset)
+            return
+
+        with mapped_log:
+            for start in range(self.offset, file_size, self.mmap_window):
+                yield mapped_log[start:min(start + self.mmap_window, file_size)]
+
+    def __relevant_lines(self, chunk):
+        """ Decode the relevant complete lines of chunk, and keep what comes after the last line break for later """
+        data = self.partial_line + chunk
+        end = data.rfind(b"\n") + 1
+        self.partial_line = data[end:]
+
+        # Find where the lines containing a marker start
+        line_starts = set()
+        for marker in self.markers:
+            position = data.find(marker, 0, end)
+            while position != -1:
+                line_starts.add(data.rfind(b"\n", 0, position) + 1)
+                # Look for the next one after this line, we already have it
+                position = data.find(marker, data.find(b"\n", position), end)
+
+        lines = []
+        line_number = self.line_count
+        counted_until = 0
+        for line_start in sorted(line_starts):
+            line_number += data.count(b"\n", counted_until, line_start)
+            counted_until = line_start
+            lines.append((line_number, decode_line(data[line_start:data.find(b"\n", line_start)])))
+        self.line_count = line_number + data.count(b"\n", counted_until, end)
+        return lines
+
+    def close(self):
+        """ Release the file handle """
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+
+class LogReverseScanner(object):
+    """
+    Looks for lines in the log starting from its end, so finding something near the end doesn't
+    require reading everything before it. The log is mapped in memory and searched backwards from a
+    given offset, and only the lines containing what we look for are decoded.
+    """
+    # Size of the pieces the log is counted in, see line_numbers
+    count_window = 1024 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+        self.mapped_log = None
+
+    def open(self):
+        """ Map the log in memory. Return false if that's not possible, because it's empty for instance """
+        try:
+            self.handle = open(self.path, 'rb')
+            self.mapped_log = mmap.mmap(self.handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self.close()
+            return False
+        return True
+
+    @property
+    def size(self):
+        return len(self.mapped_log)
+
+    def lines(self, marker, end):
+        """ Yield the (offset, line) of the complete lines containing marker that end before end, the last one first """
+        position = self.mapped_log.rfind(marker, 0, end)
+        while position != -1:
+            line_start = self.mapped_log.rfind(b"\n", 0, position) + 1
+            line_end = self.mapped_log.find(b"\n", position)
+            # The game may still be writing the last line
+            if line_end != -1 and line_end < end:
+                yield line_start, decode_line(self.mapped_log[line_start:line_end])
+            position = self.mapped_log.rfind(marker, 0, line_start)
+
+    def line_numbers(self, offsets):
+        """ Return a dict giving the number of lines before each of the offsets """
+        line_numbers = {}
+        line_count = 0
+        counted_until = 0
+        for offset in sorted(offsets):
+            # Counting is done window by window to avoid copying the whole log at once
+            while counted_until < offset:
+                window_end = min(offset, counted_until + self.count_window)
+                line_count += self.mapped_log[counted_until:window_end].count(b"\n")
+                counted_until = window_end
+            line_numbers[offset] = line_count
+        return line_numbers
+
+    def close(self):
+        """ Release the mapping and the file handle """
+        if self.mapped_log is not None:
+            self.mapped_log.close()
+            self.mapped_log = None
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
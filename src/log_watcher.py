@@ -0,0 +1,213 @@
+""" This module tells the parser when the log file changes """
+import os
+import platform
+import select
+import struct
+import threading
+import time
+import ctypes, ctypes.util  # For inotify, which the standard library doesn't wrap
+
+
+class LogWatcher(object):
+    """
+    Waits for changes to the log file.
+    On Linux it subscribes to inotify events for the log's directory, so a write to log.txt (or the game
+    creating a new one) wakes us up right away without ever polling the file.
+    Elsewhere, or if inotify isn't available, it polls the file's size and modification time, and polls
+    less and less often while the file stays quiet.
+    """
+    # inotify_event's fixed size part: wd, mask, cookie, len
+    inotify_event = struct.Struct("iIII")
+    IN_MODIFY, IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x2, 0x40, 0x80, 0x100, 0x200
+    IN_DELETE_SELF, IN_MOVE_SELF, IN_NONBLOCK, IN_CLOEXEC = 0x400, 0x800, 0o4000, 0o2000000
+    watch_mask = IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+    # Polling intervals in seconds, when we have to poll
+    min_poll_interval = 1.0 / 30
+    max_poll_interval = 1.0
+
+    def __init__(self):
+        self.path = None
+        self.libc = None
+        self.inotify_fd = None
+        self.watch_descriptor = None
+        self.poll_interval = self.min_poll_interval
+        self.signature = None
+        self.woken = threading.Event()
+        self.wake_pipe = None
+        # wake() and close() can be called from other threads, they mustn't touch the pipe while it's being
+        # closed, and the file descriptors stay open while wait() selects on them
+        self.lock = threading.Lock()
+        self.waiting = False
+        self.closed = False
+        if platform.system() == "Linux":
+            self.__start_inotify()
+
+    def __start_inotify(self):
+        try:
+            self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            inotify_fd = self.libc.inotify_init1(LogWatcher.IN_NONBLOCK | LogWatcher.IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return
+        if inotify_fd < 0:
+            return
+        self.inotify_fd = inotify_fd
+        # Writing to this pipe interrupts the select() waiting for inotify events
+        self.wake_pipe = os.pipe()
+        os.set_blocking(self.wake_pipe[0], False)
+        # If the pipe is full, there's already a wake-up waiting to be read
+        os.set_blocking(self.wake_pipe[1], False)
+
+    @property
+    def uses_inotify(self):
+        return self.watch_descriptor is not None
+
+    def watch(self, path):
+        """ Start watching path instead of the previous one. path can be None, then we only wait for wake() """
+        if path == self.path:
+            return
+        self.path = path
+        self.signature = self.__file_signature()
+        self.poll_interval = self.min_poll_interval
+        if self.inotify_fd is None:
+            return
+        if self.watch_descriptor is not None:
+            self.libc.inotify_rm_watch(self.inotify_fd, self.watch_descriptor)
+            self.watch_descriptor = None
+        if path is not None:
+            directory = os.path.dirname(os.path.abspath(path))
+            watch_descriptor = self.libc.inotify_add_watch(self.inotify_fd, os.fsencode(directory), LogWatcher.watch_mask)
+            # If we can't watch the directory, we'll poll the file instead
+            if watch_descriptor >= 0:
+                self.watch_descriptor = watch_descriptor
+
+    def wait(self, timeout):
+        """
+        Block until the log file changes, wake() is called or timeout seconds passed.
+        Return true if the log file changed.
+        """
+        if self.uses_inotify:
+            return self.__wait_for_events(timeout)
+        return self.__poll(timeout)
+
+    def wake(self):
+        """ Interrupt wait(), this can be called from any thread """
+        self.woken.set()
+        with self.lock:
+            self.__write_wake_pipe()
+
+    def __write_wake_pipe(self):
+        """ Make the pipe readable (call with the lock) """
+        if self.wake_pipe is not None:
+            try:
+                os.write(self.wake_pipe[1], b"\0")
+            except BlockingIOError:
+                # The pipe is full, so there are wake-ups waiting to be read already
+                pass
+
+    def __wait_for_events(self, timeout):
+        with self.lock:
+            if self.closed:
+                return False
+            self.waiting = True
+        try:
+            return self.__select_events(timeout)
+        finally:
+            with self.lock:
+                self.waiting = False
+                # close() left the file descriptors to us if it was called while we were selecting on them
+                if self.closed:
+                    self.__close_descriptors()
+
+    def __select_events(self, timeout):
+        deadline = time.time() + timeout
+        log_name = os.fsencode(os.path.basename(self.path))
+        wake_fd = self.wake_pipe[0]
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            readable = select.select([self.inotify_fd, wake_fd], [], [], remaining)[0]
+            if wake_fd in readable:
+                self.__drain(wake_fd)
+                self.woken.clear()
+                return False
+            # Other files in the log's directory don't matter, keep waiting if they're all we heard about
+            if self.inotify_fd in readable and self.__log_changed(log_name):
+                return True
+
+    def __log_changed(self, log_name):
+        """ Read every pending inotify event, return true if one of them is about the log """
+        changed = False
+        for events in iter(lambda: self.__read(self.inotify_fd), b""):
+            position = 0
+            while position < len(events):
+                mask, name_length = LogWatcher.inotify_event.unpack_from(events, position)[1::2]
+                position += LogWatcher.inotify_event.size
+                name = events[position:position + name_length].rstrip(b"\0")
+                position += name_length
+                # Events about the directory itself have no name
+                if name == log_name or mask & (LogWatcher.IN_DELETE_SELF | LogWatcher.IN_MOVE_SELF):
+                    changed = True
+        return changed
+
+    def __poll(self, timeout):
+        deadline = time.time() + timeout
+        while True:
+            signature = self.__file_signature()
+            if signature != self.signature:
+                self.signature = signature
+                self.poll_interval = self.min_poll_interval
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            # Nothing happened since the last check, so wait a bit longer before the next one
+            woken = self.woken.wait(min(self.poll_interval, remaining))
+            self.poll_interval = min(self.poll_interval * 2, self.max_poll_interval)
+            if woken:
+                self.woken.clear()
+                return False
+
+    def __file_signature(self):
+        if self.path is None:
+            return None
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    @staticmethod
+    def __read(fd):
+        try:
+            return os.read(fd, 4096)
+        except BlockingIOError:
+            return b""
+
+    @staticmethod
+    def __drain(fd):
+        while LogWatcher.__read(fd):
+            pass
+
+    def close(self):
+        """ Stop watching, wake() does nothing after this """
+        with self.lock:
+            if self.closed or self.inotify_fd is None:
+                return
+            self.closed = True
+            if self.waiting:
+                # wait() closes them when it stops selecting on them
+                self.__write_wake_pipe()
+            else:
+                self.__close_descriptors()
+
+    def __close_descriptors(self):
+        """ Close inotify and the pipe, we poll after this (call with the lock) """
+        if self.inotify_fd is not None:
+            os.close(self.wake_pipe[0])
+            os.close(self.wake_pipe[1])
+            os.close(self.inotify_fd)
+            self.wake_pipe = None
+            self.inotify_fd = None
+            self.watch_descriptor = None
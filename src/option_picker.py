@@ -8,7 +8,7 @@ import re
 import tkinter.ttk
 import pygame.sysfont
 from options import Options
-import urllib.request, urllib.error, urllib.parse
+from http_client import HttpClient
 import webbrowser
 import platform
 import threading
@@ -185,7 +185,7 @@ class OptionsMenu(object):
     def get_server_userlist_and_enqueue(self):
         try:
             url = self.entries['trackerserver_url'].get() + "/tracker/api/userlist/"
-            json_state = urllib.request.urlopen(url).read()
+            json_state = HttpClient().get(url)
             users = json.loads(json_state)
             success = True
         except Exception:
@@ -198,7 +198,7 @@ class OptionsMenu(object):
     def get_server_twitch_client_id(self):
         try:
             url = self.entries['trackerserver_url'].get() + "/tracker/api/twitchclientid/"
-            return urllib.request.urlopen(url).read()
+            return HttpClient().get(url)
         except Exception:
             log_error("Couldn't get twitch client id from tracker server\n" + traceback.format_exc())
             return None
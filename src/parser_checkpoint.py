@@ -0,0 +1,76 @@
+""" This module saves the log parser's progress, so a restarted tracker doesn't have to parse the whole log again """
+import os
+import json
+import time
+import hashlib
+from error_stuff import log_error
+
+
+class ParserCheckpoint(object):
+    """
+    Reads and writes the parser's checkpoint file: how far in the log the parser went, what it needs
+    to keep parsing from there, and the state it built so far.
+    A checkpoint is only used if it was made for the same log, which we check with the log's file id and
+    hashes of its first bytes and of the bytes right before the checkpoint. The game re-uses the same
+    file for every session, so the last hash is the one telling a new session from the one we saved.
+    """
+    # Change this when the content of the file changes, older checkpoints are then ignored
+    format_version = 3
+    # Number of bytes hashed at the beginning of the log, and before the checkpoint's offset
+    fingerprint_size = 4096
+    # Seconds between two saves while the game is writing to the log
+    save_interval = 5.0
+
+    def __init__(self, path):
+        self.path = path
+        self.last_save_time = 0
+
+    @staticmethod
+    def log_identity(log_path, offset):
+        """ Return a json-compatible value identifying the first offset bytes of the log """
+        with open(log_path, 'rb') as log_file:
+            stat = os.fstat(log_file.fileno())
+            head = log_file.read(min(offset, ParserCheckpoint.fingerprint_size))
+            log_file.seek(max(0, offset - ParserCheckpoint.fingerprint_size))
+            anchor = log_file.read(offset - log_file.tell())
+        return {
+            'file_id': [stat.st_dev, stat.st_ino],
+            'head': hashlib.sha1(head).hexdigest(),
+            'anchor': hashlib.sha1(anchor).hexdigest(),
+        }
+
+    def is_due(self):
+        """ Return true if it's been long enough since the last save """
+        return time.time() - self.last_save_time >= self.save_interval
+
+    def save(self, checkpoint):
+        """ Write the checkpoint dict to the file """
+        self.last_save_time = time.time()
+        checkpoint = dict(checkpoint, format_version=ParserCheckpoint.format_version)
+        # Write to a temporary file first, so a crash in the middle leaves the previous checkpoint intact
+        temporary_path = self.path + ".tmp"
+        try:
+            with open(temporary_path, "w") as checkpoint_file:
+                json.dump(checkpoint, checkpoint_file)
+            os.replace(temporary_path, self.path)
+        except OSError as e:
+            log_error("Couldn't save the parser checkpoint: " + str(e))
+
+    def load(self, log_path):
+        """
+        Return the saved checkpoint dict if it was made for the log at log_path as it is now, None otherwise.
+        The returned dict has the same content as the one given to save.
+        """
+        try:
+            with open(self.path, "r") as checkpoint_file:
+                checkpoint = json.load(checkpoint_file)
+            if checkpoint.get('format_version') != ParserCheckpoint.format_version:
+                return None
+            if checkpoint['log_file_path'] != os.path.abspath(log_path):
+                return None
+            offset = checkpoint['offset']
+            if os.path.getsize(log_path) < offset or ParserCheckpoint.log_identity(log_path, offset) != checkpoint['log_identity']:
+                return None
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return checkpoint
@@ -0,0 +1,95 @@
+""" This module runs the log parser away from the window's thread """
+import copy
+import threading
+import time
+from log_watcher import LogWatcher
+from game_objects.state import TrackerState
+from options import Options
+
+
+class ParserThread(threading.Thread):
+    """
+    Runs the LogParser in the background, so a big catch-up parse or a log backup never freezes the window.
+    The parser's state is only ever touched by this thread: every time it changes, a copy of it is
+    published along with a version number, and the window draws that copy.
+    Between two parses it sleeps until the log changes, instead of re-reading it on a timer.
+    """
+    # Parse anyway after this many seconds without hearing about a change, in case we missed one
+    idle_timeout = 1.0
+
+    def __init__(self, parser):
+        super(ParserThread, self).__init__(name="log parser", daemon=True)
+        self.parser = parser
+        # (version, state) of the latest copy of the parser's state, state is None if we couldn't find log.txt
+        self.published = (0, None)
+        # Exception that stopped the thread, the main thread re-raises it
+        self.error = None
+        self.reset_requested = False
+        self.import_requested = False
+        self.stopped = False
+        self.watcher = LogWatcher()
+        self.__parsed_version = None
+
+    def run(self):
+        try:
+            while not self.stopped:
+                parse_time = time.time()
+                self.__update()
+                self.watcher.watch(self.parser.log_file_path)
+                self.watcher.wait(self.idle_timeout)
+                # The game writes in bursts, we don't need to parse every one of them
+                time.sleep(max(0, parse_time + self.min_interval() - time.time()))
+            # So the next start can pick up from here
+            if self.parser.checkpoint_outdated:
+                self.parser.save_checkpoint()
+            TrackerState.export_store.write()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.watcher.close()
+
+    def min_interval(self):
+        """ Minimum number of seconds between two parses """
+        opt = Options()
+        return max(opt.log_file_check_seconds, 1.0 / opt.framerate_limit)
+
+    def __update(self):
+        """ Handle the window's requests, parse what was added to the log and publish the new state if needed """
+        if self.reset_requested:
+            self.reset_requested = False
+            self.parser.reset()
+        if Options().read_from_server:
+            return
+
+        state = self.parser.parse()
+        if self.import_requested:
+            self.import_requested = False
+            if state is not None:
+                self.parser.import_state()
+
+        if state is None:
+            # Only publish the first None, or the change from a state to None
+            if self.published[0] == 0 or self.published[1] is not None:
+                self.__publish(None)
+        elif state.modified or self.parser.version != self.__parsed_version:
+            self.__publish(copy.deepcopy(state))
+            # The copy keeps the flag for the window, ours is only here to tell us about the next change
+            state.modified = False
+        self.__parsed_version = self.parser.version
+
+    def __publish(self, state):
+        self.published = (self.published[0] + 1, state)
+
+    def request_reset(self):
+        """ Ask for the parser to be reset before its next parse """
+        self.reset_requested = True
+        self.watcher.wake()
+
+    def request_import(self):
+        """ Ask for the state saved by export_state to be loaded into the parser's state """
+        self.import_requested = True
+        self.watcher.wake()
+
+    def stop(self):
+        self.stopped = True
+        self.watcher.wake()
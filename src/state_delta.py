@@ -0,0 +1,75 @@
+""" This module describes the changes between two states, so a state can be sent without sending all of it again """
+
+
+class StateDelta(object):
+    """
+    The changes between two json dicts of a state (as made by TrackerState.get_export), made by compare and
+    applied by apply. A delta holds the version of the state it was made from (base_version), it only makes
+    sense applied to that state.
+    The lists of the state (floors and items) are described by the indexes of the elements that were removed,
+    index => changed values for the elements that changed (indexes in the list without the removed elements),
+    and the elements added at the end of the list. Picking up, losing or rerolling items only changes a few of them.
+    The dicts (transformations) are described by key => new value for the keys that changed, and the keys that
+    were removed. Any other value that changed is sent whole.
+    """
+    # Change this when the content of a delta changes, the server refuses the ones it doesn't know
+    format_version = 1
+    # The values telling which element of the old list an element of the new list is
+    list_identities = {
+        'floor_list': ('floor_id',),
+        'item_list': ('item_id', 'numeric_id', 'floor_id'),
+    }
+
+    @staticmethod
+    def compare(base, state, base_version):
+        """ Return the delta turning the state dict base, whose version is base_version, into the state dict state """
+        delta = {'format_version': StateDelta.format_version, 'base_version': base_version, 'values': {}, 'lists': {}, 'dicts': {}}
+        for key, value in state.items():
+            base_value = base.get(key)
+            if value == base_value:
+                continue
+            if key in StateDelta.list_identities and isinstance(base_value, list):
+                delta['lists'][key] = StateDelta.compare_lists(base_value, value, StateDelta.list_identities[key])
+            elif isinstance(value, dict) and isinstance(base_value, dict):
+                delta['dicts'][key] = {
+                    'changed': {k: v for k, v in value.items() if k not in base_value or base_value[k] != v},
+                    'removed': [k for k in base_value if k not in value],
+                }
+            else:
+                delta['values'][key] = value
+        return delta
+
+    @staticmethod
+    def compare_lists(base, elements, identity):
+        """ Return the changes turning the list of dicts base into elements, identity are the keys telling which element is which """
+        removed = []
+        changed = {}
+        index = 0
+        for base_index, base_element in enumerate(base):
+            if index < len(elements) and all(elements[index].get(key) == base_element.get(key) for key in identity):
+                if elements[index] != base_element:
+                    changed[str(index)] = {key: value for key, value in elements[index].items() if base_element.get(key) != value}
+                index += 1
+            else:
+                removed.append(base_index)
+        return {'removed': removed, 'changed': changed, 'added': elements[index:]}
+
+    @staticmethod
+    def apply(base, delta):
+        """ Return the state dict made by applying delta to the state dict base, base isn't modified """
+        state = dict(base)
+        state.update(delta['values'])
+        for key, list_delta in delta['lists'].items():
+            removed = set(list_delta['removed'])
+            elements = [element for index, element in enumerate(base[key]) if index not in removed]
+            for index, values in list_delta['changed'].items():
+                elements[int(index)] = dict(elements[int(index)], **values)
+            elements.extend(list_delta['added'])
+            state[key] = elements
+        for key, dict_delta in delta['dicts'].items():
+            values = dict(base[key])
+            values.update(dict_delta['changed'])
+            for removed_key in dict_delta['removed']:
+                del values[removed_key]
+            state[key] = values
+        return state
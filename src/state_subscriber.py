@@ -0,0 +1,123 @@
+""" This module gets the states of the player we're watching from the server as soon as they're uploaded """
+import json
+import random
+import threading
+import traceback
+from http_client import HttpClient
+from game_objects.state import TrackerState
+from state_delta import StateDelta
+from error_stuff import log_error
+
+
+class VersionMismatch(Exception):
+    """ The player we're watching uses another version of the tracker, and we can't read their state """
+
+
+class StateSubscriber(threading.Thread):
+    """
+    Waits for the new states of one player on the server, instead of asking it every few seconds if there's one.
+    It asks url + "/subscribe" with the version of the last state it got (after=): the server holds the request
+    until a newer state is uploaded, and answers with it, or with its changes since our version (see StateDelta).
+    If nothing was uploaded after wait seconds, the server answers 204 and we ask again. After a lost connection,
+    we ask for what happened since our version, so the server only needs to send the changes we missed.
+    A server that doesn't know about subscriptions answers the first request with an error, or with something that
+    isn't an answer to a subscription (a web page...): if the first request fails in any way, supported becomes
+    false, the thread stops, and the states have to be polled like before.
+    One subscriber only watches one url, a new one is started when we watch someone else, so we don't have to wait
+    for the server to answer the request in progress.
+    """
+    # Seconds the server can hold a request before answering that nothing changed
+    wait = 25
+    # Seconds before asking again after the first failure, and at most after the next ones
+    retry_delay = 1.0
+    max_retry_delay = 30.0
+    error_text = "Unable to read state from server. Please verify your options setup and tracker_log.txt"
+
+    def __init__(self, url, tracker_version):
+        super(StateSubscriber, self).__init__(name="state subscriber", daemon=True)
+        self.url = url
+        self.tracker_version = tracker_version
+        # None until the server answers, then whether it knows about subscriptions
+        self.supported = None
+        # Message to show instead of the state if the last request failed, None if it worked
+        self.error_message = None
+        # (version, TrackerState) of the states we got that weren't taken with take_states
+        self.received = []
+        # (version, state dict) of the last state we got, the deltas are applied to it
+        self.current = None
+        self.failures = 0
+        self.stopped = False
+        self.condition = threading.Condition()
+
+    def take_states(self):
+        """ Return the (version, TrackerState) we got since the last call, oldest first """
+        with self.condition:
+            received = self.received
+            self.received = []
+        return received
+
+    def stop(self):
+        """ Stop watching, what the server answers to the request in progress (if any) is ignored """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def run(self):
+        while not self.stopped:
+            try:
+                self.__subscribe()
+                self.error_message = None
+                self.failures = 0
+                continue
+            except Exception as e:
+                if self.stopped:
+                    # We don't care about this request anymore
+                    return
+                if self.supported is None:
+                    log_error("Couldn't subscribe to the server, asking it for the states every few seconds instead\n" + traceback.format_exc())
+                    self.supported = False
+                    return
+                # Like the uploader, only the first failure of a series goes in the log
+                if self.failures == 0:
+                    log_error("Couldn't load state from server\n" + traceback.format_exc())
+                error_message = str(e) if isinstance(e, VersionMismatch) else self.error_text
+            with self.condition:
+                self.error_message = error_message
+                self.failures += 1
+                # Like the uploader, don't let every spectator come back at the same time
+                self.condition.wait(min(self.max_retry_delay, self.retry_delay * 2 ** (self.failures - 1)) * random.uniform(0.5, 1.0))
+
+    def __subscribe(self):
+        """ Wait for the next state of the player on the server, and add it to the received states """
+        after = "" if self.current is None else "after=" + str(self.current[0]) + "&"
+        status, headers, body = HttpClient().request('GET', self.url + "/subscribe?" + after + "wait=" + str(self.wait), timeout=self.wait + HttpClient.timeout)
+        # Nothing new while the server waited
+        if status == 204:
+            self.supported = True
+            return
+        answer = json.loads(body)
+        if not isinstance(answer, dict) or ("state" not in answer and "delta" not in answer):
+            raise ValueError("The server's answer isn't a state")
+        version = int(answer["version"])
+        # Only a server that knows about subscriptions answers like this
+        self.supported = True
+        if "delta" in answer:
+            delta = answer["delta"]
+            if self.current is None or delta["base_version"] != self.current[0]:
+                # Not made from the state we have, ask for the whole state next time
+                self.current = None
+                return
+            json_dict = StateDelta.apply(self.current[1], delta)
+        else:
+            json_dict = answer["state"]
+        new_state = TrackerState.from_json(json_dict)
+        if new_state is None:
+            their_version = json_dict.get("tracker_version", "0.10-beta1") if isinstance(json_dict, dict) else None
+            if their_version is not None and their_version != self.tracker_version:
+                raise VersionMismatch("They are using tracker version " + str(their_version) + " but you have " + self.tracker_version)
+            raise Exception("server gave us empty state")
+        with self.condition:
+            if self.stopped:
+                return
+            self.current = (version, json_dict)
+            self.received.append((version, new_state))
@@ -0,0 +1,149 @@
+""" This module sends the tracker's state to the server away from the window's thread """
+import json
+import random
+import threading
+import time
+import traceback
+from http_client import HttpClient, HttpError
+from state_delta import StateDelta
+from error_stuff import log_error
+
+
+class StateUploader(threading.Thread):
+    """
+    Uploads the states given to upload to the tracker server in the background, so a slow server never freezes the window.
+    Only the newest state is kept: the server only needs the last one, so a state given while another one is
+    waiting replaces it. A failed upload is retried after a delay that doubles with every failure, with some
+    randomness so the trackers that lost the server at the same time don't all come back at once. The state
+    sent then is the newest one.
+    The whole state is sent with a PUT. A server that answers with the version of the state it has can take
+    the next states as their changes from that one (see StateDelta), sent with a PATCH to the same url. If the
+    server doesn't have that version anymore (409), or doesn't know about deltas, the whole state is sent instead.
+    """
+    # Seconds before retrying after the first failure, and at most after the next ones
+    retry_delay = 1.0
+    max_retry_delay = 60.0
+
+    def __init__(self):
+        super(StateUploader, self).__init__(name="state uploader", daemon=True)
+        # (url, state) of the newest state that wasn't uploaded, None if there's none
+        self.pending = None
+        # True while a state is being sent
+        self.uploading = False
+        # Message to show instead of the state if the last upload failed, None if it worked
+        self.error_message = None
+        # Seconds the last successful upload took, None if none worked yet
+        self.last_success_latency = None
+        # (url, version, state dict) of the last state the server told us it has, None if it didn't
+        self.acknowledged = None
+        self.failures = 0
+        # Goes up every time the uploads are cancelled, so we know to ignore how the upload in progress went
+        self.generation = 0
+        self.retry_requested = False
+        self.stopped = False
+        self.condition = threading.Condition()
+
+    def upload(self, state, url):
+        """ Send the state to url (PUT), as soon as the uploads before it are done """
+        with self.condition:
+            self.pending = (url, state)
+            self.condition.notify()
+
+    def queue_depth(self):
+        """ Return how many states are waiting to be uploaded or being uploaded """
+        return (self.pending is not None) + self.uploading
+
+    def retry_now(self):
+        """ Stop waiting to retry a failed upload, for example when the options changed """
+        with self.condition:
+            self.failures = 0
+            self.retry_requested = True
+            self.condition.notify()
+
+    def cancel(self):
+        """ Forget about the state waiting to be uploaded, and about the last error """
+        with self.condition:
+            self.pending = None
+            self.error_message = None
+            self.failures = 0
+            self.generation += 1
+
+    def stop(self):
+        """ Ask the thread to stop, the upload in progress (if any) isn't interrupted """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                url, state = self.pending
+                self.pending = None
+                self.uploading = True
+                generation = self.generation
+            error_message, latency = self.__send(state, url)
+            with self.condition:
+                self.uploading = False
+                if generation != self.generation:
+                    # The uploads were cancelled while we were sending it
+                    continue
+                self.error_message = error_message
+                if error_message is None:
+                    if self.failures > 0:
+                        log_error("Sent item info to server again after " + str(self.failures) + " failed uploads")
+                    self.last_success_latency = latency
+                    self.failures = 0
+                    continue
+                # Send it again, unless a newer one came in meanwhile
+                if self.pending is None:
+                    self.pending = (url, state)
+                self.failures += 1
+                delay = min(self.max_retry_delay, self.retry_delay * 2 ** (self.failures - 1)) * random.uniform(0.5, 1.0)
+                retry_time = time.time() + delay
+                self.retry_requested = False
+                # New states only replace the one we'll send when it's time
+                while not self.stopped and not self.retry_requested and time.time() < retry_time:
+                    self.condition.wait(retry_time - time.time())
+
+    def __send(self, state, url):
+        """ Upload a state, return the error message to show (None if the server got it) and how many seconds it took """
+        start_time = time.time()
+        export = state.get_export()
+        try:
+            result_json = None
+            if self.acknowledged is not None and self.acknowledged[0] == url:
+                result_json = self.__send_delta(export, url)
+            if result_json is None:
+                result_json = HttpClient().send_json('PUT', url, export)
+            if result_json["updated_user"] is None:
+                self.acknowledged = None
+                return "The server didn't recognize you. Try getting a new authkey in the options menu.", None
+        except Exception:
+            # While the server is down every retry fails the same way, only the first failure goes in the log
+            if self.failures == 0:
+                log_error("ERROR: Couldn't send item info to server\n" + traceback.format_exc())
+            return "ERROR: Couldn't send item info to server, check tracker_log.txt", None
+        # Only the servers taking deltas send a version back
+        version = result_json.get("version")
+        self.acknowledged = (url, version, export) if isinstance(version, int) else None
+        return None, time.time() - start_time
+
+    def __send_delta(self, export, url):
+        """ Send the changes since the last state the server has, return its answer, or None if we need to send the whole state """
+        base_version, base = self.acknowledged[1:]
+        delta = StateDelta.compare(base, export, base_version)
+        # In a new run, everything changed
+        if 'seed' in delta['values']:
+            return None
+        try:
+            return HttpClient().send_json('PATCH', url, delta)
+        except HttpError as e:
+            # 409: the server doesn't have our base version anymore. The other ones: it doesn't know about deltas after all
+            if e.code in (400, 404, 405, 409, 501):
+                self.acknowledged = None
+                return None
+            raise
@@ -27,13 +27,13 @@ class Overlay(object):
         return display
 
     @staticmethod
-    def format_transform(transform_set):
-        """Format a transform_set for displaying"""
+    def format_transform(transformation):
+        """Format a Transformation for displaying"""
         # NOTE this is not only used in this class
-        if len(transform_set) >= 3:
+        if transformation.count >= 3:
             return "yes"
         else:
-            return str(len(transform_set))
+            return str(transformation.count)
 
     def update_stats(self, stat_list=None, transform_list=None):
         """
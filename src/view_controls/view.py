@@ -40,6 +40,7 @@ class Drawable(object):
 class Event(object):
     DONE = 1
     OPTIONS_UPDATE = 2
+    IMPORT_STATE = 3
 
 class DrawingTool(object):
     def __init__(self, prefix):
@@ -152,7 +153,7 @@ class DrawingTool(object):
                 elif event.key == K_F4 and pygame.key.get_mods() & KMOD_ALT:
                     return Event.DONE
                 elif event.key == K_c and pygame.key.get_mods() & KMOD_CTRL:
-                    self.state.export_state()
+                    self.state.export_state(now=True)
 
                     # Write the seed to the clipboard
                     # (from http://stackoverflow.com/questions/579687/how-do-i-copy-a-string-to-the-clipboard-on-windows-using-python)
@@ -162,7 +163,8 @@ class DrawingTool(object):
                     r.clipboard_append(self.state.seed)
                     r.destroy()
                 elif event.key == K_n and pygame.key.get_mods() & KMOD_CTRL:
-                    self.state.load_from_export_state()
+                    # The state we draw can be a copy, let the owner of the state load it
+                    return Event.IMPORT_STATE
 
             elif event.type == MOUSEBUTTONDOWN:
                 if event.button == 2:
@@ -200,7 +202,8 @@ class DrawingTool(object):
         Draws the state
         :param state:
         """
-        if self.state != state:
+        new_state = self.state != state
+        if new_state:
             self.reset()
             self.state = state
 
@@ -268,9 +271,9 @@ class DrawingTool(object):
         elif not text_written:
             self.text_height = 0
 
-        # We want to reflow if the state has been modified or if the text
+        # We want to reflow if the state has been modified, if it's a new one or if the text
         # height has changed
-        if self.state.modified or self.text_height != text_height_before:
+        if self.state.modified or new_state or self.text_height != text_height_before:
             self.__reflow()
 
         floor_to_draw = None
@@ -640,7 +643,7 @@ class DrawingTool(object):
         self.drawn_items = []
         self.item_position_index = []
 
-    def set_window_title_info(self, watching=None, uploading=None, watching_player=None, update_notifier=None, updates_queued=None ):
+    def set_window_title_info(self, watching=None, uploading=None, watching_player=None, update_notifier=None, updates_queued=None, uploads_queued=None, upload_latency=None):
         if watching is not None:
             self.window_title_info.watching = watching
         if uploading is not None:
@@ -651,6 +654,10 @@ class DrawingTool(object):
             self.window_title_info.update_notifier = update_notifier
         if updates_queued is not None:
             self.window_title_info.updates_queued = updates_queued
+        if uploads_queued is not None:
+            self.window_title_info.uploads_queued = uploads_queued
+        if upload_latency is not None:
+            self.window_title_info.upload_latency = upload_latency
 
         self.update_window_title()
 
@@ -667,7 +674,9 @@ class DrawingTool(object):
             if self.window_title_info.watching:
                 title += ", spectating " + self.window_title_info.watching_player + ". Delay: " + str(Options().read_delay) + ". Updates queued: " + str(self.window_title_info.updates_queued)
             elif self.window_title_info.uploading:
-                title += ", uploading to server"
+                title += ", uploading to server. Uploads queued: " + str(self.window_title_info.uploads_queued)
+                if self.window_title_info.upload_latency is not None:
+                    title += ". Latency: " + str(int(self.window_title_info.upload_latency * 1000)) + " ms"
 
         # Set the title on the actual window
         pygame.display.set_caption(title)
@@ -685,7 +694,7 @@ class DrawingTool(object):
             return True
         elif item.item_id == "656" and opt.show_active_items: # Show the active version of Damocles only
             return False
-        elif not item.info.shown:
+        elif not item.visible:
             return False
         elif item.info.space and \
                 not opt.show_active_items:
@@ -802,6 +811,8 @@ class WindowTitleInfo:
         self.watching = False
         self.watching_player = None
         self.updates_queued = None
+        self.uploads_queued = 0
+        self.upload_latency = None
         self.update_notifier = None
 
 
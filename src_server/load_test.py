@@ -0,0 +1,241 @@
+"""
+Uploads states to a tracker server from many players at once, with many spectators watching them, and tells how fast
+the server answered. The players and spectators are the tracker's own StateUploader and StateSubscriber.
+Without --url, a local server (tracker_server.py) is started for the test.
+"""
+import argparse
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+server_directory = os.path.dirname(os.path.abspath(__file__))
+# The items files, version.txt... are in the repository, like for the tracker
+wdir_prefix = os.path.join(os.path.dirname(server_directory), "")
+sys.path.append(os.path.join(wdir_prefix, "src"))
+import error_stuff
+from game_objects.item import Item
+from game_objects.floor import Floor
+from game_objects.state import TrackerState
+from http_client import HttpClient
+from items_cache import ItemsCache
+from options import Options
+from state_subscriber import StateSubscriber
+from state_uploader import StateUploader
+
+
+class RunFixture(object):
+    """ Makes the states of a made-up Repentance+ run, one more item (and sometimes a new floor) in each """
+    game_version = "Repentance+"
+    # A new run starts after this many items, so the uploader has to send a whole state again
+    items_per_run = 60
+
+    def __init__(self, tracker_version, item_ids):
+        self.tracker_version = tracker_version
+        self.item_ids = item_ids
+        self.state = None
+
+    def next_state(self):
+        """ Return the next state of the run """
+        if self.state is None or len(self.state.item_list) >= self.items_per_run:
+            seed = "".join(random.choice("ABCDEFGHJKLMNPQRSTWXYZ0123456789") for i in range(8))
+            self.state = TrackerState(seed[:4] + " " + seed[4:], self.tracker_version, self.game_version, "", "", "", "v1.9.7.12", 0)
+            self.state.add_floor(Floor("f1"))
+        elif random.random() < 0.2 and len(self.state.floor_list) < 12:
+            self.state.add_floor(Floor("f" + str(len(self.state.floor_list) + 1)))
+        self.state.add_item(Item(random.choice(self.item_ids), "", self.state.last_floor))
+        return self.state
+
+
+class Player(threading.Thread):
+    """ Uploads a new state of its run every interval seconds, each one once the previous one is done """
+
+    def __init__(self, name, fixture, url, interval, end_time):
+        super(Player, self).__init__(name="player " + name, daemon=True)
+        self.player_name = name
+        self.fixture = fixture
+        self.url = url + "/tracker/api/update/" + name
+        self.interval = interval
+        self.end_time = end_time
+        # Seconds each upload took
+        self.latencies = []
+        self.failures = 0
+        # version => perf_counter time its upload started, for the states the server took
+        self.upload_times = {}
+        # Number of states sent whole and as deltas
+        self.full_uploads = 0
+        self.delta_uploads = 0
+
+    def run(self):
+        uploader = StateUploader()
+        uploader.start()
+        # Players don't all pick up their items at the same time
+        next_time = time.time() + random.uniform(0, self.interval)
+        while time.time() < self.end_time:
+            had_base = uploader.acknowledged is not None
+            seed = self.fixture.state.seed if self.fixture.state is not None else None
+            state = self.fixture.next_state()
+            start_time = time.perf_counter()
+            uploader.upload(state, self.url)
+            # The uploader retries by itself, give up on the ones still not sent at the end
+            while time.time() < self.end_time + 5:
+                with uploader.condition:
+                    if uploader.queue_depth() == 0:
+                        failed = uploader.error_message is not None
+                        version = None if uploader.acknowledged is None else uploader.acknowledged[1]
+                        break
+                time.sleep(0.0005)
+            else:
+                failed = True
+            if failed:
+                self.failures += 1
+            else:
+                self.latencies.append(time.perf_counter() - start_time)
+                self.upload_times[version] = start_time
+                if had_base and state.seed == seed:
+                    self.delta_uploads += 1
+                else:
+                    self.full_uploads += 1
+            next_time += self.interval
+            time.sleep(max(0, next_time - time.time()))
+        uploader.stop()
+
+
+class Spectators(threading.Thread):
+    """ Watches players with StateSubscribers, and writes down when each of their states arrived """
+
+    def __init__(self, url, names, tracker_version):
+        super(Spectators, self).__init__(name="spectators", daemon=True)
+        # The player each spectator watches
+        self.names = names
+        self.subscribers = [StateSubscriber(url + "/tracker/api/user/" + name, tracker_version) for name in names]
+        # (subscriber index, version) => perf_counter time it arrived
+        self.arrivals = {}
+        self.stopped = False
+
+    def run(self):
+        for subscriber in self.subscribers:
+            subscriber.start()
+        while not self.stopped:
+            now = time.perf_counter()
+            for index, subscriber in enumerate(self.subscribers):
+                for version, state in subscriber.take_states():
+                    self.arrivals[(index, version)] = now
+            time.sleep(0.0005)
+        for subscriber in self.subscribers:
+            subscriber.stop()
+
+
+def percentile(values, fraction):
+    """ Return the value that fraction of the sorted values are below """
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def describe_latencies(latencies):
+    if len(latencies) == 0:
+        return "no latency measured"
+    latencies = sorted(latencies)
+    return "latency p50 %.1f ms, p99 %.1f ms, max %.1f ms" % (percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000, latencies[-1] * 1000)
+
+
+def start_local_server():
+    """ Start tracker_server.py on a free port, return its process and url """
+    with socket.socket() as free_socket:
+        free_socket.bind(("127.0.0.1", 0))
+        port = free_socket.getsockname()[1]
+    server = subprocess.Popen([sys.executable, os.path.join(server_directory, "tracker_server.py"), "--port", str(port)], stdout=subprocess.DEVNULL)
+    url = "http://127.0.0.1:" + str(port)
+    for attempt in range(100):
+        try:
+            urllib.request.urlopen(url + "/tracker/api/userlist/", timeout=1).read()
+            return server, url
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    raise Exception("The local tracker server didn't start")
+
+
+def main():
+    """ Main """
+    parser = argparse.ArgumentParser(description="Measure how fast a tracker server takes states from players and sends them to spectators.")
+    parser.add_argument("--url", help="server to test (default: start tracker_server.py)")
+    parser.add_argument("--uploaders", type=int, default=10, help="number of players uploading (default: 10)")
+    parser.add_argument("--spectators", type=int, default=50, help="number of spectators, spread over the players (default: 50)")
+    parser.add_argument("--duration", type=float, default=20, help="seconds the players upload for (default: 20)")
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between two states of a player (default: 0.5)")
+    args = parser.parse_args()
+
+    # The tracker logs its errors to ../tracker_log.txt from where it runs, the test's errors go to a temporary file instead
+    log_path = os.path.join(tempfile.mkdtemp(prefix="tracker_load_test_"), "tracker_log.txt")
+    for handler in list(error_stuff.error_log.handlers):
+        error_stuff.error_log.removeHandler(handler)
+    error_stuff.error_log.addHandler(logging.FileHandler(log_path, delay=True))
+    Item.items_cache = ItemsCache(wdir_prefix)
+    Options().load_missing_defaults(wdir_prefix + "options_default.json")
+    Options().game_version = RunFixture.game_version
+    with open(wdir_prefix + "version.txt", "r") as f:
+        tracker_version = f.read()
+    item_ids = [item_id for item_id in Item.version_items_info(RunFixture.game_version) if item_id.isdigit()]
+    # Everyone has their own connection, like when they're all on their own computer
+    HttpClient.max_idle_connections = args.uploaders + args.spectators
+
+    server = None
+    url = args.url
+    if url is None:
+        server, url = start_local_server()
+    try:
+        names = ["player" + str(index) for index in range(args.uploaders)]
+        spectators = Spectators(url, [names[index % len(names)] for index in range(args.spectators)], tracker_version)
+        spectators.start()
+        start_time = time.time()
+        start_cpu_time = time.process_time()
+        end_time = start_time + args.duration
+        players = [Player(name, RunFixture(tracker_version, item_ids), url, args.interval, end_time) for name in names]
+        for player in players:
+            player.start()
+        for player in players:
+            player.join()
+        duration = time.time() - start_time
+        cpu_usage = (time.process_time() - start_cpu_time) / duration
+        # Give the last states the time to get to the spectators
+        time.sleep(1)
+        spectators.stopped = True
+        spectators.join()
+    finally:
+        if server is not None:
+            server.kill()
+
+    latencies = [latency for player in players for latency in player.latencies]
+    print("%d players, %d spectators, %.1f seconds" % (args.uploaders, args.spectators, duration))
+    if os.path.exists(log_path):
+        print("Errors were logged in " + log_path)
+    # The simulated trackers share one python process, it can be slower than the server
+    if cpu_usage > 0.5:
+        print("This test was busy %d%% of the time, the latencies are mostly its own: run a few of them with --url, with fewer players and spectators each" % (cpu_usage * 100))
+    print("Uploads: %d (%.1f/s), %d whole and %d as deltas, %d failed, %s" % (
+        len(latencies), len(latencies) / duration, sum(player.full_uploads for player in players),
+        sum(player.delta_uploads for player in players), sum(player.failures for player in players), describe_latencies(latencies)))
+    if any(subscriber.supported is False for subscriber in spectators.subscribers):
+        print("Spectators: the server doesn't send the states as they're uploaded, the spectators would have to poll it")
+        return
+    # From the start of the upload to the spectator getting it
+    upload_times = {player.player_name: player.upload_times for player in players}
+    latencies = []
+    for (index, version), arrival_time in spectators.arrivals.items():
+        upload_time = upload_times[spectators.names[index]].get(version)
+        if upload_time is not None:
+            latencies.append(arrival_time - upload_time)
+    # A spectator only gets the last state when several are uploaded while it's busy
+    expected = sum(len(upload_times[name]) for name in spectators.names)
+    print("States received by the spectators: %d (%.1f/s), %d skipped, %d spectators with an error, %s" % (
+        len(spectators.arrivals), len(spectators.arrivals) / duration, expected - len(latencies),
+        sum(subscriber.error_message is not None for subscriber in spectators.subscribers), describe_latencies(latencies)))
+
+if __name__ == "__main__":
+    main()
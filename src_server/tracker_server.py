@@ -0,0 +1,273 @@
+""" A tracker server to run locally, with the same API as the real one, so the server features can be tried and benchmarked offline """
+import argparse
+import collections
+import gzip
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The deltas are the tracker's own
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from state_delta import StateDelta
+
+
+class User(object):
+    """ A player whose states are uploaded to the server, and the last few of them """
+    # Number of states kept, the uploaders and spectators can get the changes since any of them
+    kept_states = 16
+
+    def __init__(self, name, lock):
+        self.name = name
+        # version => state dict, oldest first
+        self.states = collections.OrderedDict()
+        # Version of the last state, None until the first one is uploaded
+        self.version = None
+        self.update_time = None
+        # Notified when a new state is uploaded, for the spectators waiting for it
+        self.condition = threading.Condition(lock)
+        # The answers already made for the last state, shared by every request asking the same thing
+        self.answers = {}
+
+    def publish(self, state):
+        """ Make state the last state of the player, return its version (call with the server's lock) """
+        # Like the real server, versions are times, so the spectators can use them for the read delay. The states
+        # uploaded in the same second still need their own version
+        self.version = max(int(time.time()), (self.version or 0) + 1)
+        self.update_time = time.time()
+        self.states[self.version] = state
+        if len(self.states) > self.kept_states:
+            self.states.popitem(last=False)
+        self.answers = {}
+        self.condition.notify_all()
+        return self.version
+
+    def answer(self, key, make):
+        """ Return the json of the answer to key for the last state, made by make() the first time """
+        if key not in self.answers:
+            self.answers[key] = Answer(json.dumps(make(), sort_keys=True).encode("utf-8"))
+        return self.answers[key]
+
+
+class Answer(object):
+    """ The body of an answer, and its compressed version made the first time a client can take it """
+    # Smaller bodies aren't worth compressing
+    compression_threshold = 512
+
+    def __init__(self, body):
+        self.body = body
+        self.compressed = None
+
+    def get_body(self, gzip_accepted):
+        """ Return the body to send, and whether it's compressed """
+        if not gzip_accepted or len(self.body) < self.compression_threshold:
+            return self.body, False
+        if self.compressed is None:
+            self.compressed = gzip.compress(self.body, compresslevel=6)
+        return self.compressed, True
+
+
+class TrackerServer(ThreadingHTTPServer):
+    """
+    Keeps the states uploaded by the players in memory, and sends them to the spectators.
+    There's no twitch login: the authkey a player uploads with is the name they show up as.
+    """
+    daemon_threads = True
+    # Every spectator keeps a connection, the default queue of 5 drops them when they all come at once
+    request_queue_size = 128
+    # Most seconds a spectator's request is held waiting for a new state
+    max_wait = 60
+
+    def __init__(self, address, twitch_client_id):
+        super(TrackerServer, self).__init__(address, RequestHandler)
+        self.twitch_client_id = twitch_client_id
+        # name => User
+        self.users = {}
+        self.lock = threading.Lock()
+
+    def get_user(self, name):
+        """ Return the user with that name, adding them if they're not there (call with the lock) """
+        if name not in self.users:
+            self.users[name] = User(name, self.lock)
+        return self.users[name]
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """ Answers one connection's requests, the routes are the ones the tracker uses """
+    protocol_version = "HTTP/1.1"
+    # So error pages don't say it's the real one
+    server_version = "LocalTrackerServer"
+
+    def setup(self):
+        super(RequestHandler, self).setup()
+        # The headers and the body are written separately, don't let the body wait for the ack of the headers
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        # One line per request would be the bottleneck of the benchmarks
+        pass
+
+    def do_GET(self):
+        path, query = self.__split_path()
+        if path == ["tracker", "api", "userlist"]:
+            return self.__userlist()
+        if path == ["tracker", "api", "twitchclientid"]:
+            return self.__send(200, Answer(self.server.twitch_client_id.encode("utf-8")), "text/plain")
+        if len(path) in (4, 5) and path[:3] == ["tracker", "api", "user"]:
+            name = path[3]
+            if len(path) == 4:
+                return self.__state(name)
+            if path[4] == "version":
+                return self.__version(name)
+            if path[4] == "subscribe":
+                return self.__subscribe(name, query)
+        self.__send_error(404)
+
+    def do_PUT(self):
+        path, query = self.__split_path()
+        if len(path) != 4 or path[:3] != ["tracker", "api", "update"]:
+            return self.__send_error(404)
+        state = self.__read_json()
+        if not isinstance(state, dict):
+            return self.__send_error(400)
+        with self.server.lock:
+            version = self.server.get_user(path[3]).publish(state)
+        self.__send_json({"updated_user": path[3], "version": version})
+
+    def do_PATCH(self):
+        path, query = self.__split_path()
+        if len(path) != 4 or path[:3] != ["tracker", "api", "update"]:
+            return self.__send_error(404)
+        delta = self.__read_json()
+        if not isinstance(delta, dict) or delta.get("format_version") != StateDelta.format_version:
+            return self.__send_error(400)
+        version = None
+        with self.server.lock:
+            user = self.server.get_user(path[3])
+            # The uploader has to send the whole state again if we don't have the one it made the delta from
+            if user.version is None or delta.get("base_version") != user.version:
+                error = 409
+            else:
+                try:
+                    version = user.publish(StateDelta.apply(user.states[user.version], delta))
+                except (KeyError, IndexError, TypeError, ValueError):
+                    error = 400
+        if version is None:
+            return self.__send_error(error)
+        self.__send_json({"updated_user": path[3], "version": version})
+
+    def __userlist(self):
+        """ Send the players who uploaded a state, and how many seconds ago they did """
+        now = time.time()
+        with self.server.lock:
+            users = [{"name": user.name, "seconds": int(now - user.update_time)} for user in self.server.users.values() if user.version is not None]
+        users.sort(key=lambda user: user["seconds"])
+        self.__send_json(users)
+
+    def __state(self, name):
+        with self.server.lock:
+            user = self.server.users.get(name)
+            version = None if user is None else user.version
+            if version is not None:
+                answer = user.answer("state", lambda: user.states[version])
+        if version is None:
+            return self.__send_error(404)
+        self.__send(200, answer, "application/json", '"' + str(version) + '"')
+
+    def __version(self, name):
+        with self.server.lock:
+            user = self.server.users.get(name)
+            version = None if user is None else user.version
+        if version is None:
+            return self.__send_error(404)
+        self.__send(200, Answer(str(version).encode("utf-8")), "text/plain", '"v' + str(version) + '"')
+
+    def __subscribe(self, name, query):
+        """
+        Send the first state of the player newer than the version after=, or its changes since that version if
+        we still have it. Wait up to wait= seconds for it, and answer 204 if there's none by then.
+        Without after=, the last state is sent right away.
+        """
+        try:
+            after = int(query["after"]) if "after" in query else None
+            wait = min(float(query.get("wait", self.server.max_wait)), self.server.max_wait)
+        except ValueError:
+            return self.__send_error(400)
+        with self.server.lock:
+            # Someone can watch a player before they start uploading
+            user = self.server.get_user(name)
+            user.condition.wait_for(lambda: user.version is not None and (after is None or user.version > after), wait)
+            if user.version is None or (after is not None and user.version <= after):
+                answer = None
+            else:
+                version = user.version
+                state = user.states[version]
+                if after in user.states:
+                    base = user.states[after]
+                    answer = user.answer(("delta", after), lambda: {"version": version, "delta": StateDelta.compare(base, state, after)})
+                else:
+                    answer = user.answer("subscribe", lambda: {"version": version, "state": state})
+        if answer is None:
+            return self.__send(204, None)
+        self.__send(200, answer, "application/json")
+
+    def __split_path(self):
+        """ Return the parts of the path of the request, and the values of its query """
+        url = urllib.parse.urlsplit(self.path)
+        path = [urllib.parse.unquote(part) for part in url.path.split("/") if part != ""]
+        query = {key: values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+        return path, query
+
+    def __read_json(self):
+        """ Return the json body of the request, None if it isn't json """
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            return json.loads(body)
+        except ValueError:
+            return None
+
+    def __send_json(self, content):
+        self.__send(200, Answer(json.dumps(content).encode("utf-8")), "application/json")
+
+    def __send_error(self, status):
+        self.__send(status, Answer(json.dumps({"error": self.responses[status][0]}).encode("utf-8")), "application/json")
+
+    def __send(self, status, answer, content_type=None, etag=None):
+        """ Send an answer (None for no body), compressed if the client takes it, or 304 if the client has it already """
+        if etag is not None and self.headers.get("If-None-Match") == etag:
+            status, answer = 304, None
+        self.send_response(status)
+        if etag is not None:
+            self.send_header("ETag", etag)
+        body = b""
+        if answer is not None:
+            body, compressed = answer.get_body("gzip" in self.headers.get("Accept-Encoding", ""))
+            self.send_header("Content-Type", content_type)
+            if compressed:
+                self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    """ Main """
+    parser = argparse.ArgumentParser(description="Run a tracker server on this computer. Set the tracker's server url to the address it listens on.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="port to listen on (default: 8000)")
+    parser.add_argument("--twitch-client-id", default="local", help="what /tracker/api/twitchclientid/ answers")
+    args = parser.parse_args()
+    server = TrackerServer((args.host, args.port), args.twitch_client_id)
+    print("Tracker server listening on http://" + args.host + ":" + str(server.server_address[1]), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+The tests run like the tracker runs from src/: its modules are imported from there, and the files it reads and
+writes in ../ (items files, tracker_log.txt, saved states...) are in a temporary directory instead of the repository.
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pytest
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+fixtures = os.path.join(repository, "tests", "fixtures")
+sys.path.insert(0, os.path.join(repository, "src"))
+
+from options import Options
+
+
+def pytest_configure(config):
+    """
+    Move to the temporary directory once pytest has found the tests, and before it imports them: error_stuff opens
+    ../tracker_log.txt when it's imported
+    """
+    work_directory = tempfile.mkdtemp(prefix="tracker_tests_")
+    for file_name in ("items.json", "items_rep.json", "items_abplus.json", "items_custom.json", "version.txt", "options_default.json"):
+        shutil.copy(os.path.join(repository, file_name), work_directory)
+    os.mkdir(os.path.join(work_directory, "src"))
+    os.chdir(os.path.join(work_directory, "src"))
+    atexit.register(shutil.rmtree, work_directory, True)
+
+    from item_tracker import IsaacTracker
+    # Loads the items and the default options like the tracker does when it starts
+    IsaacTracker()
+
+
+@pytest.fixture
+def game_version():
+    """ Track Repentance+ during the test, and put the game version back after it """
+    previous = Options().game_version
+    Options().game_version = "Repentance+"
+    yield "Repentance+"
+    Options().game_version = previous
+
+
+@pytest.fixture
+def log_path(tmp_path, game_version):
+    """ Make the tracker read tmp_path/log.txt """
+    options = Options()
+    previous = (options.log_file_custom_path_enabled, options.log_file_custom_path)
+    options.log_file_custom_path_enabled = True
+    options.log_file_custom_path = str(tmp_path) + "/"
+    yield str(tmp_path / "log.txt")
+    options.log_file_custom_path_enabled, options.log_file_custom_path = previous
+
+
+@pytest.fixture
+def server():
+    """ A local server answering what the test sets server.respond to, by default an empty JSON object """
+    from fake_server import FakeServer
+    fake_server = FakeServer(lambda request: (200, {'Content-Type': "application/json"}, b"{}"))
+    yield fake_server
+    fake_server.close()
+
+
+def wait_until(condition, timeout=10.0):
+    """ Wait for condition() to be true, fail the test if it takes longer than timeout seconds """
+    end_time = time.time() + timeout
+    while not condition():
+        assert time.time() < end_time, "timed out"
+        time.sleep(0.005)
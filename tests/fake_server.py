@@ -0,0 +1,77 @@
+""" A local HTTP server for the tests of the tracker's uploads and downloads, that answers what the test tells it to """
+import http.server
+import itertools
+import threading
+import time
+
+
+class Request(object):
+    """ A request the server got """
+    def __init__(self, method, path, headers, body, connection):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+        self.time = time.time()
+        # Tells the requests made on the same connection apart from the others
+        self.connection = connection
+
+
+class FakeServer(object):
+    """
+    Answers every request with respond(request), which returns (status, headers dict, body bytes).
+    The requests are kept in requests, in the order they came.
+    """
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+        # Close the connections after answering, without telling the client like "Connection: close" would
+        self.drop_connections = False
+        self.connection_numbers = itertools.count()
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super(Handler, self).setup()
+                self.connection_number = next(server.connection_numbers)
+
+            def handle_request(self):
+                drop_connection = server.drop_connections
+                length = int(self.headers.get('Content-Length', 0))
+                request = Request(self.command, self.path, self.headers, self.rfile.read(length), self.connection_number)
+                with server.lock:
+                    server.requests.append(request)
+                status, headers, body = server.respond(request)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if status not in (204, 304):
+                    self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if status not in (204, 304):
+                    self.wfile.write(body)
+                if drop_connection:
+                    self.close_connection = True
+
+            do_GET = do_PUT = do_PATCH = do_POST = handle_request
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = "http://127.0.0.1:%d" % self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    def received(self, method=None):
+        """ Return the requests received so far, only the ones with that method if one is given """
+        with self.lock:
+            return [request for request in self.requests if method is None or request.method == method]
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
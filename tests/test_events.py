@@ -0,0 +1,108 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from conftest import fixtures
+from export_store import ExportStore
+from game_objects.item import Item
+from game_objects.state import TrackerState
+from log_finder import LogFinder
+from log_parser import LogParser
+from test_log_parser import describe
+
+# A Repentance+ log with what the test log doesn't have: Genesis, multi-part items, Strawman, mods and a continued run
+other_log = """[INFO] - Binding of Isaac: Repentance+ v1.9.7.10
+Lua Debug: | Racing+ 0.62.1 initialized.
+Lua Debug: | The Babies Mod 1.2.0 initialized.
+[INFO] - Loading PersistentData 2
+[INFO] - RNG Start Seed: ABCD EFGH (123) [New, Difficulty: 0]
+[INFO] - Initialized player with Variant 0 and Subtype 0
+[INFO] - Level::Init m_Stage 1, m_StageType 0
+[INFO] - Room 1.2(Start Room)
+[INFO] - Adding collectible 238 (Key Piece 1) to Player 0 (Isaac)
+[INFO] - Room 1.5(Normal)
+[INFO] - Adding collectible 239 (Key Piece 2) to Player 0 (Isaac)
+[INFO] - Adding collectible 550 (Broken Shovel) to Player 0 (Isaac)
+[INFO] - Adding collectible 552 (Mom's Shovel) to Player 0 (Isaac)
+[INFO] - Removing collectible 239 (Key Piece 2) from Player 0 (Isaac)
+[INFO] - Adding collectible 667 (Strawman) to Player 0 (Isaac)
+[INFO] - Adding collectible 1 (The Sad Onion) to Player 1 (Keeper)
+[INFO] - Removing collectible 667 (Strawman) from Player 0 (Isaac)
+[INFO] - Level::Init m_Stage 2, m_StageType 0
+[INFO] - Room 2.7(Normal)
+[INFO] - Adding collectible 134 (Guppy's Tail) to Player 0 (Isaac)
+[INFO] - Room 18.1000(Genesis)
+[INFO] - Adding collectible 81 (Dead Cat) to Player 0 (Isaac)
+[INFO] - Loading PersistentData 3
+[INFO] - RNG Start Seed: IJKL MNOP (456) [Continue, Difficulty: 0]
+[INFO] - Room 3.1(Normal)
+""".replace("\n", "\r\n")
+
+
+@pytest.fixture
+def parsed(log_path):
+    """ Parse the test log, return the parser and the events it applied to its state """
+    shutil.copy(os.path.join(fixtures, "repentance_plus_log.txt"), log_path)
+    return parse(log_path)
+
+
+def parse(log_path):
+    parser = LogParser("../", "test", LogFinder())
+    events = []
+    parser.event_listeners.append(events.append)
+    parser.parse()
+    return parser, events
+
+
+def replay(events, game_version):
+    """ Return a new state with every event applied to it, after going through json """
+    state = TrackerState("", "test", game_version, "", "", "", "", -1)
+    for event in events:
+        state.apply_event(type(event).from_json(json.loads(json.dumps(event.to_json()))))
+    return state
+
+
+def same_states(state, expected):
+    return describe(state) == describe(expected) and \
+        [item.visible for item in state.item_list] == [item.visible for item in expected.item_list]
+
+
+def test_events_go_through_json(parsed):
+    parser, events = parsed
+    assert len(events) > 0
+    for event in events:
+        json_dic = json.loads(json.dumps(event.to_json()))
+        assert type(event).from_json(json_dic) == event
+
+
+def test_replayed_events_give_the_parsed_state(parsed, game_version):
+    parser, events = parsed
+    assert same_states(replay(events, game_version), parser.state)
+
+
+def test_every_change_is_an_event(log_path, game_version, tmp_path, monkeypatch):
+    """ Replaying the events gives the parser's state, whatever changed it """
+    monkeypatch.setattr(TrackerState, "export_store", ExportStore(str(tmp_path / "export_states") + "/"))
+    continued = TrackerState("IJKL MNOP", "test", game_version, "", "", "", "", 3)
+    continued.save = 3
+    continued.add_item(Item("2", "2", continued.last_floor))
+    continued.export_state()
+    with open(log_path, "wb") as log_file:
+        log_file.write(other_log.encode())
+    parser, events = parse(log_path)
+    kinds = set(type(event).__name__ for event in events)
+    assert kinds >= {"ItemsHidden", "ItemsShown", "ItemsCleared", "AdditionalCharItemsRemoved", "RoomEntered",
+                     "VersionNumberRead", "ModVersionRead", "SaveSlotRead", "RunContinued"}
+    assert parser.state.seed == "IJKL MNOP"
+    assert [item.item_id for item in parser.state.item_list] == ["2"]
+    assert same_states(replay(events, game_version), parser.state)
+    # The same before the run was continued
+    events = events[:[type(event).__name__ for event in events].index("RunContinued")]
+    with open(log_path, "wb") as log_file:
+        log_file.write(other_log.split("[INFO] - RNG Start Seed: IJKL")[0].encode())
+    parser, events_before = parse(log_path)
+    assert events_before == events
+    assert parser.state.racing_plus_version != "" and parser.state.save == 3
+    assert same_states(replay(events, game_version), parser.state)
@@ -0,0 +1,191 @@
+import json
+import os
+
+import pytest
+
+from export_store import ExportStore
+
+
+def state(number):
+    return {'seed': "ABCD %04d" % number, 'item_list': [{'item_id': str(number)}]}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ExportStore(str(tmp_path / "export_states") + "/", str(tmp_path / "export_state.json"))
+
+
+def reload(store):
+    """ Return a store reading what store wrote, like the next launch of the tracker """
+    return ExportStore(store.directory, store.old_path)
+
+
+def compacted(store):
+    """ Return a store reading what store wrote, after putting its journal in the slots' files """
+    reload(store).load_state("Repentance+", 1)
+    return reload(store)
+
+
+def read_slot(store, file_name):
+    with open(store.directory + file_name, "r") as slot_file:
+        return json.load(slot_file)
+
+
+def slot_files(store):
+    return sorted(file_name for file_name in os.listdir(store.directory) if file_name != ExportStore.journal_name)
+
+
+def journal_lines(store):
+    with open(store.journal_path, "r") as journal:
+        return journal.readlines()
+
+
+def test_states_of_each_slot(store):
+    store.save_state("Repentance+", 1, state(1))
+    store.save_state("Repentance+", 2, state(2))
+    store.save_state("Rebirth", 3, state(3))
+    assert store.load_state("Repentance+", 1) == state(1)
+    assert store.load_state("Repentance+", 2) == state(2)
+    assert store.load_state("Repentance+", 3) is None
+    # Versions without save slots only have one state
+    assert store.load_state("Rebirth", 1) == state(3)
+    store.write()
+    reloaded = reload(store)
+    for game_version, save in (("Repentance+", 1), ("Repentance+", 2), ("Repentance+", 3), ("Rebirth", 1)):
+        assert reloaded.load_state(game_version, save) == store.load_state(game_version, save)
+    assert slot_files(reloaded) == ["Rebirth.json", "Repentance+_1.json", "Repentance+_2.json"]
+
+
+def test_only_the_last_state_of_a_slot_is_journaled(store):
+    for number in range(5):
+        store.save_state("Repentance+", 1, state(number))
+    store.save_state("Repentance+", 2, state(10))
+    store.write()
+    assert not store.is_due()
+    assert slot_files(store) == []
+    assert sorted(json.loads(line)[2]['seed'] for line in journal_lines(store)) == ["ABCD 0004", "ABCD 0010"]
+    # Nothing to write
+    store.write()
+    assert len(journal_lines(store)) == 2
+
+
+def test_is_due(store, monkeypatch):
+    monkeypatch.setattr(ExportStore, "save_interval", 60.0)
+    assert not store.is_due()
+    store.save_state("Repentance+", 1, state(1))
+    assert store.is_due()
+    store.write()
+    store.save_state("Repentance+", 1, state(2))
+    assert not store.is_due()
+    store.last_write_time -= 60.0
+    assert store.is_due()
+
+
+def test_compaction_only_writes_the_changed_slots(store, monkeypatch):
+    store.save_state("Repentance+", 1, state(1))
+    store.save_state("Repentance+", 2, state(2))
+    store.write()
+    store = compacted(store)
+    assert slot_files(store) == ["Repentance+_1.json", "Repentance+_2.json"]
+    os.utime(store.directory + "Repentance+_2.json", ns=(0, 0))
+    monkeypatch.setattr(ExportStore, "compaction_threshold", 2)
+    store.save_state("Repentance+", 1, state(10))
+    store.write()
+    store.save_state("Repentance+", 3, state(3))
+    store.write()
+    assert journal_lines(store) == []
+    assert slot_files(store) == ["Repentance+_1.json", "Repentance+_2.json", "Repentance+_3.json"]
+    assert read_slot(store, "Repentance+_1.json") == state(10)
+    assert read_slot(store, "Repentance+_3.json") == state(3)
+    assert os.stat(store.directory + "Repentance+_2.json").st_mtime_ns == 0
+
+
+def test_slot_files_are_read_when_loaded(store):
+    store.save_state("Repentance+", 1, state(1))
+    store.save_state("Repentance+", 2, state(2))
+    store.write()
+    store = compacted(store)
+    store.load_state("Repentance+", 1)
+    assert store.index[("Repentance+", "1")] == state(1)
+    assert store.index[("Repentance+", "2")] is None
+    assert store.load_state("Repentance+", 2) == state(2)
+
+
+def test_journal_is_compacted_when_loaded(store):
+    store.save_state("Repentance+", 1, state(1))
+    store.write()
+    reloaded = reload(store)
+    assert reloaded.load_state("Repentance+", 1) == state(1)
+    assert journal_lines(reloaded) == []
+    assert read_slot(reloaded, "Repentance+_1.json") == state(1)
+
+
+def test_unfinished_journal_line(store):
+    """ The tracker stopped while appending to the journal, the states before are still there """
+    store.save_state("Repentance+", 1, state(1))
+    store.write()
+    store.save_state("Repentance+", 1, state(2))
+    store.write()
+    with open(store.journal_path, "r+") as journal:
+        content = journal.read()
+        journal.seek(0)
+        journal.truncate()
+        journal.write(content[:-10])
+    reloaded = reload(store)
+    assert reloaded.load_state("Repentance+", 1) == state(1)
+    # We won't append after the unfinished line
+    assert journal_lines(reloaded) == []
+
+
+def test_files_are_replaced_at_once(store, monkeypatch):
+    """ If writing a file fails, the previous one is still there """
+    store.save_state("Repentance+", 1, state(1))
+    store.write()
+    store = compacted(store)
+    store.load_state("Repentance+", 1)
+
+    def failing_dump(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(ExportStore, "compaction_threshold", 1)
+    monkeypatch.setattr(json, "dump", failing_dump)
+    store.save_state("Repentance+", 1, state(2))
+    store.write()
+    monkeypatch.undo()
+    assert read_slot(store, "Repentance+_1.json") == state(1)
+
+
+def test_unreadable_slot_file(store):
+    store.save_state("Repentance+", 1, state(1))
+    store.write()
+    store = compacted(store)
+    with open(store.directory + "Repentance+_1.json", "w") as slot_file:
+        slot_file.write("{")
+    assert reload(store).load_state("Repentance+", 1) is None
+
+
+def test_old_file_is_split_into_slots(store):
+    old_states = {
+        'Repentance+': {'1': state(1), '3': state(3)},
+        'Rebirth': state(10),
+    }
+    with open(store.old_path, "w") as old_file:
+        json.dump(old_states, old_file)
+    assert store.load_state("Repentance+", 3) == state(3)
+    assert store.load_state("Rebirth", 2) == state(10)
+    assert slot_files(store) == ["Rebirth.json", "Repentance+_1.json", "Repentance+_3.json"]
+    assert read_slot(store, "Repentance+_1.json") == state(1)
+    # It's left in place, but only read while there's no directory
+    with open(store.old_path, "r") as old_file:
+        assert json.load(old_file) == old_states
+    store.save_state("Repentance+", 1, state(2))
+    store.write()
+    assert reload(store).load_state("Repentance+", 1) == state(2)
+
+
+@pytest.mark.parametrize("content", ["{", "[1, 2]", '{"Repentance+": 1}'])
+def test_unusable_old_file(store, content):
+    with open(store.old_path, "w") as old_file:
+        old_file.write(content)
+    assert store.load_state("Repentance+", 1) is None
+    store.save_state("Repentance+", 1, state(1))
+    assert store.load_state("Repentance+", 1) == state(1)
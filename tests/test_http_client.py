@@ -0,0 +1,71 @@
+import gzip
+
+import pytest
+
+from http_client import HttpClient, HttpError
+
+
+def test_connections_are_kept(server):
+    client = HttpClient()
+    for attempt in range(5):
+        assert client.get(server.url + "/tracker/api/userlist/") == b"{}"
+    connections = set(request.connection for request in server.received())
+    assert len(connections) == 1
+    # Every HttpClient shares them
+    HttpClient().get(server.url + "/tracker/api/userlist/")
+    assert set(request.connection for request in server.received()) == connections
+
+
+def test_closed_connection_is_replaced(server):
+    """ The server closed the connection we kept, the request is sent again on a new one """
+    client = HttpClient()
+    server.drop_connections = True
+    client.get(server.url + "/first")
+    server.drop_connections = False
+    assert client.get(server.url + "/second") == b"{}"
+    assert len(set(request.connection for request in server.received())) == 2
+    assert [request.path for request in server.received()] == ["/first", "/second"]
+
+
+def test_etag(server):
+    versions = {'etag': '"1"', 'body': b"state 1"}
+
+    def respond(request):
+        if request.headers.get('If-None-Match') == versions['etag']:
+            return 304, {'ETag': versions['etag']}, b""
+        return 200, {'ETag': versions['etag']}, versions['body']
+    server.respond = respond
+    client = HttpClient()
+    url = server.url + "/tracker/api/user/player"
+    assert client.get(url) == b"state 1"
+    assert client.get(url) == b"state 1"
+    versions.update(etag='"2"', body=b"state 2")
+    assert client.get(url) == b"state 2"
+    assert [request.headers.get('If-None-Match') for request in server.received()] == [None, '"1"', '"1"']
+
+
+def test_gzip(server):
+    server.respond = lambda request: (200, {'Content-Encoding': "gzip"}, gzip.compress(b'{"version": 3}'))
+    assert HttpClient().send_json('PUT', server.url + "/update", {'seed': "ABCD EFGH"}) == {'version': 3}
+    request = server.received()[0]
+    assert "gzip" in request.headers.get('Accept-Encoding')
+    assert request.body == b'{"seed": "ABCD EFGH"}'
+    assert request.headers.get('Content-Type') == "application/json"
+
+
+@pytest.mark.parametrize("status, method", [(302, 'GET'), (307, 'PUT')])
+def test_redirect(server, status, method):
+    server.respond = lambda request: (status, {'Location': "/moved"}, b"") if request.path == "/update" else (200, {}, b'{"moved": true}')
+    assert HttpClient().send_json('PUT', server.url + "/update", {}) == {'moved': True}
+    assert [(request.method, request.path) for request in server.received()] == [('PUT', "/update"), (method, "/moved")]
+
+
+def test_error(server):
+    server.respond = lambda request: (409, {}, b"")
+    with pytest.raises(HttpError) as error:
+        HttpClient().send_json('PATCH', server.url + "/update", {})
+    assert error.value.code == 409
+    # The connection is still good
+    server.respond = lambda request: (200, {}, b"{}")
+    HttpClient().get(server.url + "/")
+    assert len(set(request.connection for request in server.received())) == 1
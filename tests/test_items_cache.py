@@ -0,0 +1,93 @@
+import json
+import marshal
+import os
+import shutil
+
+import pytest
+
+from conftest import repository
+from items_cache import ItemsCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    for file_name in ("items.json", "items_rep.json", "items_abplus.json"):
+        shutil.copy(os.path.join(repository, file_name), str(tmp_path))
+    return ItemsCache(str(tmp_path) + "/")
+
+
+def read_items(cache, file_name):
+    with open(cache.directory + file_name, "r") as items_file:
+        return json.load(items_file)
+
+
+def mark_cache(cache):
+    """ Replace the items in the cache file by a marker, so we can tell when they come from there """
+    cache_path = cache.cache_directory + "items.json.cache"
+    with open(cache_path, "rb") as cache_file:
+        cached = marshal.loads(cache_file.read())
+    cached['items'] = {'marker': {}}
+    with open(cache_path, "wb") as cache_file:
+        cache_file.write(marshal.dumps(cached))
+
+
+def test_cached_items_are_the_file(cache):
+    items = cache.load("items.json")
+    assert items == read_items(cache, "items.json")
+    assert os.path.exists(cache.cache_directory + "items.json.cache")
+    assert cache.load("items.json") == items
+    mark_cache(cache)
+    assert cache.load("items.json") == {'marker': {}}
+
+
+def test_touched_file_with_the_same_content(cache):
+    cache.load("items.json")
+    mark_cache(cache)
+    os.utime(cache.directory + "items.json", ns=(0, 0))
+    assert cache.load("items.json") == {'marker': {}}
+
+
+def test_changed_file(cache):
+    items = cache.load("items.json")
+    mark_cache(cache)
+    items["1"]["name"] = "Not The Sad Onion"
+    with open(cache.directory + "items.json", "w") as items_file:
+        json.dump(items, items_file)
+    assert cache.load("items.json") == items
+    # The cache was rebuilt
+    assert ItemsCache(cache.directory).load("items.json") == items
+
+
+def test_unreadable_cache(cache):
+    items = cache.load("items.json")
+    with open(cache.cache_directory + "items.json.cache", "wb") as cache_file:
+        cache_file.write(b"\0 not marshal")
+    assert cache.load("items.json") == items
+
+
+@pytest.mark.parametrize("file_name", ["items_rep.json", "items_abplus.json"])
+def test_layers_have_the_items_of_their_file(cache, file_name):
+    expected = read_items(cache, file_name)
+    for attempt in ("compared", "cached"):
+        cache = ItemsCache(cache.directory)
+        layer = cache.load(file_name, "items.json", cache.load("items.json"))
+        assert dict(layer) == expected
+        assert len(layer) == len(expected)
+        # Items of the base the file doesn't have
+        for item_id in cache.load("items.json"):
+            if item_id not in expected:
+                assert item_id not in layer
+                with pytest.raises(KeyError):
+                    layer[item_id]
+
+
+def test_layer_of_a_changed_base(cache):
+    base = cache.load("items.json")
+    cache.load("items_rep.json", "items.json", base)
+    base["1"]["name"] = "Not The Sad Onion"
+    del base["2"]
+    with open(cache.directory + "items.json", "w") as items_file:
+        json.dump(base, items_file)
+    cache = ItemsCache(cache.directory)
+    layer = cache.load("items_rep.json", "items.json", cache.load("items.json"))
+    assert dict(layer) == read_items(cache, "items_rep.json")
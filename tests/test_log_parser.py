@@ -0,0 +1,168 @@
+"""
+The parser is run on a log made up of several Repentance+ runs (Jacob and Esau, rerolls, removed items, curses,
+localized names), and has to end up with the state the tracker always got out of it. The expected state was made
+by the tracker before its log reading was rewritten.
+"""
+import json
+import os
+import random
+
+import pytest
+
+from conftest import fixtures
+from game_objects.state import TrackerStateEncoder
+from log_finder import LogFinder
+from log_parser import LogParser
+from options import Options
+
+# Item ids every game version has
+item_ids = [str(item_id) for item_id in range(1, 43)]
+version_lines = {
+    "Rebirth": "Rebirth v1.05", "Antibirth": "Rebirth v1.05", "Afterbirth": "Afterbirth v1.06.J104",
+    "Afterbirth+": "Afterbirth+ v1.06.0193", "Repentance": "Repentance v1.7.9b", "Repentance+": "Repentance+ v1.9.7.10",
+}
+
+
+def describe(state):
+    """ Return what the states are compared on: their json and a few variables it leaves out """
+    description = json.loads(json.dumps(state, cls=TrackerStateEncoder))
+    # Only the number of items of each transformation matters
+    for key in ("player_transforms", "player2_transforms"):
+        counts = {name: sum(transform["items"].values()) for name, transform in description[key].items()}
+        description[key] = {name: count for name, count in counts.items() if count > 0}
+    description["player_stats"] = dict(state.player_stats)
+    description["save"] = state.save
+    description["room_id"] = state.room_id
+    return description
+
+
+@pytest.fixture
+def log_data():
+    with open(os.path.join(fixtures, "repentance_plus_log.txt"), "rb") as log_file:
+        return log_file.read()
+
+
+@pytest.fixture
+def expected():
+    with open(os.path.join(fixtures, "repentance_plus_log.json"), "r", encoding="utf-8") as expected_file:
+        return json.load(expected_file)
+
+
+def make_log(seed, game_version):
+    """ Return a made-up log of a few runs, with the lines before each run that matter to the parser """
+    lines = []
+    add = lines.append
+    random_choice = random.Random(seed)
+    repentance = game_version in ("Repentance", "Repentance+")
+    add("[INFO] - Binding of Isaac: " + version_lines[game_version])
+    if random_choice.random() < 0.5:
+        add("Lua Debug: | Racing+ 0.%d.1 initialized." % random_choice.randint(1, 60))
+    for run in range(random_choice.randint(1, 5)):
+        if random_choice.random() < 0.3:
+            add("[INFO] - Loading PersistentData %d" % random_choice.randint(1, 3))
+        if random_choice.random() < 0.2:
+            add("Lua Debug: | The Babies Mod 1.%d.0 initialized." % run)
+        if random_choice.random() < 0.2:
+            add("[INFO] - Spawn co-player!")
+        if random_choice.random() < 0.1:
+            add("[INFO] - Menu_OnlineLobby::notify_game_start()")
+        run_type = random_choice.choice(["New,", "Daily,"]) if repentance else "New,"
+        add("[INFO] - RNG Start Seed: AB%02d CD%02d (%d) [%s Difficulty: 0]" % (run, random_choice.randint(0, 99), random_choice.randint(0, 999), run_type))
+        add("[INFO] - Initialized player with Variant 0 and Subtype %d" % random_choice.choice([0, 3, 14, 19]))
+        for stage in range(1, random_choice.randint(2, 6)):
+            if random_choice.random() < 0.2:
+                add("[INFO] - Lua Debug: Executing command: reseed")
+            if game_version in ("Rebirth", "Antibirth"):
+                add("[INFO] - Level::Init m_Stage %d, m_AltStage %d" % (stage, random_choice.choice([0, 1])))
+            else:
+                add("[INFO] - Level::Init m_Stage %d, m_StageType %d" % (stage, random_choice.choice([0, 0, 3, 4])))
+            for curse in range(random_choice.randint(0, 2)):
+                add("[INFO] - " + random_choice.choice(["Curse of Blind", "Curse of the Labyrinth!", "Curse of Darkness"]))
+            for item in range(random_choice.randint(0, 8)):
+                add("[INFO] - Room %d.%d(%s)" % (random_choice.randint(1, 18), random_choice.choice([0, 5, 1000]), random_choice.choice(["Start Room", "Normal"])))
+                item_id = random_choice.choice(item_ids)
+                line = "[INFO] - Adding collectible %s (X)" % item_id + (" to Player 0 (Isaac)" if repentance else "")
+                add(line)
+                if random_choice.random() < 0.1:
+                    add(line)
+                if random_choice.random() < 0.1:
+                    add("[INFO] - Removing collectible %s (X)" % item_id + (" from Player 0 (Isaac)" if repentance else ""))
+                if random_choice.random() < 0.05:
+                    add("[INFO] - Added 3 Collectibles")
+                if random_choice.random() < 0.3:
+                    add("[INFO] - Lua Debug: noise")
+    log_data = ("\r\n".join(lines) + "\r\n").encode()
+    # The game may be writing a line
+    if random_choice.random() < 0.3:
+        log_data += b"[INFO] - Adding collec"
+    return log_data
+
+
+def write_in_chunks(log_path, log_data, seed, restart_every=None):
+    """
+    Append log_data to the log in random chunks like the game writes it, parsing after each of them.
+    With restart_every, the tracker is restarted after that many chunks and resumes from where it was.
+    Return the last state parsed.
+    """
+    chunk_size = random.Random(seed)
+    parser = LogParser("../", "test", LogFinder())
+    position = 0
+    chunks = 0
+    state = None
+    while position < len(log_data):
+        end = position + chunk_size.randint(1, 4096)
+        with open(log_path, "ab") as log_file:
+            log_file.write(log_data[position:end])
+        position = end
+        state = parser.parse()
+        chunks += 1
+        if restart_every is not None and chunks % restart_every == 0:
+            # The tracker saves a checkpoint when it exits
+            parser.save_checkpoint()
+            assert parser.checkpoint.load(log_path) is not None
+            parser = LogParser("../", "test", LogFinder())
+    return state
+
+
+def test_whole_log(log_path, log_data, expected):
+    with open(log_path, "wb") as log_file:
+        log_file.write(log_data)
+    parser = LogParser("../", "test", LogFinder())
+    assert describe(parser.parse()) == expected
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_log_written_in_chunks(log_path, log_data, expected, seed):
+    """
+    Lines are cut anywhere between two reads.
+    The parser forgets it's getting the starting items of a run when a read ends, like it always did, so the
+    chunks have to be about as big as what the game writes at once to get the same state.
+    """
+    open(log_path, "wb").close()
+    assert describe(write_in_chunks(log_path, log_data, seed)) == expected
+
+
+@pytest.mark.parametrize("restart_every", [1, 3, 7])
+def test_restarts_resume_from_checkpoints(log_path, log_data, expected, restart_every):
+    open(log_path, "wb").close()
+    assert describe(write_in_chunks(log_path, log_data, 1, restart_every)) == expected
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_start_at_the_current_run(log_path, seed):
+    """ Opening a log that has a few runs in it gives what parsing all of it gives, parser variables included """
+    Options().game_version = sorted(version_lines)[seed % len(version_lines)]
+    log_data = make_log(seed, Options().game_version)
+    results = []
+    for from_beginning in (False, True):
+        open(log_path, "wb").close()
+        parser = LogParser("../", "test", LogFinder())
+        if from_beginning:
+            # The parser reads from the beginning a log that was empty when it opened it
+            parser.parse()
+        with open(log_path, "wb") as log_file:
+            log_file.write(log_data)
+        state = parser.parse()
+        variables = {name: getattr(parser, name) for name in LogParser.checkpoint_fields}
+        results.append((describe(state), variables, parser.seek))
+    assert results[0] == results[1]
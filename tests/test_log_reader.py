@@ -0,0 +1,127 @@
+import os
+
+import pytest
+
+from log_reader import LogTailReader, LogReverseScanner
+
+
+# Lines containing none of these are only counted
+markers = (b"line", b"Adding collectible ")
+
+
+def append(path, data):
+    with open(path, "ab") as log_file:
+        log_file.write(data)
+
+
+def test_lines_are_handed_out_once_complete(tmp_path):
+    path = str(tmp_path / "log.txt")
+    append(path, b"first line\r\nsecond li")
+    reader = LogTailReader(path, markers)
+    assert reader.read_lines() == [(0, "first line")]
+    assert reader.read_lines() == []
+    append(path, b"ne\r")
+    assert reader.read_lines() == []
+    # The line break is cut between two reads
+    append(path, b"\nthird line\r\n")
+    assert reader.read_lines() == [(1, "second line"), (2, "third line")]
+    assert reader.line_count == 3
+    reader.close()
+
+
+def test_multi_byte_characters_cut_between_reads(tmp_path):
+    path = str(tmp_path / "log.txt")
+    line = "Adding collectible 1 (The Sad Onion) to Player 0 (Иаков)\r\n".encode("utf-8")
+    reader = LogTailReader(path, markers)
+    lines = []
+    for position in range(len(line)):
+        append(path, line[position:position + 1])
+        lines += reader.read_lines()
+    assert lines == [(0, "Adding collectible 1 (The Sad Onion) to Player 0 (Иаков)")]
+    reader.close()
+
+
+def test_mmap_reads_the_same_lines(tmp_path, monkeypatch):
+    path = str(tmp_path / "log.txt")
+    append(path, "".join("line %d (Ésaü)\r\n" % number for number in range(1000)).encode("utf-8") + b"partial")
+    reader = LogTailReader(path, markers)
+    expected = reader.read_lines()
+    reader.close()
+    # Small windows, so lines and characters are cut between them
+    monkeypatch.setattr(LogTailReader, "mmap_threshold", 1)
+    monkeypatch.setattr(LogTailReader, "mmap_window", 7)
+    reader = LogTailReader(path, markers)
+    assert reader.read_lines() == expected
+    assert len(expected) == 1000 and reader.partial_line == b"partial"
+    reader.close()
+
+
+def test_only_lines_with_a_marker_are_handed_out(tmp_path):
+    path = str(tmp_path / "log.txt")
+    append(path, b"noise\r\nAdding collectible 1\r\n\r\nmore noise\r\nAdding collectible 2 from a line\r\nnoise")
+    reader = LogTailReader(path, markers)
+    # Lines containing several markers are handed out once
+    assert reader.read_lines() == [(1, "Adding collectible 1"), (4, "Adding collectible 2 from a line")]
+    assert reader.line_count == 5
+    append(path, b" that ends here\r\nline\r\n")
+    assert reader.read_lines() == [(6, "line")]
+    reader.close()
+
+
+def test_shorter_log_is_stale(tmp_path):
+    path = str(tmp_path / "log.txt")
+    append(path, b"a line\r\nanother line\r\n")
+    reader = LogTailReader(path, markers)
+    reader.read_lines()
+    assert not reader.is_stale()
+    with open(path, "wb") as log_file:
+        log_file.write(b"new\r\n")
+    assert reader.is_stale()
+    reader.close()
+
+
+def session(number, lines):
+    """ Return the beginning of a log, every session starts with the same lines """
+    return b"[INFO] - Binding of Isaac: Repentance+ v1.9.7.10\r\n" + b"".join(b"[INFO] - session %d line %d\r\n" % (number, line) for line in range(lines))
+
+
+@pytest.mark.parametrize("new_log", ["longer session", "same session in another file", "deleted"])
+def test_new_log_is_stale(tmp_path, new_log):
+    path = str(tmp_path / "log.txt")
+    append(path, session(1, 100))
+    reader = LogTailReader(path, markers)
+    reader.read_lines()
+    append(path, b"[INFO] - one more line\r\n")
+    assert not reader.is_stale()
+    if new_log == "longer session":
+        # The game restarted and wrote more than what we read before we looked again
+        with open(path, "wb") as log_file:
+            log_file.write(session(2, 1000))
+    elif new_log == "same session in another file":
+        os.replace(path, path + ".old")
+        append(path, session(1, 100))
+    else:
+        os.remove(path)
+    assert reader.is_stale()
+    reader.close()
+
+
+def test_reverse_scanner(tmp_path, monkeypatch):
+    path = str(tmp_path / "log.txt")
+    append(path, "seed 1\r\nnoise\r\nseed 2 (Иаков)\r\nnoise\r\nseed 3 still being writ".encode("utf-8"))
+    scanner = LogReverseScanner(path)
+    assert scanner.open()
+    # The line the game is still writing isn't complete yet
+    lines = list(scanner.lines(b"seed", scanner.size))
+    assert lines == [(15, "seed 2 (Иаков)"), (0, "seed 1")]
+    assert list(scanner.lines(b"seed", 15)) == [(0, "seed 1")]
+    # Counted in windows smaller than the lines
+    monkeypatch.setattr(LogReverseScanner, "count_window", 3)
+    assert scanner.line_numbers([15, 0, scanner.size]) == {0: 0, 15: 2, scanner.size: 4}
+    scanner.close()
+
+
+def test_reverse_scanner_on_an_empty_log(tmp_path):
+    path = str(tmp_path / "log.txt")
+    append(path, b"")
+    assert not LogReverseScanner(path).open()
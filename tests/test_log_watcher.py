@@ -0,0 +1,92 @@
+import threading
+import time
+
+from log_watcher import LogWatcher
+
+
+def make_watcher(tmp_path, inotify):
+    log_path = tmp_path / "log.txt"
+    log_path.write_text("start\n")
+    watcher = LogWatcher()
+    if not inotify:
+        # Without inotify, it polls the file
+        watcher.close()
+    watcher.watch(str(log_path))
+    return watcher, log_path
+
+
+def write_later(log_path, delay):
+    def write():
+        time.sleep(delay)
+        with open(log_path, "a") as log_file:
+            log_file.write("more lines\n")
+    threading.Thread(target=write).start()
+
+
+def test_wait_returns_when_the_log_changes(tmp_path):
+    for inotify in (True, False):
+        watcher, log_path = make_watcher(tmp_path, inotify)
+        write_later(log_path, 0.1)
+        start_time = time.time()
+        assert watcher.wait(5)
+        assert time.time() - start_time < 2
+        assert not watcher.wait(0.2)
+        watcher.close()
+
+
+def test_wake_interrupts_wait(tmp_path):
+    for inotify in (True, False):
+        watcher, log_path = make_watcher(tmp_path, inotify)
+        threading.Timer(0.1, watcher.wake).start()
+        start_time = time.time()
+        assert not watcher.wait(5)
+        assert time.time() - start_time < 2
+        watcher.close()
+
+
+def test_wake_never_blocks(tmp_path):
+    watcher, log_path = make_watcher(tmp_path, True)
+    # More than the pipe can hold, nobody is waiting to read them
+    for i in range(100000):
+        watcher.wake()
+    assert not watcher.wait(1)
+    watcher.close()
+
+
+def test_wake_while_closing(tmp_path):
+    """ wake() from other threads while the watcher is closed doesn't write to a closed (or reused) file descriptor """
+    for attempt in range(20):
+        watcher, log_path = make_watcher(tmp_path, True)
+        errors = []
+        stop = threading.Event()
+
+        def wake_until_stopped():
+            try:
+                while not stop.is_set():
+                    watcher.wake()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=wake_until_stopped) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.005)
+        watcher.close()
+        time.sleep(0.005)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        # After close, wake does nothing
+        watcher.wake()
+
+
+def test_close_while_waiting(tmp_path):
+    """ close() from another thread ends wait(), which closes the file descriptors once it's done with them """
+    watcher, log_path = make_watcher(tmp_path, True)
+    threading.Timer(0.1, watcher.close).start()
+    start_time = time.time()
+    assert not watcher.wait(5)
+    assert time.time() - start_time < 2
+    assert watcher.wake_pipe is None and watcher.inotify_fd is None
+    watcher.wake()
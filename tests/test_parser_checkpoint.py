@@ -0,0 +1,90 @@
+import json
+import os
+
+import pytest
+
+from parser_checkpoint import ParserCheckpoint
+
+log_data = b"".join(b"[INFO] - line %d\r\n" % number for number in range(2000))
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    path = str(tmp_path / "log.txt")
+    with open(path, "wb") as log_file:
+        log_file.write(log_data)
+    return path
+
+
+def save(tmp_path, log_path, offset):
+    """ Save a checkpoint made at offset in the log, return it and what it was saved with """
+    checkpoint = ParserCheckpoint(str(tmp_path / "parser_checkpoint.json"))
+    content = {
+        'log_file_path': os.path.abspath(log_path),
+        'log_identity': ParserCheckpoint.log_identity(log_path, offset),
+        'offset': offset,
+        'state': {'seed': "ABCD EFGH"},
+    }
+    checkpoint.save(content)
+    return checkpoint, content
+
+
+def test_round_trip(tmp_path, log_path):
+    checkpoint, content = save(tmp_path, log_path, 20000)
+    assert not os.path.exists(checkpoint.path + ".tmp")
+    loaded = checkpoint.load(log_path)
+    assert loaded == dict(content, format_version=ParserCheckpoint.format_version)
+    assert not checkpoint.is_due()
+    # The game kept writing to the log
+    with open(log_path, "ab") as log_file:
+        log_file.write(b"[INFO] - more\r\n")
+    assert checkpoint.load(log_path) == loaded
+
+
+def test_new_session_in_the_same_file(tmp_path, log_path):
+    """ A new session starts like the one we saved, only the bytes before the offset tell them apart """
+    checkpoint, content = save(tmp_path, log_path, 20000)
+    with open(log_path, "r+b") as log_file:
+        log_file.seek(19000)
+        log_file.write(b"[INFO] - another session")
+    assert checkpoint.load(log_path) is None
+
+
+def test_shorter_log(tmp_path, log_path):
+    checkpoint, content = save(tmp_path, log_path, 20000)
+    with open(log_path, "r+b") as log_file:
+        log_file.truncate(10000)
+    assert checkpoint.load(log_path) is None
+
+
+def test_log_replaced_by_another_file(tmp_path, log_path):
+    checkpoint, content = save(tmp_path, log_path, 20000)
+    os.replace(log_path, log_path + ".old")
+    with open(log_path, "wb") as log_file:
+        log_file.write(log_data)
+    assert checkpoint.load(log_path) is None
+
+
+def test_other_log(tmp_path, log_path):
+    checkpoint, content = save(tmp_path, log_path, 20000)
+    other_path = str(tmp_path / "other_log.txt")
+    os.link(log_path, other_path)
+    assert checkpoint.load(other_path) is None
+
+
+@pytest.mark.parametrize("change", ["other format", "missing key", "not json"])
+def test_unusable_file(tmp_path, log_path, change):
+    checkpoint, content = save(tmp_path, log_path, 20000)
+    if change == "not json":
+        with open(checkpoint.path, "w") as checkpoint_file:
+            checkpoint_file.write("{")
+    else:
+        with open(checkpoint.path, "r") as checkpoint_file:
+            saved = json.load(checkpoint_file)
+        if change == "other format":
+            saved['format_version'] -= 1
+        else:
+            del saved['offset']
+        with open(checkpoint.path, "w") as checkpoint_file:
+            json.dump(saved, checkpoint_file)
+    assert checkpoint.load(log_path) is None
@@ -0,0 +1,76 @@
+import random
+
+from game_objects.floor import Floor
+from game_objects.item import Item
+from game_objects.state import TrackerState
+
+# 33 to 35 are space bar items
+item_ids = ["1", "2", "3", "12", "33", "34", "35"]
+
+
+def new_state(game_version):
+    state = TrackerState("ABCD EFGH", "test", game_version, "", "", "", "", 0)
+    state.add_floor(Floor("f1"))
+    return state
+
+
+def same_items(state, expected):
+    """ Return true if state has the items of the expected list, in the same order and looked up the same way """
+    if [id(item) for item in state.item_list] != [id(item) for item in expected]:
+        return False
+    for item_id in item_ids:
+        items = [item for item in expected if item.item_id == item_id]
+        if state.contains_item(item_id) != (len(items) > 0) or [id(item) for item in state.get_items(item_id)] != [id(item) for item in items]:
+            return False
+    return True
+
+
+def test_items_are_found_like_in_the_list(game_version):
+    """ Items added and removed at random are found like they were by going through the list """
+    random_choice = random.Random(1)
+    state = new_state(game_version)
+    expected = []
+    for step in range(1500):
+        item_id = random_choice.choice(item_ids)
+        if random_choice.random() < 0.6:
+            item = Item(item_id, item_id, state.last_floor)
+            # Space bar items are only added once
+            added = not (item.info.space and item in expected)
+            assert state.add_item(item) == added
+            if added:
+                expected.append(item)
+        else:
+            force_remove_active = random_choice.random() < 0.5
+            removed = any(item.item_id == item_id and (force_remove_active or not item.info.space) for item in expected)
+            assert state.remove_item(item_id, force_remove_active) == removed
+            if removed:
+                # The first item with that id leaves the list, like list.remove did
+                expected.remove(Item(item_id, item_id, state.last_floor))
+        assert same_items(state, expected)
+
+
+def test_assigned_list_is_indexed(game_version):
+    state = new_state(game_version)
+    items = [Item(item_id, item_id, state.last_floor) for item_id in item_ids * 2]
+    for item in items:
+        state.add_item(item)
+    state.item_list = items[::3]
+    assert same_items(state, items[::3])
+    state.hide_items("1", "2")
+    assert [item.shown for item in state.item_list] == [item.item_id not in ("1", "2") for item in items[::3]]
+
+
+def test_removals_after_the_list_is_assigned(game_version):
+    state = new_state(game_version)
+    items = [Item(item_id, item_id, state.last_floor) for item_id in item_ids * 3]
+    state.item_list = list(items[::2])
+    expected = list(items[::2])
+    for item_id in ("2", "1", "3"):
+        item = Item(item_id, item_id, state.last_floor)
+        assert state.add_item(item)
+        expected.append(item)
+    for item_id in ("1", "12", "1", "3", "1"):
+        assert state.remove_item(item_id)
+        expected.remove(Item(item_id, item_id, state.last_floor))
+        assert same_items(state, expected)
+    assert not state.remove_item("1")
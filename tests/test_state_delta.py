@@ -0,0 +1,104 @@
+import copy
+import json
+import os
+import random
+import shutil
+
+from conftest import fixtures
+from log_finder import LogFinder
+from log_parser import LogParser
+from state_delta import StateDelta
+
+
+def check(base, state):
+    """ The delta from base gives state back, after going through json like it does to the server """
+    kept_base = copy.deepcopy(base)
+    delta = json.loads(json.dumps(StateDelta.compare(base, state, 7)))
+    assert delta['base_version'] == 7
+    assert delta['format_version'] == StateDelta.format_version
+    assert StateDelta.apply(base, delta) == state
+    assert base == kept_base
+    return delta
+
+
+def test_parsed_states(log_path):
+    """ Every state the test log goes through is the delta of the one before applied to it """
+    shutil.copy(os.path.join(fixtures, "repentance_plus_log.txt"), log_path)
+    parser = LogParser("../", "test", LogFinder())
+    exports = []
+    parser.event_listeners.append(lambda event: exports.append(parser.state.get_export()))
+    parser.parse()
+    assert len(exports) > 50
+    sizes = []
+    for base, state in zip(exports, exports[1:]):
+        if base['seed'] == state['seed']:
+            sizes.append(len(json.dumps(check(base, state))))
+    # Most of them only change a few things
+    assert sorted(sizes)[len(sizes) // 2] < len(json.dumps(exports[-1])) / 4
+
+
+def random_state(random_choice, floors):
+    items = []
+    for index in range(random_choice.randint(0, 30)):
+        item_id = str(random_choice.randint(1, 40))
+        items.append({
+            'item_id': item_id, 'numeric_id': item_id, 'floor_id': random_choice.choice(floors)['floor_id'],
+            'flags': random_choice.choice(["", "b", "r"]), 'shown': random_choice.random() < 0.8,
+        })
+    return {
+        'seed': "ABCD EFGH",
+        'player': random_choice.randint(0, 3),
+        'floor_list': floors,
+        'item_list': items,
+        'player_transforms': {'guppy': {'items': {"134": 1}}, 'bob': {'items': {}}},
+    }
+
+
+def mutate(random_choice, state):
+    """ Return state after some of what a run does to it """
+    state = copy.deepcopy(state)
+    items = state['item_list']
+    for step in range(random_choice.randint(0, 4)):
+        change = random_choice.random()
+        if change < 0.3 and items:
+            del items[random_choice.randrange(len(items))]
+        elif change < 0.5 and items:
+            random_choice.choice(items)['flags'] = random_choice.choice(["", "b", "r", "br"])
+        elif change < 0.6 and items:
+            item = random_choice.choice(items)
+            item['shown'] = not item['shown']
+        elif change < 0.7:
+            # Items added by the log before other ones (a reroll)
+            item_id = str(random_choice.randint(1, 40))
+            item = {'item_id': item_id, 'numeric_id': item_id, 'floor_id': state['floor_list'][-1]['floor_id'], 'flags': "", 'shown': True}
+            items.insert(random_choice.randint(0, len(items)), item)
+        elif change < 0.8:
+            floor_index = random_choice.randrange(len(state['floor_list']))
+            state['floor_list'][floor_index] = dict(state['floor_list'][floor_index], curse=random_choice.randint(0, 3))
+        elif change < 0.9:
+            state['floor_list'].append({'floor_id': "f%d" % (len(state['floor_list']) + 1), 'curse': 0})
+        else:
+            transforms = state['player_transforms']
+            transforms['bob'] = {'items': {"273": 1}}
+            if random_choice.random() < 0.5:
+                transforms.pop('guppy', None)
+        state['player'] = random_choice.randint(0, 3)
+    return state
+
+
+def test_random_changes():
+    random_choice = random.Random(1)
+    for attempt in range(500):
+        floors = [{'floor_id': "f%d" % number, 'curse': 0} for number in range(1, random_choice.randint(2, 6))]
+        base = random_state(random_choice, floors)
+        state = base
+        for step in range(5):
+            state = mutate(random_choice, state)
+            check(base, state)
+            check(state, base)
+
+
+def test_unchanged_state():
+    state = random_state(random.Random(2), [{'floor_id': "f1", 'curse': 0}])
+    delta = check(state, copy.deepcopy(state))
+    assert delta['values'] == {} and delta['lists'] == {} and delta['dicts'] == {}
@@ -0,0 +1,167 @@
+import json
+import queue
+import urllib.parse
+
+import pytest
+
+from conftest import wait_until
+from game_objects.floor import Floor
+from game_objects.item import Item
+from game_objects.state import TrackerState
+from state_delta import StateDelta
+from state_subscriber import StateSubscriber
+
+
+class SubscribeServer(object):
+    """ Answers the subscriptions with what the test puts in answers, or 204 if there's nothing before the wait is over """
+    def __init__(self, server):
+        self.answers = queue.Queue()
+        server.respond = self.respond
+
+    def respond(self, request):
+        parameters = urllib.parse.parse_qs(urllib.parse.urlsplit(request.path).query)
+        try:
+            return self.answers.get(timeout=float(parameters['wait'][0]))
+        except queue.Empty:
+            return 204, {}, b""
+
+    def send(self, content, status=200):
+        self.answers.put((status, {'Content-Type': "application/json"}, json.dumps(content).encode("utf-8")))
+
+
+def run_states(count):
+    """ Return the states of a run where an item is picked up after another """
+    state = TrackerState("ABCD EFGH", "test", "Repentance+", "", "", "", "", 0)
+    state.add_floor(Floor("f1"))
+    states = []
+    for number in range(count):
+        state.add_item(Item(str(number + 1), str(number + 1), state.last_floor))
+        states.append(state.get_export())
+    return states
+
+
+def item_ids(state):
+    return [item.item_id for item in state.item_list]
+
+
+@pytest.fixture
+def subscribe(server, monkeypatch):
+    """ Return the server answering the subscriptions, and a function starting a subscriber to it """
+    monkeypatch.setattr(StateSubscriber, "wait", 0.2)
+    monkeypatch.setattr(StateSubscriber, "retry_delay", 0.05)
+    subscribe_server = SubscribeServer(server)
+    subscribers = []
+
+    def start():
+        subscriber = StateSubscriber(server.url + "/tracker/api/user/player", "test")
+        subscriber.start()
+        subscribers.append(subscriber)
+        return subscriber
+    yield subscribe_server, start
+    for subscriber in subscribers:
+        subscriber.stop()
+
+
+def afters(server):
+    """ Return the after= versions the subscriptions asked for, None for the ones without """
+    values = []
+    for request in server.received():
+        parameters = urllib.parse.parse_qs(urllib.parse.urlsplit(request.path).query)
+        assert urllib.parse.urlsplit(request.path).path == "/tracker/api/user/player/subscribe"
+        values.append(int(parameters['after'][0]) if 'after' in parameters else None)
+    return values
+
+
+def test_states_and_deltas(server, subscribe):
+    subscribe_server, start = subscribe
+    states = run_states(3)
+    subscriber = start()
+    subscribe_server.send({'version': 10, 'state': states[0]})
+    subscribe_server.send({'version': 11, 'delta': StateDelta.compare(states[0], states[1], 10)})
+    subscribe_server.send({'version': 12, 'delta': StateDelta.compare(states[1], states[2], 11)})
+    received = []
+    wait_until(lambda: received.extend(subscriber.take_states()) or len(received) == 3)
+    assert [version for version, state in received] == [10, 11, 12]
+    assert [item_ids(state) for version, state in received] == [["1"], ["1", "2"], ["1", "2", "3"]]
+    assert subscriber.supported is True
+    assert subscriber.error_message is None
+    wait_until(lambda: len(server.received()) > 4)
+    assert afters(server)[:5] == [None, 10, 11, 12, 12]
+
+
+def test_nothing_new(server, subscribe):
+    """ The server answers 204 when nothing was uploaded while it waited, we ask again with the same version """
+    subscribe_server, start = subscribe
+    subscriber = start()
+    subscribe_server.send({'version': 10, 'state': run_states(1)[0]})
+    wait_until(lambda: len(server.received()) > 3)
+    assert afters(server)[:4] == [None, 10, 10, 10]
+    assert [version for version, state in subscriber.take_states()] == [10]
+
+
+def test_delta_from_another_version(server, subscribe):
+    """ A delta that wasn't made from our state is ignored, and we ask for the whole state """
+    subscribe_server, start = subscribe
+    states = run_states(3)
+    subscriber = start()
+    subscribe_server.send({'version': 10, 'state': states[0]})
+    subscribe_server.send({'version': 12, 'delta': StateDelta.compare(states[1], states[2], 11)})
+    subscribe_server.send({'version': 12, 'state': states[2]})
+    wait_until(lambda: len(server.received()) > 3)
+    assert afters(server)[:3] == [None, 10, None]
+    assert [(version, item_ids(state)) for version, state in subscriber.take_states()] == [(10, ["1"]), (12, ["1", "2", "3"])]
+
+
+def test_errors_resume_from_our_version(server, subscribe):
+    subscribe_server, start = subscribe
+    subscriber = start()
+    subscribe_server.send({'version': 10, 'state': run_states(1)[0]})
+    subscribe_server.answers.put((500, {}, b""))
+    subscribe_server.answers.put((500, {}, b""))
+    wait_until(lambda: subscriber.error_message is not None)
+    wait_until(lambda: len(server.received()) > 3 and subscriber.error_message is None)
+    assert afters(server)[:4] == [None, 10, 10, 10]
+    times = [request.time for request in server.received()]
+    # After the second failure, we wait between retry_delay and twice as long
+    assert times[3] - times[2] >= 0.05
+    assert subscriber.supported is True
+
+
+@pytest.mark.parametrize("answer", [
+    (400, {}, b""), (404, {}, b""), (405, {}, b""), (501, {}, b""), (500, {}, b"down"),
+    # Servers that answer every url with a page
+    (200, {'Content-Type': "text/html"}, b"<html>Tracker</html>"),
+    (200, {'Content-Type': "application/json"}, b'{"error": "unknown page"}'),
+])
+def test_server_without_subscriptions(server, subscribe, answer):
+    """ If the first request fails in any way, the states are polled instead """
+    subscribe_server, start = subscribe
+    subscribe_server.answers.put(answer)
+    subscriber = start()
+    subscriber.join(5)
+    assert not subscriber.is_alive()
+    assert subscriber.supported is False
+    assert len(server.received()) == 1
+
+
+def test_supported_once_the_server_answers(server, subscribe):
+    """ A server that has nothing new before the wait is over knows about subscriptions too """
+    subscribe_server, start = subscribe
+    subscriber = start()
+    assert subscriber.supported is None
+    wait_until(lambda: len(server.received()) > 1)
+    assert subscriber.supported is True
+    # Errors after that don't stop the subscription
+    subscribe_server.answers.put((200, {'Content-Type': "text/html"}, b"<html>Oops</html>"))
+    wait_until(lambda: subscriber.error_message is not None)
+    wait_until(lambda: subscriber.error_message is None)
+    assert subscriber.is_alive() and subscriber.supported is True
+
+
+def test_other_tracker_version(server, subscribe):
+    subscribe_server, start = subscribe
+    subscriber = start()
+    subscribe_server.send({'version': 10, 'state': {'tracker_version': "0.1"}})
+    wait_until(lambda: subscriber.error_message is not None)
+    assert "0.1" in subscriber.error_message
+    assert subscriber.take_states() == []
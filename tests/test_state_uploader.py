@@ -0,0 +1,231 @@
+import json
+import random
+import threading
+import time
+
+import pytest
+
+from conftest import wait_until
+from fake_server import FakeServer
+from game_objects.floor import Floor
+from game_objects.item import Item
+from game_objects.state import TrackerState
+from state_delta import StateDelta
+import state_uploader
+from state_uploader import StateUploader
+
+
+def state(number):
+    """ Return a state told apart from the others by its seed """
+    return TrackerState("ABCD %04d" % number, "test", "Repentance+", "", "", "", "", 0)
+
+
+def uploaded_numbers(server):
+    return [int(json.loads(request.body.decode("utf-8"))['seed'][5:]) for request in server.received("PUT")]
+
+
+def ok(request):
+    return 200, {'Content-Type': "application/json"}, b'{"updated_user": "player"}'
+
+
+def failing(request):
+    return 500, {}, b"down"
+
+
+@pytest.fixture
+def uploader():
+    uploader = StateUploader()
+    uploader.start()
+    yield uploader
+    uploader.stop()
+
+
+def idle(uploader):
+    return uploader.queue_depth() == 0
+
+
+def test_states_go_to_the_url(server, uploader):
+    server.respond = ok
+    uploader.upload(state(1), server.url + "/tracker/api/update/key")
+    wait_until(lambda: idle(uploader) and uploader.last_success_latency is not None)
+    assert [request.path for request in server.received()] == ["/tracker/api/update/key"]
+    assert uploaded_numbers(server) == [1]
+    assert uploader.error_message is None
+
+
+def test_only_the_newest_state_is_uploaded(server, uploader):
+    """ The states given while an upload is in progress replace each other, only the last one is sent after it """
+    release = threading.Event()
+
+    def slow(request):
+        release.wait(10)
+        return ok(request)
+    server.respond = slow
+    uploader.upload(state(0), server.url + "/update")
+    wait_until(lambda: len(server.received()) == 1)
+    for number in range(1, 30):
+        uploader.upload(state(number), server.url + "/update")
+    assert uploader.queue_depth() == 2
+    release.set()
+    wait_until(lambda: idle(uploader) and len(server.received()) == 2)
+    time.sleep(0.05)
+    assert uploaded_numbers(server) == [0, 29]
+
+
+def test_failures_back_off(server, uploader, monkeypatch):
+    """ The delay before retrying doubles with every failure, the state sent then is the newest one """
+    monkeypatch.setattr(StateUploader, "retry_delay", 0.1)
+    monkeypatch.setattr(random, "uniform", lambda low, high: 1.0)
+    server.respond = lambda request: failing(request) if len(server.received()) <= 4 else ok(request)
+    uploader.upload(state(0), server.url + "/update")
+    wait_until(lambda: len(server.received()) == 4 and uploader.error_message is not None)
+    uploader.upload(state(1), server.url + "/update")
+    wait_until(lambda: uploader.error_message is None and idle(uploader))
+    times = [request.time for request in server.received()]
+    gaps = [after - before for before, after in zip(times, times[1:])]
+    assert len(gaps) == 4
+    for gap, delay in zip(gaps, (0.1, 0.2, 0.4, 0.8)):
+        assert delay <= gap < delay + 0.15
+    assert uploaded_numbers(server) == [0, 0, 0, 0, 1]
+
+
+def test_failures_are_logged_once(server, uploader, monkeypatch):
+    """ While the server is down, only the first failure goes in the log, with when it worked again """
+    logged = []
+    monkeypatch.setattr(state_uploader, "log_error", logged.append)
+    monkeypatch.setattr(StateUploader, "retry_delay", 0.01)
+    server.respond = lambda request: failing(request) if len(server.received()) <= 5 else ok(request)
+    uploader.upload(state(0), server.url + "/update")
+    wait_until(lambda: len(logged) == 2)
+    assert len(server.received()) == 6
+    assert "Traceback" in logged[0]
+    assert logged[1] == "Sent item info to server again after 5 failed uploads"
+
+
+def test_retry_now(server, uploader, monkeypatch):
+    """ Changing the options doesn't wait for the delay to retry """
+    monkeypatch.setattr(StateUploader, "retry_delay", 60.0)
+    server.respond = failing
+    uploader.upload(state(0), server.url + "/update")
+    wait_until(lambda: uploader.error_message is not None)
+    server.respond = ok
+    # The options changed
+    uploader.retry_now()
+    wait_until(lambda: uploader.error_message is None and idle(uploader))
+    assert uploaded_numbers(server) == [0, 0]
+
+
+def test_cancel(server, uploader, monkeypatch):
+    """ Turning write_to_server off drops the state waiting to be retried, and its error """
+    monkeypatch.setattr(StateUploader, "retry_delay", 0.1)
+    server.respond = failing
+    uploader.upload(state(0), server.url + "/update")
+    wait_until(lambda: len(server.received()) == 1 and uploader.error_message is not None)
+    uploader.cancel()
+    assert uploader.error_message is None
+    time.sleep(0.3)
+    assert len(server.received()) == 1
+    assert idle(uploader)
+
+
+def test_unknown_user(server, uploader):
+    server.respond = lambda request: (200, {'Content-Type': "application/json"}, b'{"updated_user": null}')
+    uploader.upload(state(0), server.url + "/update")
+    wait_until(lambda: uploader.error_message is not None)
+    assert "authkey" in uploader.error_message
+
+
+class VersionedServer(object):
+    """ Answers like a server taking deltas: the state it has after a PUT or a PATCH, and its version """
+    def __init__(self, server, patch=True):
+        # Version => state, the test can remove some to see what happens when the server lost them
+        self.states = {}
+        self.version = 0
+        self.patch = patch
+        server.respond = self.respond
+
+    def respond(self, request):
+        content = json.loads(request.body.decode("utf-8"))
+        if request.method == "PATCH":
+            if not self.patch:
+                return 405, {}, b""
+            if content['base_version'] not in self.states:
+                return 409, {}, b""
+            content = StateDelta.apply(self.states[content['base_version']], content)
+        self.version += 1
+        self.states[self.version] = content
+        return 200, {'Content-Type': "application/json"}, json.dumps({'updated_user': "player", 'version': self.version}).encode("utf-8")
+
+    def last_state(self):
+        return self.states[self.version]
+
+
+def run_states(seed, count):
+    """ Return the states of a run where an item is picked up after another """
+    state = TrackerState(seed, "test", "Repentance+", "", "", "", "", 0)
+    state.add_floor(Floor("f1"))
+    states = []
+    for number in range(count):
+        state.add_item(Item(str(number % 30 + 1), str(number % 30 + 1), state.last_floor))
+        if number % 7 == 6:
+            state.add_floor(Floor("f%d" % (len(state.floor_list) + 1)))
+        states.append(state.get_export())
+    return states
+
+
+class ExportedState(object):
+    """ A state the uploader can send, that was already exported """
+    def __init__(self, export):
+        self.export = export
+
+    def get_export(self):
+        return self.export
+
+
+def upload_one_by_one(server, uploader, states):
+    """ Upload the states and wait for each of them to be sent """
+    for export in states:
+        sent = len(server.received())
+        uploader.upload(ExportedState(export), server.url + "/update")
+        wait_until(lambda: idle(uploader) and len(server.received()) > sent)
+
+
+def test_deltas_after_the_first_state(server, uploader):
+    versioned = VersionedServer(server)
+    states = run_states("ABCD EFGH", 20)
+    upload_one_by_one(server, uploader, states)
+    assert [request.method for request in server.received()] == ["PUT"] + ["PATCH"] * 19
+    assert versioned.last_state() == states[-1]
+    # A new run starts with the whole state
+    new_run = run_states("IJKL MNOP", 2)
+    upload_one_by_one(server, uploader, new_run)
+    assert [request.method for request in server.received()][20:] == ["PUT", "PATCH"]
+    assert versioned.last_state() == new_run[-1]
+
+
+def test_base_version_gone(server, uploader):
+    """ The server answers 409 to a delta from a version it doesn't have, the whole state is sent instead """
+    versioned = VersionedServer(server)
+    states = run_states("ABCD EFGH", 4)
+    upload_one_by_one(server, uploader, states[:2])
+    versioned.states.clear()
+    upload_one_by_one(server, uploader, states[2:])
+    assert [request.method for request in server.received()] == ["PUT", "PATCH", "PATCH", "PUT", "PATCH"]
+    assert versioned.last_state() == states[-1]
+    assert uploader.error_message is None
+
+
+def test_server_without_deltas(server, uploader):
+    """ A server that doesn't send versions back only gets whole states, one that refuses PATCH gets them again """
+    server.respond = ok
+    states = run_states("ABCD EFGH", 3)
+    upload_one_by_one(server, uploader, states)
+    assert [request.method for request in server.received()] == ["PUT"] * 3
+    refusing = FakeServer(ok)
+    try:
+        versioned = VersionedServer(refusing, patch=False)
+        upload_one_by_one(refusing, uploader, states)
+        assert [request.method for request in refusing.received()] == ["PUT", "PATCH", "PUT", "PATCH", "PUT"]
+        assert versioned.last_state() == states[-1]
+    finally:
+        refusing.close()
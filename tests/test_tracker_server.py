@@ -0,0 +1,100 @@
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+from conftest import repository, wait_until
+from game_objects.floor import Floor
+from game_objects.item import Item
+from game_objects.state import TrackerState
+from http_client import HttpClient, HttpError
+from state_delta import StateDelta
+from state_subscriber import StateSubscriber
+from state_uploader import StateUploader
+
+sys.path.insert(0, os.path.join(repository, "src_server"))
+from tracker_server import TrackerServer
+
+
+@pytest.fixture
+def tracker_server():
+    """ Return the url of a local tracker server """
+    server = TrackerServer(("127.0.0.1", 0), "local")
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:%d" % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+def run_states(count):
+    """ Return the states of a run where an item is picked up after another """
+    state = TrackerState("ABCD EFGH", "test", "Repentance+", "", "", "", "", 0)
+    state.add_floor(Floor("f1"))
+    states = []
+    for number in range(count):
+        state.add_item(Item(str(number + 1), str(number + 1), state.last_floor))
+        states.append(state.get_export())
+    return states
+
+
+def put(url, content):
+    return HttpClient().send_json('PUT', url + "/tracker/api/update/player", content)
+
+
+def test_uploads_reach_the_spectators(tracker_server):
+    """ The tracker's own uploader and subscriber, through the server """
+    uploader = StateUploader()
+    uploader.start()
+    subscriber = StateSubscriber(tracker_server + "/tracker/api/user/player", "test")
+    subscriber.start()
+    states = run_states(10)
+    received = []
+    try:
+        for state in states:
+            uploader.upload(TrackerState.from_json(state), tracker_server + "/tracker/api/update/player")
+            wait_until(lambda: received.extend(subscriber.take_states()) or (received and received[-1][1].get_export() == state))
+    finally:
+        uploader.stop()
+        subscriber.stop()
+    assert subscriber.supported is True
+    assert uploader.error_message is None
+    assert [state.get_export() for version, state in received] == states[len(states) - len(received):]
+    versions = [version for version, state in received]
+    assert versions == sorted(set(versions))
+
+
+def test_delta_from_another_version(tracker_server):
+    states = run_states(3)
+    version = put(tracker_server, states[0])['version']
+    delta = StateDelta.compare(states[0], states[1], version)
+    new_version = HttpClient().send_json('PATCH', tracker_server + "/tracker/api/update/player", delta)['version']
+    assert new_version > version
+    with pytest.raises(HttpError) as error:
+        HttpClient().send_json('PATCH', tracker_server + "/tracker/api/update/player", StateDelta.compare(states[1], states[2], version))
+    assert error.value.code == 409
+    assert json.loads(HttpClient().get(tracker_server + "/tracker/api/user/player")) == states[1]
+
+
+def test_etag_and_gzip(tracker_server):
+    state = run_states(30)[-1]
+    version = put(tracker_server, state)['version']
+    url = tracker_server + "/tracker/api/user/player"
+    status, headers, body = HttpClient().request('GET', url)
+    assert headers['Content-Encoding'] == "gzip"
+    assert json.loads(body) == state
+    etag = headers['ETag']
+    status, headers, body = HttpClient().request('GET', url, headers={'If-None-Match': etag})
+    assert status == 304
+    assert int(HttpClient().get(url + "/version")) == version
+
+
+def test_userlist_and_unknown_user(tracker_server):
+    put(tracker_server, run_states(1)[0])
+    users = json.loads(HttpClient().get(tracker_server + "/tracker/api/userlist/"))
+    assert [user['name'] for user in users] == ["player"]
+    with pytest.raises(HttpError) as error:
+        HttpClient().get(tracker_server + "/tracker/api/user/nobody")
+    assert error.value.code == 404
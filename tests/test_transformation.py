@@ -0,0 +1,68 @@
+import json
+import os
+import shutil
+
+from conftest import fixtures
+from export_store import ExportStore
+from game_objects.state import TrackerState
+from game_objects.transformation import Transformation
+
+
+def test_every_copy_counts_in_repentance(game_version):
+    guppy = Transformation("guppy")
+    assert guppy.add("134")
+    assert guppy.add("134")
+    # Golden Kid's Drawing counts twice
+    assert guppy.add("32937")
+    assert guppy.count == 4
+    assert guppy.remove("32937")
+    assert guppy.count == 2
+    assert not guppy.remove("81")
+
+
+def test_necromancer_counts_some_items_once(game_version):
+    necromancer = Transformation("necromancer")
+    assert necromancer.add("262")
+    assert not necromancer.add("262")
+    assert necromancer.count == 1
+
+
+def test_json_round_trip(game_version):
+    guppy = Transformation("guppy")
+    for item_id in ("134", "134", "81", "32937"):
+        guppy.add(item_id)
+    json_dic = guppy.to_json()
+    # The exported states are written later, they mustn't change with the transformation
+    guppy.add("81")
+    assert json_dic == {'items': {"134": 2, "81": 1, "32937": 2}}
+    json_dic = json.loads(json.dumps(json_dic))
+    loaded = Transformation.from_json(json_dic, "guppy")
+    assert loaded.items == {"134": 2, "81": 1, "32937": 2}
+    assert loaded.count == 5
+
+
+def test_legacy_lists_are_counted_again():
+    items = [
+        {'flags': '', 'floor_id': 'f1', 'item_id': '134', 'numeric_id': '134', 'shown': True},
+        {'flags': '', 'floor_id': 'f2', 'item_id': '32937', 'numeric_id': '32937', 'shown': True}, 1,
+        {'flags': '', 'floor_id': 'f3', 'item_id': '134', 'numeric_id': '134', 'shown': True},
+    ]
+    guppy = Transformation.from_legacy_json(items, "guppy")
+    assert guppy.items == {"134": 2, "32937": 2}
+    assert guppy.count == 4
+    assert Transformation.from_legacy_json([1], "guppy") is None
+    assert Transformation.from_legacy_json(["134"], "guppy") is None
+
+
+def test_load_export_state_of_older_tracker(tmp_path, monkeypatch, game_version):
+    """ An export_state.json written before Transformation keeps its transformations when it's loaded """
+    shutil.copy(os.path.join(fixtures, "baseline_export_state.json"), str(tmp_path / "export_state.json"))
+    monkeypatch.setattr(TrackerState, "export_store", ExportStore(str(tmp_path / "export_states") + "/", str(tmp_path / "export_state.json")))
+    state = TrackerState("", "test", game_version, "", "", "", "", -1)
+    state.save = 1
+    assert state.load_from_export_state() is None
+    assert state.seed == "ABCD EF18"
+    assert len(state.item_list) == 47
+    counts = {transform: value.count for transform, value in state.player_transforms.items() if value.count > 0}
+    assert counts == {'beelzebub': 1, 'bookworm': 1, 'guppy': 2, 'leviathan': 2, 'seraphim': 1}
+    assert state.player_transforms['guppy'].items == {"134": 1, "81": 1}